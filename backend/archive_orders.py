@@ -0,0 +1,29 @@
+"""
+Script to move old RESOLVIDO service orders to the archive collection
+The API also runs this periodically (see ARCHIVE_INTERVAL_MINUTES); use this
+for a first large migration or to run it from cron instead
+"""
+import argparse
+import asyncio
+
+import server
+
+
+async def archive(days: int, batch_size: int):
+    server.ARCHIVE_AFTER_DAYS = days
+    server.client = server.create_mongo_client()
+    server.db = server.client[server.DB_NAME]
+    server.storage = server.MongoStorage(server.db)
+    
+    await server.ensure_indexes()
+    moved = await server.archive_resolved_orders(batch_size)
+    print(f"✅ Archived {moved} service orders resolved more than {days} days ago")
+    
+    server.client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old resolved service orders")
+    parser.add_argument("--days", type=int, default=server.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=server.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(archive(args.days, args.batch_size))
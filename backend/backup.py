@@ -0,0 +1,286 @@
+"""
+Full backup and restore of the database as compressed NDJSON
+
+Every collection (users, service_orders, the archive, views, attachments...)
+is streamed to <collection>.ndjson.gz in MongoDB canonical extended JSON, so
+ObjectIds, dates and binary data survive the round trip. manifest.json holds
+document counts, SHA-256 checksums and index definitions.
+
+Usage:
+    python backup.py backup /backups/2024-06-30
+    python backup.py restore /backups/2024-06-30 [--upsert] [--drop] [--parallel 4]
+
+An interrupted restore can be run again with the same arguments: it resumes
+from the progress recorded in the backup directory.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+MANIFEST = "manifest.json"
+PROGRESS = "restore_progress.json"
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.CANONICAL)
+BATCH_SIZE = 1000
+
+def connect():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return client, client[os.environ.get('DB_NAME', 'service_order_db')]
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def index_definitions(info: dict) -> list:
+    indexes = []
+    for name, spec in info.items():
+        if name == "_id_":
+            continue
+        options = {k: v for k, v in spec.items() if k not in ("key", "v", "ns")}
+        indexes.append({"name": name, "key": spec["key"], "options": options})
+    return indexes
+
+# ============ BACKUP ============
+
+async def backup_collection(db, name: str, target: Path) -> dict:
+    path = target / f"{name}.ndjson.gz"
+    count = 0
+    # Constant memory: one cursor batch in flight, documents written as they arrive
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+        async for doc in db[name].find({}, batch_size=BATCH_SIZE).sort("_id", 1):
+            f.write(json_util.dumps(doc, json_options=JSON_OPTIONS))
+            f.write("\n")
+            count += 1
+
+    return {
+        "file": path.name,
+        "documents": count,
+        "bytes": path.stat().st_size,
+        "sha256": sha256_file(path),
+        "indexes": index_definitions(await db[name].index_information()),
+    }
+
+async def backup(target: Path, collections: list):
+    client, db = connect()
+    target.mkdir(parents=True, exist_ok=True)
+
+    names = collections or sorted(
+        name for name in await db.list_collection_names() if not name.startswith("system.")
+    )
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "db_name": db.name,
+        "format": "ndjson.gz (MongoDB canonical extended JSON)",
+        "collections": {},
+    }
+
+    for name in names:
+        started = time.monotonic()
+        manifest["collections"][name] = await backup_collection(db, name, target)
+        entry = manifest["collections"][name]
+        print(f"✅ {name}: {entry['documents']} documents in {time.monotonic() - started:.1f}s")
+
+    (target / MANIFEST).write_text(json.dumps(manifest, indent=2, default=str))
+    print(f"\n🎉 Backup written to {target}")
+
+    client.close()
+
+# ============ RESTORE ============
+
+def read_batches(path: Path, skip: int):
+    """Yield lists of documents, skipping the first `skip` lines"""
+    batch = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if line_number < skip or not line.strip():
+                continue
+            batch.append(json_util.loads(line, json_options=JSON_OPTIONS))
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+async def write_batch(collection, batch: list, upsert: bool):
+    if upsert:
+        operations = []
+        for doc in batch:
+            if "id" in doc:
+                # Match on the application id; the existing _id is kept
+                doc.pop("_id", None)
+                operations.append(ReplaceOne({"id": doc["id"]}, doc, upsert=True))
+            else:
+                operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # Concurrent upserts of one key can race on insert; the retry matches
+            # the document that won. A real unique conflict fails again and raises.
+            await collection.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+        return
+    try:
+        await collection.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        # Documents already restored by an interrupted run keep their _id
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+class RestoreProgress:
+    """Lines restored per collection, saved after each contiguous run of finished batches"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done = json.loads(path.read_text()) if path.exists() else {}
+
+    def get(self, name: str) -> int:
+        return self.done.get(name, 0)
+
+    def set(self, name: str, lines: int):
+        self.done[name] = lines
+        self.path.write_text(json.dumps(self.done, indent=2))
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+async def create_indexes(collection, indexes: list):
+    for index in indexes:
+        keys = [tuple(key) for key in index["key"]]
+        await collection.create_index(keys, name=index["name"], **index["options"])
+
+async def restore_collection(db, name: str, entry: dict, source: Path, progress: RestoreProgress,
+                             parallel: int, upsert: bool):
+    collection = db[name]
+    skip = progress.get(name)
+    if skip >= entry["documents"]:
+        print(f"⏭️  {name}: already restored")
+        return
+
+    indexes = entry.get("indexes", [])
+    if upsert:
+        # Upserts match on id: without its index every one scans the collection.
+        # The other indexes are still built after loading, which is faster.
+        await create_indexes(collection, [index for index in indexes if [key[0] for key in index["key"]] == ["id"]])
+
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(parallel)
+    # Batches finish out of order; progress only advances over a contiguous prefix
+    finished = {}
+    next_offset = skip
+    tasks = []
+
+    async def run(offset: int, batch: list):
+        nonlocal next_offset
+        try:
+            await write_batch(collection, batch, upsert)
+        finally:
+            semaphore.release()
+        finished[offset] = len(batch)
+        advanced = False
+        while next_offset in finished:
+            next_offset += finished.pop(next_offset)
+            advanced = True
+        if advanced:
+            progress.set(name, next_offset)
+
+    offset = skip
+    try:
+        for batch in read_batches(source / entry["file"], skip):
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(run(offset, batch)))
+            offset += len(batch)
+            for task in tasks:
+                if task.done():
+                    task.result()  # re-raises a failed batch
+            tasks = [task for task in tasks if not task.done()]
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Saved progress stops before the failed batch, so a rerun resumes there
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    await create_indexes(collection, indexes)
+
+    restored = offset - skip
+    print(f"✅ {name}: {restored} documents in {time.monotonic() - started:.1f}s")
+
+async def restore(source: Path, collections: list, parallel: int, upsert: bool, drop: bool, verify: bool):
+    manifest = json.loads((source / MANIFEST).read_text())
+    names = collections or list(manifest["collections"])
+
+    if verify:
+        for name in names:
+            entry = manifest["collections"][name]
+            if sha256_file(source / entry["file"]) != entry["sha256"]:
+                raise SystemExit(f"❌ Checksum mismatch for {entry['file']}, backup is corrupted")
+        print("✅ Checksums verified")
+
+    client, db = connect()
+    progress = RestoreProgress(source / PROGRESS)
+
+    if drop:
+        progress.clear()
+        progress = RestoreProgress(source / PROGRESS)
+        for name in names:
+            await db[name].drop()
+
+    try:
+        for name in names:
+            await restore_collection(db, name, manifest["collections"][name], source, progress, parallel, upsert)
+    except Exception:
+        print(f"❌ Restore failed; run it again to resume from {source / PROGRESS}")
+        raise
+    finally:
+        client.close()
+
+    # Only once every batch of every collection is written
+    progress.clear()
+    print(f"\n🎉 Restore from {source} complete")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backup and restore the service order database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup_parser = commands.add_parser("backup", help="dump collections to a directory")
+    backup_parser.add_argument("target", type=Path)
+    backup_parser.add_argument("--collection", action="append", default=[],
+                               help="only this collection (repeatable); default is all")
+
+    restore_parser = commands.add_parser("restore", help="load a backup directory")
+    restore_parser.add_argument("source", type=Path)
+    restore_parser.add_argument("--collection", action="append", default=[],
+                                help="only this collection (repeatable); default is all in the manifest")
+    restore_parser.add_argument("--parallel", type=int, default=4, help="concurrent insert batches")
+    restore_parser.add_argument("--upsert", action="store_true",
+                                help="replace existing documents with the same id instead of skipping them")
+    restore_parser.add_argument("--drop", action="store_true",
+                                help="drop the collections first (starts over, ignoring saved progress)")
+    restore_parser.add_argument("--no-verify", action="store_true", help="skip checksum verification")
+
+    args = parser.parse_args()
+    if args.command == "backup":
+        asyncio.run(backup(args.target, args.collection))
+    else:
+        asyncio.run(restore(args.source, args.collection, args.parallel, args.upsert, args.drop, not args.no_verify))
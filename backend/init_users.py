@@ -4,6 +4,7 @@ Run this once to create the initial admin and user accounts
 """
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from storage import MongoStorage, SQLiteStorage
 import bcrypt
 import uuid
 from datetime import datetime, timezone
@@ -18,18 +19,24 @@ def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 async def init_users():
-    # Connect to MongoDB
-    mongo_url = os.environ['MONGO_URL']
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ.get('DB_NAME', 'service_order_db')]
+    # Connect to the configured storage backend
+    client = None
+    if os.environ.get('STORAGE_BACKEND', 'mongo') == 'sqlite':
+        storage = SQLiteStorage(Path(os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'data' / 'service_orders.db'))))
+    else:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        storage = MongoStorage(client[os.environ.get('DB_NAME', 'service_order_db')])
+    await storage.open()
     
     # Check if users already exist
-    existing_gustavo = await db.users.find_one({"email": "gustavo_tsm"})
-    existing_vinnicius = await db.users.find_one({"email": "vinnicius_tsm"})
+    existing_gustavo = await storage.users.find_one({"email": "gustavo_tsm"})
+    existing_vinnicius = await storage.users.find_one({"email": "vinnicius_tsm"})
     
     if existing_gustavo and existing_vinnicius:
         print("✅ Users already exist. Skipping initialization.")
-        client.close()
+        await storage.close()
+        if client:
+            client.close()
         return
     
     # Create Gustavo (ADMIN)
@@ -42,7 +49,7 @@ async def init_users():
             "password": hash_password("3758"),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        await db.users.insert_one(gustavo)
+        await storage.users.insert_one(gustavo)
         print("✅ Admin user created: gustavo_tsm (password: 3758)")
     
     # Create Vinnicius (USER)
@@ -55,7 +62,7 @@ async def init_users():
             "password": hash_password("3758"),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
-        await db.users.insert_one(vinnicius)
+        await storage.users.insert_one(vinnicius)
         print("✅ Standard user created: vinnicius_tsm (password: 3758)")
     
     print("\n🎉 Initialization complete!")
@@ -63,7 +70,9 @@ async def init_users():
     print("  Admin: gustavo_tsm / 3758")
     print("  User:  vinnicius_tsm / 3758")
     
-    client.close()
+    await storage.close()
+    if client:
+        client.close()
 
 if __name__ == "__main__":
     asyncio.run(init_users())
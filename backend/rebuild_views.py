@@ -0,0 +1,22 @@
+"""
+Script to rebuild the derived views (equipment history, technician queues, checklist rollups, ...) from the service orders
+Run this after a restore, a manual data fix or if a view is suspected to be out of sync
+"""
+import asyncio
+
+import server
+
+
+async def rebuild():
+    server.client = server.create_mongo_client()
+    server.db = server.client[server.DB_NAME]
+    server.storage = server.MongoStorage(server.db)
+    
+    await server.ensure_indexes()
+    await server.rebuild_order_views()
+    print("✅ Views rebuilt")
+    
+    server.client.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -0,0 +1,155 @@
+"""
+Production launcher for the backend API
+
+Runs several worker processes with the app preloaded in the master, so forked
+workers share the imported modules. Each worker opens its own MongoDB pool and
+warms it (pings, indexes, first dashboard queries) in the app lifespan before
+it starts accepting connections.
+
+Usage:
+    python run.py                       # serve with WEB_CONCURRENCY workers
+    python run.py --workers 4 --port 8001
+    python run.py --import-time         # show the slowest imports of server.py
+
+Signals to the gunicorn master:
+    SIGHUP   graceful (zero-downtime) restart of the workers. They fork from
+             the code the master preloaded, so this does NOT pick up a deploy.
+    SIGUSR2  start a new master with the new code alongside the old one; send
+             SIGTERM to the old master once the new workers are up. Use this
+             (or restart the service) to deploy without downtime.
+
+With --no-preload each worker imports server.py itself, so SIGHUP also loads
+new code, at the cost of slower worker starts and no shared module memory.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def default_workers() -> int:
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    return min(multiprocessing.cpu_count() * 2 + 1, 8)
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from server import app
+            return app
+
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        # Import server.py once in the master; workers fork with it loaded
+        "preload_app": not args.no_preload,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        "keepalive": 5,
+        # Proxies whose X-Forwarded-For is believed (sets the client IP for login quotas)
+        "forwarded_allow_ips": args.forwarded_allow_ips,
+        # Recycle workers periodically, staggered so they don't restart together
+        "max_requests": args.max_requests,
+        "max_requests_jitter": max(1, args.max_requests // 10) if args.max_requests else 0,
+        "accesslog": "-",
+    }
+    StandaloneApplication(options).run()
+
+
+def run_uvicorn(args):
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if has_module("uvloop") else "asyncio",
+        http="httptools" if has_module("httptools") else "h11",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=5,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+    )
+
+
+def report_import_time(limit: int):
+    """Import server.py under -X importtime and print the slowest modules"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    if not rows:
+        print(result.stderr)
+        sys.exit(result.returncode or 1)
+
+    total_us = next(row[0] for row in rows if row[2].strip() == "server")
+    print(f"server.py import: {total_us / 1000:.1f} ms total\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the service order API")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--timeout", type=int, default=60, help="worker timeout in seconds")
+    parser.add_argument("--graceful-timeout", type=int, default=30)
+    parser.add_argument("--max-requests", type=int, default=10000,
+                        help="restart a worker after this many requests (0 disables)")
+    parser.add_argument("--forwarded-allow-ips", default=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                        help="comma-separated proxy addresses trusted to set X-Forwarded-For")
+    parser.add_argument("--no-preload", action="store_true",
+                        help="import the app in each worker, so SIGHUP reloads code (gunicorn only)")
+    parser.add_argument("--no-gunicorn", action="store_true",
+                        help="use uvicorn's own process manager even if gunicorn is installed")
+    parser.add_argument("--import-time", action="store_true",
+                        help="measure server.py import time and exit")
+    parser.add_argument("--top", type=int, default=25, help="rows to show with --import-time")
+    args = parser.parse_args()
+
+    if args.import_time:
+        report_import_time(args.top)
+        return
+
+    sys.path.insert(0, str(ROOT_DIR))
+    if has_module("gunicorn") and not args.no_gunicorn:
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,277 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from bson import ObjectId
+from pymongo import monitoring
+from pymongo import ReplaceOne, DeleteOne, UpdateOne
+from pymongo.errors import PyMongoError, ConnectionFailure, ServerSelectionTimeoutError, DuplicateKeyError, OperationFailure, BulkWriteError
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import AsyncIterator, List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
+from zoneinfo import ZoneInfo
 import jwt
 import bcrypt
 import base64
-from io import BytesIO
-from PIL import Image
+from io import BytesIO, StringIO
+from urllib.parse import quote
 import asyncio
+import time
+import math
+import bisect
+import heapq
+import unicodedata
+import hashlib
+import json
+import csv
+import zlib
+import zipfile
+import copy
+import sqlite3
+from collections import deque, OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from storage import Storage, MongoStorage, SQLiteStorage, apply_update
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'service_order_db')]
+# Where users and service orders live: mongo, or sqlite for a single box with
+# no database server (features built on MongoDB are then unavailable)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+SQLITE_PATH = Path(os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'data' / 'service_orders.db')))
+MONGO_FEATURES = STORAGE_BACKEND == "mongo"
+
+# MongoDB connection settings (all overridable from .env)
+mongo_url = os.environ.get('MONGO_URL')
+DB_NAME = os.environ.get('DB_NAME', 'service_order_db')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '3000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '10000'))
+# primary keeps read-after-write consistent; primaryPreferred can read stale data during a failover
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+MONGO_WARMUP_PINGS = int(os.environ.get('MONGO_WARMUP_PINGS', str(MONGO_MIN_POOL_SIZE)))
+
+# Process pool for CPU-heavy work (thumbnails, PDF rendering)
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', '2'))
+
+# Created in the app lifespan (see lifespan below)
+client: Optional[AsyncIOMotorClient] = None
+db = None
+storage: Optional[Storage] = None
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    # Created on first use so each (forked) worker gets its own pool
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _cpu_pool
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Track connection pool usage so /health/ready can report it"""
+
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+        self.wait_timeouts = 0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open = max(0, self.open - 1)
+
+    def connection_checked_out(self, event):
+        self.in_use += 1
+
+    def connection_checked_in(self, event):
+        self.in_use = max(0, self.in_use - 1)
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self.wait_timeouts += 1
+
+pool_stats = PoolStatsListener()
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        readPreference=MONGO_READ_PREFERENCE,
+        event_listeners=[pool_stats],
+    )
+
+async def warm_up_db():
+    """Open pool connections up front so the first requests don't pay for it"""
+    pings = [db.command("ping") for _ in range(max(1, MONGO_WARMUP_PINGS))]
+    await asyncio.gather(*pings)
+
+async def ensure_indexes():
+    """Create the indexes the routes rely on (no-op if they already exist)"""
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("email")
+    await db.service_orders.create_index("id", unique=True)
+    await db.service_orders.create_index("created_at")
+    await db.service_orders.create_index([("status", 1), ("created_at", 1)])
+    await db.service_orders.create_index([("status", 1), ("updated_at", 1)])
+    for key in DUPLICATE_CHECK_KEYS:
+        # Covers the duplicate check on create: answered from the index alone
+        await db.service_orders.create_index([(key, 1), ("status", 1), ("id", 1)])
+    await db.service_orders_archive.create_index("id", unique=True)
+    await db.service_orders_archive.create_index("created_at")
+    await db.service_orders_archive.create_index("opening_date")
+    await ensure_lookup_keys()
+    await ensure_duplicate_keys()
+    await db.audit_log.create_index([("order_id", 1), ("timestamp", -1)])
+    await ensure_resolution_fields()
+    await db.service_orders.create_index("resolved_at")
+    await db.service_orders_archive.create_index("resolved_at")
+    await db.verification_rollups.create_index("month")
+    await db.verification_rollups.create_index([("brand", 1), ("model", 1), ("month", 1)])
+    if RATE_LIMIT_STORE == "mongo":
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+    await db.sync_idempotency.create_index("expires_at", expireAfterSeconds=0)
+
+async def warm_up_caches():
+    """Run the dashboard's first queries so their pages are hot in Mongo's cache"""
+    await db.service_orders.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    await db.service_orders.find({}, {"_id": 0}).sort("created_at", 1).to_list(1000)
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
+# Rate limits ("requests/seconds" per user, or per IP for login) and the
+# maximum number of concurrent requests each expensive route may run
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')  # memory or mongo
+RATE_LIMIT_OCR = os.environ.get('RATE_LIMIT_OCR', '10/60')
+RATE_LIMIT_EXPORT = os.environ.get('RATE_LIMIT_EXPORT', '6/60')
+RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/60')
+CONCURRENCY_OCR = int(os.environ.get('CONCURRENCY_OCR', '4'))
+CONCURRENCY_EXPORT = int(os.environ.get('CONCURRENCY_EXPORT', '2'))
+CONCURRENCY_LOGIN = int(os.environ.get('CONCURRENCY_LOGIN', '8'))
+RATE_LIMIT_PDF = os.environ.get('RATE_LIMIT_PDF', '30/60')
+CONCURRENCY_PDF = int(os.environ.get('CONCURRENCY_PDF', '2'))
+ADMISSION_WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_SECONDS', '0.5'))
+
+# Attachments (photos of equipment, counters, signed forms)
+ATTACHMENT_STORAGE = os.environ.get('ATTACHMENT_STORAGE', 'gridfs')  # gridfs or disk
+ATTACHMENT_DIR = Path(os.environ.get('ATTACHMENT_DIR', str(ROOT_DIR / 'attachments')))
+ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', str(25 * 1024 * 1024)))
+ATTACHMENT_CHUNK_BYTES = 256 * 1024
+IMAGE_VARIANTS = {"thumb": 320, "web": 1600}  # longest side in pixels
+
+# Server-side PDF rendering of service orders
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', str(ROOT_DIR / 'pdf_cache')))
+PDF_BATCH_MAX = int(os.environ.get('PDF_BATCH_MAX', '500'))
+
+# Hot/cold tiering: RESOLVIDO orders untouched for ARCHIVE_AFTER_DAYS move to
+# the archive collection (ARCHIVE_INTERVAL_MINUTES=0 disables the periodic job)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_MINUTES = int(os.environ.get('ARCHIVE_INTERVAL_MINUTES', '60'))
+
+# Autocomplete index (kept in memory per worker, refreshed periodically)
+SUGGEST_MAX_VALUES = int(os.environ.get('SUGGEST_MAX_VALUES', '20000'))  # per field
+SUGGEST_REFRESH_MINUTES = int(os.environ.get('SUGGEST_REFRESH_MINUTES', '15'))
+
+# Audit log of order changes, buffered in memory and written in batches
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', '100'))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('AUDIT_FLUSH_INTERVAL_SECONDS', '1'))
+AUDIT_MAX_BUFFER = int(os.environ.get('AUDIT_MAX_BUFFER', '50000'))
+
+# Streaming CSV/NDJSON/Parquet exports
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+EXPORT_PARQUET_ROW_GROUP = int(os.environ.get('EXPORT_PARQUET_ROW_GROUP', '50000'))
+
+# Offline sync: replayed idempotency keys are remembered this long
+SYNC_MAX_MUTATIONS = int(os.environ.get('SYNC_MAX_MUTATIONS', '500'))
+SYNC_IDEMPOTENCY_TTL_HOURS = float(os.environ.get('SYNC_IDEMPOTENCY_TTL_HOURS', '72'))
+
+# Scheduled reports: definitions in REPORTS_FILE (a JSON list), artifacts kept
+# on disk in REPORT_DIR and rebuilt only after orders change
+REPORTS_FILE = Path(os.environ.get('REPORTS_FILE', str(ROOT_DIR / 'reports.json')))
+REPORT_DIR = Path(os.environ.get('REPORT_DIR', str(ROOT_DIR / 'reports')))
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+REPORT_TIMEZONE = os.environ.get('REPORT_TIMEZONE', 'UTC')  # for schedules and periods
+
+# Cache of list/stats results, dropped whenever the order data version changes
+# (QUERY_CACHE_MAX_ENTRIES=0 disables it)
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', '256'))
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get('QUERY_CACHE_TTL_SECONDS', '60'))
+DATA_VERSION_CHECK_SECONDS = float(os.environ.get('DATA_VERSION_CHECK_SECONDS', '1'))  # staleness across workers
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, storage, _cpu_pool
+    background_jobs = []
+    if MONGO_FEATURES:
+        client = create_mongo_client()
+        db = client[DB_NAME]
+        storage = MongoStorage(db)
+        try:
+            # Runs per worker before it accepts traffic
+            await warm_up_db()
+            await ensure_indexes()
+            await warm_up_caches()
+        except PyMongoError as e:
+            # Start anyway; /health/ready reports the outage until Mongo is back
+            logging.error(f"MongoDB warm-up failed: {str(e)}")
+        background_jobs.append(asyncio.create_task(audit_log.run()))
+        if ARCHIVE_INTERVAL_MINUTES > 0:
+            background_jobs.append(asyncio.create_task(
+                run_periodically("archive", ARCHIVE_INTERVAL_MINUTES * 60, archive_resolved_orders)
+            ))
+    else:
+        storage = SQLiteStorage(SQLITE_PATH)
+    await storage.open()
+    if not MONGO_FEATURES:
+        await ensure_duplicate_keys()
+    background_jobs.append(asyncio.create_task(suggest_index.run()))
+    report_scheduler.load(REPORTS_FILE)
+    if report_scheduler.reports:
+        background_jobs.append(asyncio.create_task(report_scheduler.run()))
+    yield
+    for job in background_jobs:
+        job.cancel()
+    if MONGO_FEATURES:
+        await audit_log.flush()
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    await storage.close()
+    if client is not None:
+        client.close()
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -69,6 +309,22 @@ class Verification(BaseModel):
     status: str  # BOA, RUIM, N/A
     observation: Optional[str] = None
 
+class StatusTransition(BaseModel):
+    status: str
+    from_status: Optional[str] = None
+    at: datetime
+    by: Optional[str] = None
+
+class Attachment(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    content_type: str
+    size: int
+    file_id: str
+    variants: Dict[str, str] = Field(default_factory=dict)  # variant name -> file_id
+    uploaded_by: str
+    uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class ServiceOrder(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -113,6 +369,16 @@ class ServiceOrder(BaseModel):
     # Observações
     observations: Optional[str] = None
     
+    # Anexos (fotos, formulários assinados)
+    attachments: List[Attachment] = Field(default_factory=list)
+    
+    # SLA (maintained by the server on status changes)
+    status_since: Optional[datetime] = None
+    status_history: List[StatusTransition] = Field(default_factory=list)
+    status_durations: Dict[str, float] = Field(default_factory=dict)  # seconds spent per status
+    resolved_at: Optional[datetime] = None
+    resolution_seconds: Optional[float] = None
+    
     # Metadata
     created_by: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -174,6 +440,37 @@ class ServiceOrderUpdate(BaseModel):
     equipment_replaced: Optional[bool] = None
     observations: Optional[str] = None
 
+class PDFBatchRequest(BaseModel):
+    ids: List[str]
+
+class SyncMutation(BaseModel):
+    idempotency_key: str  # generated by the client, reused on every retry
+    op: str  # create or update
+    order_id: Optional[str] = None  # required for update; optional client-generated id for create
+    base_version: Optional[str] = None  # updated_at of the order the client edited
+    data: Dict[str, Any] = Field(default_factory=dict)
+
+class SyncRequest(BaseModel):
+    mutations: List[SyncMutation]
+
+class ScheduledReport(BaseModel):
+    name: str = Field(pattern=r"^[A-Za-z0-9_-]+$")
+    schedule: str = "0 2 1 * *"  # cron: minute hour day-of-month month day-of-week (0 = Sunday)
+    format: str = "xlsx"  # or csv, ndjson, parquet
+    columns: Optional[str] = None
+    gzip: bool = False
+    # Same filters as the export; period (current_month, last_month) sets the dates
+    period: Optional[str] = None
+    status: Optional[str] = None
+    pat: Optional[str] = None
+    ticket_number: Optional[str] = None
+    os_number: Optional[str] = None
+    equipment_serial: Optional[str] = None
+    unit: Optional[str] = None
+    date_start: Optional[str] = None
+    date_end: Optional[str] = None
+    include_archived: bool = False
+
 class OCRResponse(BaseModel):
     extracted_text: str
     structured_data: dict
@@ -203,7 +500,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+        user_doc = await storage.users.find_one({"id": user_id}, exclude=("password",))
         if not user_doc:
             raise HTTPException(status_code=401, detail="User not found")
         
@@ -217,6 +514,1655 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def mongo_required():
+    """Dependency for routes built on MongoDB-only features (views, GridFS, aggregations)"""
+    if not MONGO_FEATURES:
+        raise HTTPException(status_code=501, detail="Not available with the SQLite storage backend")
+
+# ============ RATE LIMITING ============
+
+class RateLimitStore(ABC):
+    """Token bucket storage. Subclass to share buckets across workers."""
+
+    @abstractmethod
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take one token from the bucket; return 0 if allowed, else seconds to wait"""
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Per-process buckets (each worker enforces its own quota)"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = time.monotonic()
+        tokens, last, _ = self.buckets.get(key, (capacity, now, None))
+        tokens = min(capacity, tokens + (now - last) * refill_per_second)
+        # Time for this bucket to refill from empty; routes have different quotas
+        full_after = capacity / refill_per_second
+
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now, full_after)
+            retry_after = 0.0
+        else:
+            self.buckets[key] = (tokens, now, full_after)
+            retry_after = (1 - tokens) / refill_per_second
+
+        if len(self.buckets) > self.max_keys:
+            self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < v[2]}
+
+class MongoRateLimitStore(RateLimitStore):
+    """Buckets in a shared collection, updated atomically with a pipeline update"""
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = datetime.now(timezone.utc)
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, 1000]}
+        refilled = {"$min": [
+            capacity,
+            {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, refill_per_second]}]}
+        ]}
+        bucket = await db.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "ts": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": now + timedelta(seconds=capacity / refill_per_second),
+                }},
+            ],
+            upsert=True,
+            return_document=True,
+        )
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / refill_per_second
+
+def create_rate_limit_store() -> RateLimitStore:
+    if RATE_LIMIT_STORE == "mongo" and MONGO_FEATURES:
+        return MongoRateLimitStore()
+    return MemoryRateLimitStore()
+
+rate_limit_store = create_rate_limit_store()
+
+def parse_rate(rate: str):
+    """Parse "10/60" into (capacity, refill per second)"""
+    count, seconds = rate.split("/")
+    return int(count), int(count) / float(seconds)
+
+def client_ip(request: Request) -> str:
+    # X-Forwarded-For is client-controlled; uvicorn already resolves it into
+    # request.client for the proxies trusted with --forwarded-allow-ips
+    return request.client.host if request.client else "unknown"
+
+class AdmissionSlot:
+    """One acquired concurrency slot; release() is safe to call more than once"""
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self.semaphore = semaphore
+        self.held = True
+        self.handed_off = False  # a streamed response releases it instead
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.semaphore.release()
+
+def hold_until_sent(response: StreamingResponse, held: AdmissionSlot) -> StreamingResponse:
+    """Keep the slot until the body has been sent.
+
+    Dependencies with yield exit before a StreamingResponse body runs, so the
+    dependency alone would only cover building the response object.
+    """
+    body = response.body_iterator
+
+    async def stream():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            held.release()
+
+    response.body_iterator = stream()
+    # Also runs when the client disconnects before the body starts
+    response.background = BackgroundTask(held.release)
+    held.handed_off = True
+    return response
+
+class AdmissionControl:
+    """Dependency applying a per-key token bucket and a per-route concurrency cap.
+
+    Over quota -> 429, too many requests already running -> 503, both with
+    Retry-After.
+    """
+
+    def __init__(self, route: str, rate: str, max_concurrency: int):
+        self.route = route
+        self.capacity, self.refill_per_second = parse_rate(rate)
+        self.max_concurrency = max_concurrency
+        self.semaphore = None  # created lazily inside the running event loop
+
+    async def check_rate(self, key: str):
+        retry_after = await rate_limit_store.take(
+            f"{self.route}:{key}", self.capacity, self.refill_per_second
+        )
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, round(retry_after + 0.5)))}
+            )
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=ADMISSION_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, try again",
+                headers={"Retry-After": "2"}
+            )
+        held = AdmissionSlot(self.semaphore)
+        try:
+            yield held
+        finally:
+            if not held.handed_off:
+                held.release()
+
+class UserAdmissionControl(AdmissionControl):
+    """Quota per authenticated user"""
+
+    async def __call__(self, current_user: User = Depends(get_current_user)):
+        await self.check_rate(current_user.id)
+        async with self.slot() as held:
+            yield held
+
+class IPAdmissionControl(AdmissionControl):
+    """Quota per client IP, for routes called before authentication"""
+
+    async def __call__(self, request: Request):
+        await self.check_rate(client_ip(request))
+        async with self.slot() as held:
+            yield held
+
+ocr_admission = UserAdmissionControl("ocr", RATE_LIMIT_OCR, CONCURRENCY_OCR)
+export_admission = UserAdmissionControl("export", RATE_LIMIT_EXPORT, CONCURRENCY_EXPORT)
+login_admission = IPAdmissionControl("login", RATE_LIMIT_LOGIN, CONCURRENCY_LOGIN)
+pdf_admission = UserAdmissionControl("pdf", RATE_LIMIT_PDF, CONCURRENCY_PDF)
+
+# ============ ATTACHMENT STORAGE ============
+
+class AttachmentStorage(ABC):
+    """Where attachment bytes live. Files are written and read in chunks."""
+
+    @abstractmethod
+    async def save(self, filename: str, content_type: str, chunks) -> tuple:
+        """Store an async iterator of byte chunks; return (file_id, size)"""
+
+    @abstractmethod
+    async def size(self, file_id: str) -> int:
+        """Size of the stored file in bytes"""
+
+    @abstractmethod
+    def read(self, file_id: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Async iterator over the bytes in [start, start + length)"""
+
+    @abstractmethod
+    async def delete(self, file_id: str):
+        """Remove the file"""
+
+class GridFSAttachmentStorage(AttachmentStorage):
+    def bucket(self):
+        return AsyncIOMotorGridFSBucket(db, bucket_name="attachments")
+
+    async def save(self, filename: str, content_type: str, chunks) -> tuple:
+        stream = self.bucket().open_upload_stream(
+            filename,
+            chunk_size_bytes=ATTACHMENT_CHUNK_BYTES,
+            metadata={"content_type": content_type}
+        )
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                await stream.write(chunk)
+        except BaseException:
+            await stream.abort()
+            raise
+        await stream.close()
+        return str(stream._id), size
+
+    async def size(self, file_id: str) -> int:
+        grid_out = await self.bucket().open_download_stream(ObjectId(file_id))
+        return grid_out.length
+
+    async def read(self, file_id: str, start: int = 0, length: Optional[int] = None):
+        grid_out = await self.bucket().open_download_stream(ObjectId(file_id))
+        remaining = grid_out.length - start if length is None else length
+        grid_out.seek(start)
+        while remaining > 0:
+            chunk = await grid_out.read(min(ATTACHMENT_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, file_id: str):
+        await self.bucket().delete(ObjectId(file_id))
+
+class DiskAttachmentStorage(AttachmentStorage):
+    def path(self, file_id: str) -> Path:
+        return ATTACHMENT_DIR / file_id[:2] / file_id
+
+    async def save(self, filename: str, content_type: str, chunks) -> tuple:
+        file_id = uuid.uuid4().hex
+        path = self.path(file_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        f = await asyncio.to_thread(open, path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            f.close()
+            path.unlink(missing_ok=True)
+            raise
+        f.close()
+        return file_id, size
+
+    async def size(self, file_id: str) -> int:
+        try:
+            return (await asyncio.to_thread(self.path(file_id).stat)).st_size
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Attachment file not found")
+
+    async def read(self, file_id: str, start: int = 0, length: Optional[int] = None):
+        f = await asyncio.to_thread(open, self.path(file_id), "rb")
+        try:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = ATTACHMENT_CHUNK_BYTES if remaining is None else min(ATTACHMENT_CHUNK_BYTES, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def delete(self, file_id: str):
+        await asyncio.to_thread(self.path(file_id).unlink, True)
+
+def create_attachment_storage() -> AttachmentStorage:
+    if ATTACHMENT_STORAGE == "disk":
+        return DiskAttachmentStorage()
+    return GridFSAttachmentStorage()
+
+attachment_storage = create_attachment_storage()
+
+def render_image_variants(data: bytes, sizes: dict) -> dict:
+    """Runs in the process pool: downscale an image to each size as JPEG"""
+    from PIL import Image, ImageOps
+
+    results = {}
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for name, max_side in sizes.items():
+            variant = img.copy()
+            variant.thumbnail((max_side, max_side))
+            out = BytesIO()
+            variant.save(out, format="JPEG", quality=80, optimize=True)
+            results[name] = out.getvalue()
+    return results
+
+async def generate_attachment_variants(order_id: str, attachment: Attachment):
+    """Background task: build thumbnail and web-size copies of an uploaded photo"""
+    try:
+        data = b"".join([chunk async for chunk in attachment_storage.read(attachment.file_id)])
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(get_cpu_pool(), render_image_variants, data, IMAGE_VARIANTS)
+
+        async def single(payload: bytes):
+            yield payload
+
+        variants = {}
+        for name, payload in rendered.items():
+            file_id, _ = await attachment_storage.save(f"{name}_{attachment.filename}", "image/jpeg", single(payload))
+            variants[name] = file_id
+
+        # The order may have been archived while we were rendering
+        for collection in (db.service_orders, db.service_orders_archive):
+            result = await collection.update_one(
+                {"id": order_id, "attachments.id": attachment.id},
+                {"$set": {"attachments.$.variants": variants, "updated_at": datetime.now(timezone.utc).isoformat()}}
+            )
+            if result.matched_count:
+                break
+        if result.matched_count == 0:
+            # Order or attachment removed while we were rendering
+            for file_id in variants.values():
+                await attachment_storage.delete(file_id)
+        else:
+            await order_data_version.bump()
+    except Exception as e:
+        logging.error(f"Thumbnail generation failed for attachment {attachment.id}: {str(e)}")
+
+def parse_range(range_header: str, size: int) -> tuple:
+    """Parse a single "bytes=start-end" range into (start, length)"""
+    try:
+        unit, spec = range_header.split("=", 1)
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError
+        start_str, end_str = spec.strip().split("-", 1)
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            start = max(0, size - int(end_str))
+            end = size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+    end = min(end, size - 1)
+    if start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end - start + 1
+
+# ============ PDF RENDERING ============
+
+@lru_cache(maxsize=1)
+def get_pdf_template() -> dict:
+    """Styles and static blocks of the O.S. layout, built once per process"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, TableStyle
+
+    base = ParagraphStyle("base", fontName="Helvetica", fontSize=8, leading=10)
+    styles = {
+        "base": base,
+        "label": ParagraphStyle("label", parent=base, fontName="Helvetica-Bold"),
+        "company": ParagraphStyle("company", parent=base, fontName="Helvetica-Bold", fontSize=14,
+                                  leading=17, textColor=colors.HexColor("#1e40af")),
+        "title": ParagraphStyle("title", parent=base, fontName="Helvetica-Bold", fontSize=14,
+                                leading=18, alignment=1, spaceBefore=8, spaceAfter=8),
+        "section": ParagraphStyle("section", parent=base, fontName="Helvetica-Bold", fontSize=10,
+                                  leading=12, spaceBefore=6, spaceAfter=3),
+        "small": ParagraphStyle("small", parent=base, fontSize=7, leading=9, alignment=1),
+    }
+    grid = [
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("TOPPADDING", (0, 0), (-1, -1), 2),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+    ]
+    label_fill = colors.HexColor("#e2e8f0")
+    return {
+        "pagesize": A4,
+        "margin": 12 * mm,
+        "width": A4[0] - 24 * mm,
+        "styles": styles,
+        "grid": TableStyle(grid),
+        "label_columns": TableStyle(grid + [
+            ("BACKGROUND", (0, 0), (0, -1), label_fill),
+            ("BACKGROUND", (2, 0), (2, -1), label_fill),
+        ]),
+        "label_first_column": TableStyle(grid + [("BACKGROUND", (0, 0), (0, -1), label_fill)]),
+        "header_row": TableStyle(grid + [("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#cbd5e1"))]),
+        "header": [
+            Paragraph("TSM PRINTER SOLUTIONS", styles["company"]),
+            Paragraph("<b>CNPJ:</b> 29.511.297/0001-31", base),
+            Paragraph("<b>Endereço:</b> Avenida Doutor Albino Imparato, 16 (LOTE 16 QUADRA 69)", base),
+            Paragraph("Jardim Catarina - São Gonçalo/RJ - CEP: 24716-452", base),
+            Paragraph("<b>E-mail:</b> tsmcartucho@gmail.com", base),
+            Paragraph("ORDEM DE SERVIÇO", styles["title"]),
+        ],
+        "declaration": Paragraph(
+            "<b>Declaração:</b> Atesto que os serviços relacionados acima foram executados. "
+            "Equipamento testado dentro e fora do sistema, funcionando perfeitamente.", base
+        ),
+    }
+
+def render_service_order_pdf(order: dict) -> bytes:
+    """Runs in the process pool: lay out one service order as a PDF"""
+    from xml.sax.saxutils import escape
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, Spacer
+
+    template = get_pdf_template()
+    styles = template["styles"]
+    width = template["width"]
+
+    def text(value) -> Paragraph:
+        value = "" if value is None else str(value)
+        return Paragraph(escape(value).replace("\n", "<br/>"), styles["base"])
+
+    def label(value: str) -> Paragraph:
+        return Paragraph(value, styles["label"])
+
+    def pairs_table(rows, style):
+        return Table(rows, colWidths=[width * 0.2, width * 0.3, width * 0.2, width * 0.3], style=style)
+
+    def text_block(title: str, value):
+        return [
+            Paragraph(title, styles["section"]),
+            Table([[text(value or "-")]], colWidths=[width], style=template["grid"]),
+        ]
+
+    story = list(template["header"])
+    story.append(pairs_table([
+        [label("Responsável Abertura"), text(order.get("responsible_opening")),
+         label("Nº Chamado"), text(order.get("ticket_number"))],
+        [label("Nº da O.S."), text(order.get("os_number")), label("PAT"), text(order.get("pat"))],
+        [label("Data Abertura"), text(order.get("opening_date")),
+         label("Responsável Técnico"), text(order.get("responsible_tech"))],
+        [label("Telefone"), text(order.get("phone")), label("Situação"), text(order.get("status"))],
+    ], template["label_columns"]))
+    story.append(Spacer(1, 4))
+    story.append(pairs_table([
+        [label("Cliente"), text(order.get("client_name")), label("Unidade"), text(order.get("unit"))],
+    ], template["label_columns"]))
+    story.append(Table([
+        [label("Endereço"), text(order.get("service_address"))],
+        [label("Observações"), text(order.get("observations"))],
+    ], colWidths=[width * 0.2, width * 0.8], style=template["label_first_column"]))
+
+    equipment = " ".join(
+        str(order.get(key)) for key in ("equipment_type", "equipment_brand", "equipment_model") if order.get(key)
+    )
+    story.append(Paragraph("INFORMAÇÕES DO EQUIPAMENTO", styles["section"]))
+    story.append(pairs_table([
+        [label("Equipamento"), text(equipment), label("S/N Placa"), text(order.get("equipment_board_serial"))],
+        [label("S/N Equipamento"), text(order.get("equipment_serial")), "", ""],
+    ], template["label_columns"]))
+
+    story.extend(text_block("INFORMAÇÕES DO CHAMADO", order.get("call_info")))
+    story.extend(text_block("MATERIAIS", order.get("materials")))
+    story.extend(text_block("LAUDO TÉCNICO", order.get("technical_report")))
+
+    story.append(Paragraph("VERIFICAÇÕES", styles["section"]))
+    rows = [[label("Item Verificado"), label("Situação"), label("Observações")]]
+    for verification in order.get("verifications") or []:
+        rows.append([
+            text(verification.get("item")),
+            text(verification.get("status")),
+            text(verification.get("observation")),
+        ])
+    if len(rows) == 1:
+        rows.append([text("Nenhuma verificação registrada"), "", ""])
+    story.append(Table(rows, colWidths=[width * 0.55, width * 0.15, width * 0.3], style=template["header_row"]))
+
+    story.append(Spacer(1, 4))
+    story.append(pairs_table([
+        [label("Contador Total Páginas"), text(order.get("total_page_count")),
+         label("Próxima Visita"), text(order.get("next_visit"))],
+        [label("Pendências"), text(order.get("pending_issues")),
+         label("Equipamento Trocado"), text("SIM" if order.get("equipment_replaced") else "NÃO")],
+    ], template["label_columns"]))
+
+    story.append(Spacer(1, 8))
+    story.append(template["declaration"])
+    story.append(Spacer(1, 28))
+    signature_line = "_" * 45
+    story.append(Table([
+        [Paragraph(signature_line, styles["small"]), Paragraph(signature_line, styles["small"])],
+        [Paragraph("<b>Assinatura do Técnico</b>", styles["small"]),
+         Paragraph("<b>Assinatura do Cliente</b>", styles["small"])],
+        ["", Paragraph("Ciente do serviço executado", styles["small"])],
+    ], colWidths=[width * 0.5, width * 0.5]))
+
+    out = BytesIO()
+    doc = SimpleDocTemplate(
+        out,
+        pagesize=template["pagesize"],
+        leftMargin=template["margin"],
+        rightMargin=template["margin"],
+        topMargin=template["margin"],
+        bottomMargin=template["margin"],
+        title=f"O.S. {order.get('os_number') or order.get('id')}",
+    )
+    doc.build(story)
+    return out.getvalue()
+
+def order_pdf_path(order: dict) -> Path:
+    # The version changes with every update, so stale PDFs are never served
+    version = hashlib.sha1(str(order.get('updated_at')).encode()).hexdigest()[:12]
+    return PDF_CACHE_DIR / f"{order['id']}-{version}.pdf"
+
+async def get_order_pdf(order: dict) -> bytes:
+    """Return the cached PDF for this version of the order, rendering it if needed"""
+    path = order_pdf_path(order)
+    try:
+        return await asyncio.to_thread(path.read_bytes)
+    except FileNotFoundError:
+        pass
+
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(get_cpu_pool(), render_service_order_pdf, order)
+
+    def store():
+        PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for stale in PDF_CACHE_DIR.glob(f"{order['id']}-*.pdf"):
+            stale.unlink(missing_ok=True)
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(pdf)
+        tmp.replace(path)
+
+    await asyncio.to_thread(store)
+    return pdf
+
+def order_pdf_filename(order: dict) -> str:
+    name = order.get('os_number') or order.get('ticket_number') or "OS"
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(name))
+    return f"OS_{safe}_{order['id'][:8]}.pdf"
+
+class StreamBuffer:
+    """Write-only sink for zipfile/pyarrow writers; drained after each entry or
+    row group so the file can stream"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+async def stream_orders_pdf_zip(orders):
+    """Render orders (an async iterator) a few at a time and stream them as ZIP entries"""
+    buffer = StreamBuffer()
+    archive = zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED)
+    pending = deque()
+    window = CPU_WORKERS * 2
+
+    async def write_oldest():
+        order, task = pending.popleft()
+        archive.writestr(order_pdf_filename(order), await task)
+        return buffer.drain()
+
+    try:
+        async for order in orders:
+            pending.append((order, asyncio.ensure_future(get_order_pdf(order))))
+            if len(pending) >= window:
+                yield await write_oldest()
+        while pending:
+            yield await write_oldest()
+        archive.close()
+        yield buffer.drain()
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+# ============ BACKGROUND JOBS ============
+
+async def acquire_job_lease(name: str, seconds: float) -> bool:
+    """Let only one worker run a periodic job per interval"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"expires_at": {"$exists": False}}]},
+            {"$set": {"expires_at": now + timedelta(seconds=seconds), "holder": os.getpid()}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Lease document exists and has not expired: another worker holds it
+        return False
+
+async def run_periodically(name: str, interval_seconds: float, job):
+    while True:
+        try:
+            if await acquire_job_lease(name, interval_seconds * 0.9):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Background job {name} failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+# ============ QUERY CACHE ============
+# Every write to service orders bumps a version counter kept in the database,
+# so all workers agree on it. Cached results are tagged with the version they were
+# computed at and ignored once it moves on.
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution"""
+
+    def __init__(self):
+        self.calls: Dict[object, asyncio.Future] = {}
+
+    async def do(self, key, fn):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        # A cancelled caller must not cancel the query the others are waiting on
+        return await asyncio.shield(task)
+
+class DataVersion:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+        self.checked_at = float("-inf")
+        self.flight = SingleFlight()
+
+    async def get(self) -> int:
+        """Current version; other workers' bumps show up within DATA_VERSION_CHECK_SECONDS"""
+        if time.monotonic() - self.checked_at >= DATA_VERSION_CHECK_SECONDS:
+            await self.flight.do(None, self._load)
+        return self.value
+
+    async def _load(self):
+        self.value = max(self.value, await storage.data_version(self.name))
+        self.checked_at = time.monotonic()
+
+    async def bump(self):
+        self.value = max(self.value, await storage.bump_data_version(self.name))
+        self.checked_at = time.monotonic()
+
+class QueryCache:
+    """Bounded LRU of query results, valid for one data version"""
+
+    def __init__(self, version: DataVersion, max_entries: int, ttl_seconds: float):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: OrderedDict = OrderedDict()  # key -> (version, stored_at, value)
+        self.flight = SingleFlight()
+
+    async def get(self, key, compute):
+        """Cached value for key, or the result of compute(); callers must not mutate it"""
+        if self.max_entries <= 0:
+            return await compute()
+        version = await self.version.get()
+        entry = self.entries.get(key)
+        if entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl_seconds:
+            self.entries.move_to_end(key)
+            return entry[2]
+
+        async def load():
+            value = await compute()
+            # A write that landed during the query may not be in the result
+            if self.version.value == version:
+                self.entries[key] = (version, time.monotonic(), value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return value
+
+        return await self.flight.do((version, key), load)
+
+order_data_version = DataVersion("service_orders")
+query_cache = QueryCache(order_data_version, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
+
+# ============ ARCHIVING ============
+
+def archive_horizon() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+async def archive_resolved_orders(batch_size: int = None) -> int:
+    """Move RESOLVIDO orders older than the horizon to the archive, batch by batch.
+
+    Each batch is copied (idempotent upserts) and then removed from the hot
+    collection only if unchanged since the copy; orders edited in between
+    are dropped from the archive again, so every order ends up in exactly
+    one collection. Orders the archive rejects stay hot and are skipped for
+    the rest of the run, so they never hold back the orders behind them.
+    """
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    cutoff = archive_horizon().isoformat()
+    moved = 0
+    failed_ids = set()
+    while True:
+        batch_filter = {"status": "RESOLVIDO", "updated_at": {"$lt": cutoff}}
+        if failed_ids:
+            batch_filter["id"] = {"$nin": list(failed_ids)}
+        batch = await db.service_orders.find(
+            batch_filter, {"_id": 0}
+        ).sort("updated_at", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        copied = batch
+        try:
+            await db.service_orders_archive.bulk_write(
+                [ReplaceOne({"id": order['id']}, order, upsert=True) for order in batch],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered: every operation without a write error was applied
+            write_errors = e.details.get("writeErrors", [])
+            rejected = {batch[error["index"]]['id'] for error in write_errors}
+            logging.error(
+                f"Could not archive {len(rejected)} service orders: {write_errors[0].get('errmsg') if write_errors else e}"
+            )
+            failed_ids |= rejected
+            copied = [order for order in batch if order['id'] not in rejected]
+
+        deleted_count = 0
+        if copied:
+            deleted = await db.service_orders.bulk_write(
+                [DeleteOne({"id": order['id'], "updated_at": order['updated_at'], "status": "RESOLVIDO"})
+                 for order in copied],
+                ordered=False
+            )
+            deleted_count = deleted.deleted_count
+
+        if deleted_count < len(copied):
+            # Some orders changed between copy and delete: they stay hot
+            still_hot = await db.service_orders.find(
+                {"id": {"$in": [order['id'] for order in copied]}}, {"_id": 0, "id": 1}
+            ).to_list(len(copied))
+            if still_hot:
+                await db.service_orders_archive.delete_many({"id": {"$in": [o['id'] for o in still_hot]}})
+
+        moved += deleted_count
+        if len(batch) < batch_size or (deleted_count == 0 and len(copied) == len(batch)):
+            break
+
+    if moved:
+        await order_data_version.bump()
+        logging.info(f"Archived {moved} resolved service orders")
+    return moved
+
+def should_include_archive(include_archived: bool, date_start: Optional[str], date_end: Optional[str]) -> bool:
+    """Only look at the archive when asked to, or when the date range reaches back into it"""
+    if include_archived:
+        return True
+    if date_end and not date_start:
+        return True
+    return bool(date_start) and date_start < archive_horizon().date().isoformat()
+
+async def find_service_order(order_id: str, exclude: tuple = ()) -> Optional[dict]:
+    """Find an order by id in the hot collection, falling back to the archive"""
+    order = await storage.service_orders.find_one({"id": order_id}, exclude=exclude)
+    if order is None and MONGO_FEATURES:
+        projection = {"_id": 0, **{field: 0 for field in exclude}}
+        order = await db.service_orders_archive.find_one({"id": order_id}, projection)
+    return order
+
+async def find_service_orders(filter_query: dict, include_archive: bool, limit: Optional[int] = 1000) -> List[dict]:
+    """Orders matching a filter, oldest first, optionally merged with the archive (limit=None for all)"""
+    orders = await storage.service_orders.find(filter_query, sort="created_at", limit=limit or 0)
+    if not include_archive or not MONGO_FEATURES:
+        return orders
+
+    archived = await db.service_orders_archive.find(filter_query, {"_id": 0}).sort("created_at", 1).to_list(limit)
+    # An order being archived may briefly exist in both; the hot copy wins
+    hot_ids = {order['id'] for order in orders}
+    merged = orders + [order for order in archived if order['id'] not in hot_ids]
+    merged.sort(key=lambda o: str(o.get('created_at', '')))
+    return merged[:limit]
+
+async def restore_archived_order(order_id: str) -> Optional[dict]:
+    """Move an archived order back to the hot collection (before editing it)"""
+    if not MONGO_FEATURES:
+        return None
+    order = await db.service_orders_archive.find_one({"id": order_id}, {"_id": 0})
+    if not order:
+        return None
+    await db.service_orders.replace_one({"id": order_id}, order, upsert=True)
+    await db.service_orders_archive.delete_one({"id": order_id})
+    return order
+
+# ============ ORDER VIEWS ============
+# Read-optimised documents derived from service orders. update_order_views()
+# is called after every create/update/delete; each view also has a rebuild
+# function (see rebuild_views.py) that recomputes it from the orders.
+
+# Keys are built both here and in aggregation pipelines (the rebuilds), which
+# must agree. $toUpper only changes ASCII letters, so accented letters are
+# first folded to their base letter with this explicit table on both sides.
+KEY_FOLDS = {
+    ch: unicodedata.normalize("NFKD", ch)[0]
+    for ch in "ÁÀÂÃÄÅáàâãäåÉÈÊËéèêëÍÌÎÏíìîïÓÒÔÕÖóòôõöÚÙÛÜúùûüÇçÑñÝýÿ"
+}
+KEY_TRANSLATION = str.maketrans({
+    **{ch: base.upper() for ch, base in KEY_FOLDS.items()},
+    **{ch: ch.upper() for ch in "abcdefghijklmnopqrstuvwxyz"},
+})
+
+def key_text(value: str) -> str:
+    """Upper-case without accents: "João" -> "JOAO" (same as mongo_key_text)"""
+    return value.translate(KEY_TRANSLATION)
+
+def mongo_key_text(expression) -> dict:
+    return {"$toUpper": {"$reduce": {
+        "input": {"$literal": [[ch, base] for ch, base in KEY_FOLDS.items()]},
+        "initialValue": expression,
+        "in": {"$replaceAll": {
+            "input": "$$value",
+            "find": {"$arrayElemAt": ["$$this", 0]},
+            "replacement": {"$arrayElemAt": ["$$this", 1]},
+        }},
+    }}}
+
+def normalize_key(value: Optional[str]) -> Optional[str]:
+    """Canonical form of serials, reference numbers and names for exact-match keys"""
+    if not value or not str(value).strip():
+        return None
+    return key_text(str(value).strip()).replace(" ", "")
+
+def mongo_normalize_key(field: str) -> dict:
+    # Aggregation-side equivalent of normalize_key()
+    return {"$replaceAll": {
+        "input": mongo_key_text({"$trim": {"input": {"$ifNull": [f"${field}", ""]}}}),
+        "find": " ",
+        "replacement": ""
+    }}
+
+EQUIPMENT_SERIAL_FIELDS = {"equipment": "equipment_serial", "board": "equipment_board_serial"}
+
+def equipment_history_entry(order: dict, source: str) -> dict:
+    return {
+        "id": order.get('id'),
+        "source": source,
+        "os_number": order.get('os_number'),
+        "ticket_number": order.get('ticket_number'),
+        "status": order.get('status'),
+        "opening_date": order.get('opening_date'),
+        "created_at": order.get('created_at'),
+        "responsible_tech": order.get('responsible_tech'),
+        "materials": order.get('materials'),
+        "total_page_count": order.get('total_page_count'),
+        "equipment_replaced": bool(order.get('equipment_replaced')),
+    }
+
+def equipment_keys(order: Optional[dict]) -> dict:
+    """Normalized serial -> which serial field it came from"""
+    keys = {}
+    for source, field in EQUIPMENT_SERIAL_FIELDS.items():
+        key = normalize_key((order or {}).get(field))
+        if key and key not in keys:
+            keys[key] = source
+    return keys
+
+async def update_equipment_history(before: Optional[dict], after: Optional[dict]):
+    old_keys = equipment_keys(before)
+    new_keys = equipment_keys(after)
+    order_id = (after or before)['id']
+
+    for key in old_keys.keys() - new_keys.keys():
+        await db.equipment_history.update_one({"_id": key}, {"$pull": {"orders": {"id": order_id}}})
+
+    for key, source in new_keys.items():
+        await db.equipment_history.update_one({"_id": key}, {"$pull": {"orders": {"id": order_id}}})
+        await db.equipment_history.update_one(
+            {"_id": key},
+            {
+                "$push": {"orders": {"$each": [equipment_history_entry(after, source)], "$sort": {"created_at": 1}}},
+                "$set": {"serial": after.get(EQUIPMENT_SERIAL_FIELDS[source])},
+            },
+            upsert=True
+        )
+
+async def rebuild_equipment_history():
+    """Recompute every equipment summary from the hot and archived orders"""
+    fields = {name: f"${name}" for name in equipment_history_entry({}, "").keys()}
+
+    def keyed_by(source: str) -> dict:
+        return {**fields, "source": source, "equipment_replaced": {"$eq": ["$equipment_replaced", True]}}
+
+    pipeline = [
+        {"$unionWith": {"coll": "service_orders_archive"}},
+        {"$project": {
+            "_id": 0,
+            "keys": [
+                {"key": mongo_normalize_key("equipment_serial"), "serial": "$equipment_serial",
+                 "entry": keyed_by("equipment")},
+                {"key": mongo_normalize_key("equipment_board_serial"), "serial": "$equipment_board_serial",
+                 "entry": keyed_by("board")},
+            ],
+        }},
+        {"$unwind": "$keys"},
+        {"$match": {"keys.key": {"$ne": ""}}},
+        # An order whose two serials are equal is listed once
+        {"$group": {"_id": {"key": "$keys.key", "id": "$keys.entry.id"}, "first": {"$first": "$keys"}}},
+        {"$sort": {"first.entry.created_at": 1}},
+        {"$group": {
+            "_id": "$_id.key",
+            "serial": {"$last": "$first.serial"},
+            "orders": {"$push": "$first.entry"},
+        }},
+        {"$merge": {"into": "equipment_history", "whenMatched": "replace"}},
+    ]
+    await db.equipment_history.delete_many({})
+    await db.service_orders.aggregate(pipeline).to_list(None)
+
+# Technician work queues: one document per responsible_tech holding the ids
+# of that tech's active (not RESOLVIDO) orders per status, oldest first
+
+def tech_queue_position(order: Optional[dict]):
+    """(tech key, status) of an order in the queues, or None if it isn't queued"""
+    if not order:
+        return None
+    status = order.get('status') or "ABERTO"
+    if status == "RESOLVIDO":
+        return None
+    return normalize_key(order.get('responsible_tech')) or "", status
+
+async def update_tech_queue(before: Optional[dict], after: Optional[dict]):
+    old = tech_queue_position(before)
+    new = tech_queue_position(after)
+    if old == new and (before or {}).get('responsible_tech') == (after or {}).get('responsible_tech'):
+        return
+    order_id = (after or before)['id']
+
+    if old:
+        tech_key, status = old
+        await db.tech_queues.update_one({"_id": tech_key}, {"$pull": {f"orders.{status}": {"id": order_id}}})
+    if new:
+        tech_key, status = new
+        entry = {"id": order_id, "created_at": after.get('created_at')}
+        await db.tech_queues.update_one({"_id": tech_key}, {"$pull": {f"orders.{status}": {"id": order_id}}})
+        await db.tech_queues.update_one(
+            {"_id": tech_key},
+            {
+                "$push": {f"orders.{status}": {"$each": [entry], "$sort": {"created_at": 1}}},
+                "$set": {"tech": (after.get('responsible_tech') or "").strip() or None},
+            },
+            upsert=True
+        )
+
+async def rebuild_tech_queues():
+    """Recompute every technician queue from the hot collection (archived orders are all resolved)"""
+    pipeline = [
+        {"$match": {"status": {"$ne": "RESOLVIDO"}}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": {"tech_key": mongo_normalize_key("responsible_tech"), "status": {"$ifNull": ["$status", "ABERTO"]}},
+            "tech": {"$last": {"$trim": {"input": "$responsible_tech"}}},
+            "entries": {"$push": {"id": "$id", "created_at": "$created_at"}},
+        }},
+        {"$group": {
+            "_id": "$_id.tech_key",
+            "tech": {"$last": "$tech"},
+            "orders": {"$push": {"k": "$_id.status", "v": "$entries"}},
+        }},
+        {"$set": {"orders": {"$arrayToObject": "$orders"}}},
+        {"$merge": {"into": "tech_queues", "whenMatched": "replace"}},
+    ]
+    await db.tech_queues.delete_many({})
+    await db.service_orders.aggregate(pipeline).to_list(None)
+
+def tech_queue_response(queue: dict) -> dict:
+    orders = {status: [entry['id'] for entry in entries] for status, entries in queue.get('orders', {}).items() if entries}
+    counts = {status: len(ids) for status, ids in orders.items()}
+    return {
+        "tech": queue.get('tech'),
+        "total": sum(counts.values()),
+        "counts": counts,
+        "orders": orders,
+    }
+
+# Autocomplete for free-text fields: an in-memory sorted array of
+# (folded prefix key, value) pairs per field, ranked by how often each value
+# is used. Built from the database at startup and kept current on writes.
+
+SUGGEST_FIELDS = ["client_name", "unit", "service_address", "equipment_brand", "equipment_model"]
+SUGGEST_WORDS_INDEXED = 5  # also match from the start of the first few words
+SUGGEST_SCAN_LIMIT = 5000
+
+def fold_text(value: str) -> str:
+    """Lowercase and strip accents, so that "sao" matches "São" """
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+class FieldSuggestions:
+    def __init__(self, max_values: int):
+        self.max_values = max_values
+        self.counts = {}
+        self.keys = []  # sorted (folded key, value)
+
+    def index_keys(self, value: str) -> List[tuple]:
+        folded = fold_text(value)
+        words = folded.split()
+        keys = {folded}
+        for i in range(1, min(len(words), SUGGEST_WORDS_INDEXED)):
+            keys.add(" ".join(words[i:]))
+        return [(key, value) for key in keys]
+
+    def add(self, value: str, count: int = 1):
+        if value in self.counts:
+            self.counts[value] += count
+            return
+        if len(self.counts) >= self.max_values:
+            # Full: make room by dropping the least used value
+            least_used = min(self.counts, key=self.counts.get)
+            if self.counts[least_used] > count:
+                return
+            self.discard(least_used)
+        self.counts[value] = count
+        for entry in self.index_keys(value):
+            bisect.insort(self.keys, entry)
+
+    def remove(self, value: str):
+        if value not in self.counts:
+            return
+        self.counts[value] -= 1
+        if self.counts[value] <= 0:
+            self.discard(value)
+
+    def discard(self, value: str):
+        del self.counts[value]
+        for entry in self.index_keys(value):
+            i = bisect.bisect_left(self.keys, entry)
+            if i < len(self.keys) and self.keys[i] == entry:
+                del self.keys[i]
+
+    def suggest(self, prefix: str, limit: int) -> List[dict]:
+        prefix = fold_text(prefix.strip())
+        if not prefix:
+            values = heapq.nlargest(limit, self.counts, key=self.counts.get)
+        else:
+            matches = set()
+            i = bisect.bisect_left(self.keys, (prefix,))
+            end = min(len(self.keys), i + SUGGEST_SCAN_LIMIT)
+            while i < end and self.keys[i][0].startswith(prefix):
+                matches.add(self.keys[i][1])
+                i += 1
+            values = heapq.nlargest(limit, matches, key=lambda v: (self.counts[v], v))
+        return [{"value": value, "count": self.counts[value]} for value in values]
+
+class SuggestIndex:
+    def __init__(self):
+        self.fields = {field: FieldSuggestions(SUGGEST_MAX_VALUES) for field in SUGGEST_FIELDS}
+
+    async def build(self):
+        """Load the most used distinct values of each field from hot and archived orders"""
+        fields = {}
+        for field in SUGGEST_FIELDS:
+            suggestions = FieldSuggestions(SUGGEST_MAX_VALUES)
+            for value, count in await self.value_counts(field):
+                suggestions.add(value, count)
+            fields[field] = suggestions
+        # Swap in the finished index in one step
+        self.fields = fields
+
+    async def value_counts(self, field: str) -> List[tuple]:
+        """(trimmed value, uses) of the SUGGEST_MAX_VALUES most used values, most used first"""
+        if MONGO_FEATURES:
+            pipeline = [
+                {"$unionWith": {"coll": "service_orders_archive", "pipeline": [{"$project": {field: 1}}]}},
+                {"$match": {field: {"$type": "string", "$nin": [""]}}},
+                {"$group": {"_id": {"$trim": {"input": f"${field}"}}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": SUGGEST_MAX_VALUES},
+            ]
+            return [(row['_id'], row['count']) async for row in db.service_orders.aggregate(pipeline) if row['_id']]
+        
+        counts = {}
+        for value, count in (await storage.service_orders.count_by(field)).items():
+            value = value.strip() if isinstance(value, str) else ""
+            if value:
+                counts[value] = counts.get(value, 0) + count
+        return heapq.nlargest(SUGGEST_MAX_VALUES, counts.items(), key=lambda item: item[1])
+
+    def update(self, before: Optional[dict], after: Optional[dict]):
+        for field, suggestions in self.fields.items():
+            old = ((before or {}).get(field) or "").strip()
+            new = ((after or {}).get(field) or "").strip()
+            if old == new:
+                continue
+            if old:
+                suggestions.remove(old)
+            if new:
+                suggestions.add(new)
+
+    def suggest(self, field: str, prefix: str, limit: int) -> List[dict]:
+        return self.fields[field].suggest(prefix, limit)
+
+    async def run(self):
+        # Writes made by other workers show up at the next refresh
+        while True:
+            try:
+                await self.build()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Autocomplete index build failed: {str(e)}")
+            await asyncio.sleep(max(1, SUGGEST_REFRESH_MINUTES) * 60)
+
+suggest_index = SuggestIndex()
+
+# Verification checklist rollups: one document per equipment brand/model,
+# month (of created_at) and checklist item, counting BOA/RUIM/N/A answers
+
+VERIFICATION_STATUS_FIELDS = {"BOA": "boa", "RUIM": "ruim", "N/A": "na"}
+
+def rollup_label(value: Optional[str]) -> Optional[str]:
+    return key_text((value or "").strip()) or None
+
+def verification_contributions(order: Optional[dict]) -> Dict[tuple, Dict[str, int]]:
+    """(brand, model, month, item) -> answer counts for one order"""
+    contributions = {}
+    if not order:
+        return contributions
+    brand = rollup_label(order.get('equipment_brand'))
+    model = rollup_label(order.get('equipment_model'))
+    month = str(order.get('created_at') or "")[:7]
+    for verification in order.get('verifications') or []:
+        item = (verification.get('item') or "").strip()
+        counter = VERIFICATION_STATUS_FIELDS.get(verification.get('status'))
+        if not item or not counter:
+            continue
+        counts = contributions.setdefault((brand, model, month, item), {})
+        counts[counter] = counts.get(counter, 0) + 1
+    return contributions
+
+def rollup_id(brand, model, month, item) -> str:
+    return "|".join([brand or "", model or "", month, item])
+
+async def update_verification_rollups(before: Optional[dict], after: Optional[dict]):
+    deltas = {}
+    for sign, order in ((-1, before), (1, after)):
+        for key, counts in verification_contributions(order).items():
+            delta = deltas.setdefault(key, {})
+            for counter, count in counts.items():
+                delta[counter] = delta.get(counter, 0) + sign * count
+
+    operations = []
+    for (brand, model, month, item), delta in deltas.items():
+        delta = {counter: n for counter, n in delta.items() if n}
+        if not delta:
+            continue
+        operations.append(UpdateOne(
+            {"_id": rollup_id(brand, model, month, item)},
+            {
+                "$inc": delta,
+                "$setOnInsert": {"brand": brand, "model": model, "month": month, "item": item},
+            },
+            upsert=True
+        ))
+    if operations:
+        await db.verification_rollups.bulk_write(operations, ordered=False)
+
+async def rebuild_verification_rollups():
+    """Recompute all checklist rollups from the hot and archived orders"""
+    def label(field: str) -> dict:
+        # Same as rollup_label()
+        upper = mongo_key_text({"$trim": {"input": {"$ifNull": [f"${field}", ""]}}})
+        return {"$cond": [{"$eq": [upper, ""]}, None, upper]}
+
+    def count(status: str) -> dict:
+        return {"$sum": {"$cond": [{"$eq": ["$verifications.status", status]}, 1, 0]}}
+
+    pipeline = [
+        {"$unionWith": {"coll": "service_orders_archive"}},
+        {"$unwind": "$verifications"},
+        {"$match": {"verifications.status": {"$in": list(VERIFICATION_STATUS_FIELDS)}}},
+        {"$group": {
+            "_id": {
+                "brand": label("equipment_brand"),
+                "model": label("equipment_model"),
+                "month": {"$substrCP": [{"$ifNull": ["$created_at", ""]}, 0, 7]},
+                "item": {"$trim": {"input": "$verifications.item"}},
+            },
+            **{counter: count(status) for status, counter in VERIFICATION_STATUS_FIELDS.items()},
+        }},
+        {"$match": {"_id.item": {"$ne": ""}}},
+        {"$project": {
+            "_id": {"$concat": [
+                {"$ifNull": ["$_id.brand", ""]}, "|", {"$ifNull": ["$_id.model", ""]}, "|",
+                "$_id.month", "|", "$_id.item",
+            ]},
+            "brand": "$_id.brand",
+            "model": "$_id.model",
+            "month": "$_id.month",
+            "item": "$_id.item",
+            **{counter: 1 for counter in VERIFICATION_STATUS_FIELDS.values()},
+        }},
+        {"$merge": {"into": "verification_rollups", "whenMatched": "replace"}},
+    ]
+    await db.verification_rollups.delete_many({})
+    await db.service_orders.aggregate(pipeline).to_list(None)
+
+def rollup_period(month: str, bucket: str) -> str:
+    if bucket == "year":
+        return month[:4]
+    if bucket == "quarter" and len(month) == 7:
+        return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+    if bucket == "all":
+        return "all"
+    return month
+
+async def update_order_views(before: Optional[dict], after: Optional[dict]):
+    """Keep the derived views in step with an order write (before/after are None on create/delete)"""
+    await order_data_version.bump()
+    suggest_index.update(before, after)
+    if not MONGO_FEATURES:
+        return
+    await update_equipment_history(before, after)
+    await update_tech_queue(before, after)
+    await update_verification_rollups(before, after)
+
+async def rebuild_order_views():
+    await rebuild_equipment_history()
+    await rebuild_tech_queues()
+    await rebuild_verification_rollups()
+
+# ============ LOOKUP KEYS ============
+# Normalized copies of the reference numbers, stored on each order so that
+# exact lookups are a single index seek. Ticket and O.S. numbers are unique
+# among hot orders; a number can be reused once the old order is archived,
+# so the archive indexes them without uniqueness.
+
+LOOKUP_KEY_FIELDS = {
+    "ticket_key": "ticket_number", "os_key": "os_number", "pat_key": "pat", "serial_key": "equipment_serial",
+}
+UNIQUE_LOOKUP_KEYS = {"ticket_key": "Ticket number", "os_key": "O.S. number"}
+# Fields whose change means the keys have to be recomputed
+LOOKUP_SOURCE_FIELDS = {*LOOKUP_KEY_FIELDS.values(), "client_name", "unit"}
+
+def client_unit_key(order: dict) -> Optional[str]:
+    """ "Prefeitura de São Paulo", "UBS Sé" -> "prefeitura de sao paulo|ubs se" """
+    parts = []
+    for field in ("client_name", "unit"):
+        words = "".join(ch if ch.isalnum() else " " for ch in fold_text(order.get(field) or "")).split()
+        if not words:
+            return None
+        parts.append(" ".join(words))
+    return "|".join(parts)
+
+def lookup_keys(order: dict) -> dict:
+    keys = {key: normalize_key(order.get(field)) for key, field in LOOKUP_KEY_FIELDS.items()}
+    keys["client_unit_key"] = client_unit_key(order)
+    return keys
+
+async def ensure_lookup_keys():
+    """Backfill keys on orders created before they existed, then index them"""
+    for collection in (db.service_orders, db.service_orders_archive):
+        done = await db.migrations.find_one({"_id": f"lookup_keys:{collection.name}"})
+        if not done:
+            await collection.update_many(
+                {"ticket_key": {"$exists": False}},
+                [{"$set": {
+                    key: {"$cond": [{"$eq": [mongo_normalize_key(field), ""]}, None, mongo_normalize_key(field)]}
+                    for key, field in LOOKUP_KEY_FIELDS.items()
+                }}]
+            )
+            await db.migrations.update_one(
+                {"_id": f"lookup_keys:{collection.name}"},
+                {"$set": {"applied_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+
+        await collection.create_index("pat_key")
+        if collection.name == "service_orders_archive":
+            indexes = await collection.index_information()
+            for key in UNIQUE_LOOKUP_KEYS:
+                if indexes.get(f"{key}_1", {}).get("unique"):
+                    # Created unique by earlier versions: it rejected archiving reused numbers
+                    await collection.drop_index(f"{key}_1")
+                await collection.create_index(key)
+            continue
+        for key in UNIQUE_LOOKUP_KEYS:
+            try:
+                await collection.create_index(
+                    key, unique=True, partialFilterExpression={key: {"$type": "string"}}
+                )
+            except OperationFailure as e:
+                # Duplicates already in the data: lookups still work, uniqueness is not enforced
+                logging.error(f"Could not create unique index {collection.name}.{key}: {str(e)}")
+                await collection.create_index(key)
+
+async def ensure_duplicate_keys():
+    """Backfill serial_key and client_unit_key on open orders stored before they existed"""
+    pending = storage.service_orders.iterate(
+        {"status": {"$ne": "RESOLVIDO"}, "client_unit_key": {"$exists": False}},
+        batch_size=ARCHIVE_BATCH_SIZE
+    )
+    batch = []
+    async for order in pending:
+        # Conditional on updated_at, so a concurrent edit is never overwritten
+        batch.append(("replace", {"id": order["id"], "updated_at": order.get("updated_at")},
+                      {**order, **lookup_keys(order)}))
+        if len(batch) >= ARCHIVE_BATCH_SIZE:
+            await storage.service_orders.bulk_write(batch)
+            batch = []
+    if batch:
+        await storage.service_orders.bulk_write(batch)
+
+def duplicate_key_error(e: DuplicateKeyError) -> HTTPException:
+    key_pattern = (e.details or {}).get("keyPattern", {})
+    for key, label in UNIQUE_LOOKUP_KEYS.items():
+        # Older servers only name the index in the error message
+        if key in key_pattern or f"{key}_1" in str(e):
+            return HTTPException(status_code=409, detail=f"{label} already exists")
+    return HTTPException(status_code=409, detail="Service order already exists")
+
+async def find_order_by_key(key: str, value: str) -> Optional[dict]:
+    normalized = normalize_key(value)
+    if not normalized:
+        return None
+    order = await storage.service_orders.find_one({key: normalized})
+    if order is None and MONGO_FEATURES:
+        order = await db.service_orders_archive.find_one({key: normalized}, {"_id": 0})
+    return order
+
+# ============ DUPLICATE DETECTION ============
+# Before a create, open orders for the same equipment (serial or PAT), the
+# same ticket, or the same client and unit are offered to the user instead.
+
+DUPLICATE_CHECK_KEYS = {
+    "serial_key": "equipment_serial", "pat_key": "pat", "ticket_key": "ticket_number",
+    "client_unit_key": "client_name + unit",
+}
+DUPLICATE_SUMMARY_FIELDS = [
+    "id", "ticket_number", "os_number", "pat", "equipment_serial", "client_name", "unit",
+    "status", "opening_date", "created_at",
+]
+
+async def find_open_duplicates(order_doc: dict, limit: int = 10) -> List[dict]:
+    keys = {key: order_doc.get(key) for key in DUPLICATE_CHECK_KEYS if order_doc.get(key)}
+    if not keys:
+        return []
+    # Index-only: each clause seeks one (key, status, id) index
+    ids = await storage.service_orders.find_ids(
+        {"$or": [{key: value, "status": {"$ne": "RESOLVIDO"}} for key, value in keys.items()]},
+        limit=limit
+    )
+    if not ids:
+        return []
+    
+    orders = await storage.service_orders.find({"id": {"$in": ids}}, sort="created_at")
+    duplicates = []
+    for order in orders:
+        summary = {field: order.get(field) for field in DUPLICATE_SUMMARY_FIELDS}
+        summary["matched_on"] = [
+            DUPLICATE_CHECK_KEYS[key] for key, value in keys.items() if order.get(key) == value
+        ]
+        duplicates.append(summary)
+    return duplicates
+
+# ============ AUDIT LOG ============
+
+AUDIT_IGNORED_FIELDS = {
+    "_id", "updated_at", "attachments", *LOOKUP_KEY_FIELDS.keys(), "client_unit_key",
+    "status_since", "status_history", "status_durations", "resolved_at", "resolution_seconds",
+}
+
+def order_changes(before: Optional[dict], after: Optional[dict]) -> List[dict]:
+    """Field-level differences between two versions of an order"""
+    before = before or {}
+    after = after or {}
+    changes = []
+    for field in sorted((before.keys() | after.keys()) - AUDIT_IGNORED_FIELDS):
+        old, new = before.get(field), after.get(field)
+        if old != new:
+            changes.append({"field": field, "before": old, "after": new})
+    return changes
+
+class AuditLogBuffer:
+    """Collects audit entries in memory; run() writes them with insert_many
+    when AUDIT_FLUSH_SIZE entries are waiting or every AUDIT_FLUSH_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.wakeup = None
+        self.lock = None
+
+    def record(self, action: str, before: Optional[dict], after: Optional[dict], user: User):
+        if not MONGO_FEATURES:
+            return
+        changes = order_changes(before, after)
+        if action == "update" and not changes:
+            return
+        self.entries.append({
+            "id": str(uuid.uuid4()),
+            "order_id": (after or before)['id'],
+            "action": action,
+            "user_id": user.id,
+            "user_name": user.name,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "changes": changes,
+        })
+        if len(self.entries) > AUDIT_MAX_BUFFER:
+            # Database unreachable for a long time: keep memory bounded
+            dropped = len(self.entries) - AUDIT_MAX_BUFFER
+            del self.entries[:dropped]
+            logging.error(f"Audit buffer full, dropped {dropped} oldest entries")
+        if len(self.entries) >= AUDIT_FLUSH_SIZE and self.wakeup is not None:
+            self.wakeup.set()
+
+    async def flush(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while self.entries:
+                batch = self.entries[:AUDIT_FLUSH_SIZE]
+                try:
+                    # insert_many sets _id on the dicts, so a retried batch
+                    # only hits duplicate key errors for entries already written
+                    await db.audit_log.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+                del self.entries[:len(batch)]
+
+    async def run(self):
+        self.wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=AUDIT_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                logging.error(f"Audit log flush failed, will retry: {str(e)}")
+
+audit_log = AuditLogBuffer()
+
+# ============ SLA ============
+# Every status change is appended to status_history and the time spent in
+# the previous status is added to status_durations, so SLA figures never
+# need to replay the history.
+
+SLA_GROUP_FIELDS = {"unit", "client_name", "responsible_tech"}
+SLA_DEFAULT_DAYS = 90
+AGING_BUCKETS = [(1, "0-1d"), (3, "1-3d"), (7, "3-7d"), (30, "7-30d")]
+AGING_OVERFLOW_BUCKET = "30d+"
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def initial_status_fields(order_doc: dict) -> dict:
+    status = order_doc.get('status') or "ABERTO"
+    created_at = order_doc['created_at']
+    fields = {
+        "status_since": created_at,
+        "status_history": [{"status": status, "from_status": None, "at": created_at, "by": order_doc.get('created_by')}],
+        "status_durations": {},
+        "resolved_at": None,
+        "resolution_seconds": None,
+    }
+    if status == "RESOLVIDO":
+        fields["resolved_at"] = created_at
+        fields["resolution_seconds"] = 0.0
+    return fields
+
+def status_transition_update(existing: dict, new_status: str, now: datetime, user_id: str) -> dict:
+    """Update operators recording a change from the order's current status to new_status"""
+    old_status = existing.get('status') or "ABERTO"
+    # Orders created before transitions were tracked count from creation
+    since = parse_timestamp(existing.get('status_since') or existing.get('created_at')) or now
+    now_iso = now.isoformat()
+
+    update = {
+        "$inc": {f"status_durations.{old_status}": max(0.0, (now - since).total_seconds())},
+        "$push": {"status_history": {"status": new_status, "from_status": old_status, "at": now_iso, "by": user_id}},
+        "$set": {"status_since": now_iso},
+    }
+    if new_status == "RESOLVIDO":
+        created_at = parse_timestamp(existing.get('created_at')) or now
+        update["$set"]["resolved_at"] = now_iso
+        update["$set"]["resolution_seconds"] = max(0.0, (now - created_at).total_seconds())
+    elif old_status == "RESOLVIDO":
+        # Reopened
+        update["$set"]["resolved_at"] = None
+        update["$set"]["resolution_seconds"] = None
+    return update
+
+async def ensure_resolution_fields():
+    """One-time backfill of resolved_at/resolution_seconds on orders resolved
+    before transitions were tracked. Their last update is the best estimate of
+    when they were resolved; such orders are flagged resolved_at_estimated.
+    """
+    for collection in (db.service_orders, db.service_orders_archive):
+        migration_id = f"resolution_fields:{collection.name}"
+        if await db.migrations.find_one({"_id": migration_id}):
+            continue
+        
+        operations = []
+        cursor = collection.find(
+            {"status": "RESOLVIDO", "resolved_at": {"$exists": False}},
+            {"_id": 0, "id": 1, "created_at": 1, "updated_at": 1},
+            batch_size=ARCHIVE_BATCH_SIZE
+        )
+        async for order in cursor:
+            try:
+                created_at = parse_timestamp(order.get('created_at'))
+                resolved_at = parse_timestamp(order.get('updated_at')) or created_at
+                seconds = max(0.0, (resolved_at - created_at).total_seconds()) if created_at else None
+            except (ValueError, TypeError):
+                # Unparseable or missing timestamps: nothing to estimate from
+                continue
+            operations.append(UpdateOne(
+                {"id": order['id'], "resolved_at": {"$exists": False}},
+                {"$set": {
+                    "resolved_at": resolved_at.isoformat(),
+                    "resolution_seconds": seconds,
+                    "resolved_at_estimated": True,
+                }}
+            ))
+            if len(operations) >= ARCHIVE_BATCH_SIZE:
+                await collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        
+        await db.migrations.update_one(
+            {"_id": migration_id},
+            {"$set": {"applied_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    # Nearest-rank method
+    index = max(0, math.ceil(p * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def hours(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds / 3600, 1) if seconds is not None else None
+
+async def resolution_metrics(group_by: str, match: dict, include_archive: bool) -> List[dict]:
+    """Resolved orders per group: count, p50/p90 resolution time, time spent waiting"""
+    pipeline = [{"$match": match}]
+    if include_archive:
+        pipeline.append({"$unionWith": {"coll": "service_orders_archive", "pipeline": [{"$match": match}]}})
+    group = {
+        "_id": f"${group_by}",
+        "resolved": {"$sum": 1},
+        "avg_pendencia": {"$avg": {"$ifNull": ["$status_durations.PENDENCIA", 0]}},
+        "avg_suspenso": {"$avg": {"$ifNull": ["$status_durations.SUSPENSO", 0]}},
+    }
+
+    try:
+        # MongoDB 7+: percentiles computed server-side
+        results = await db.service_orders.aggregate(pipeline + [{"$group": {
+            **group,
+            "percentiles": {"$percentile": {"input": "$resolution_seconds", "p": [0.5, 0.9], "method": "approximate"}},
+        }}]).to_list(None)
+        for result in results:
+            result['p50'], result['p90'] = result.pop('percentiles')
+    except OperationFailure:
+        results = await db.service_orders.aggregate(pipeline + [{"$group": {
+            **group,
+            "durations": {"$push": "$resolution_seconds"},
+        }}]).to_list(None)
+        for result in results:
+            durations = sorted(d for d in result.pop('durations') if d is not None)
+            result['p50'] = percentile(durations, 0.5)
+            result['p90'] = percentile(durations, 0.9)
+
+    return sorted(
+        [
+            {
+                group_by: result['_id'],
+                "resolved": result['resolved'],
+                "p50_resolution_hours": hours(result['p50']),
+                "p90_resolution_hours": hours(result['p90']),
+                "avg_pendencia_hours": hours(result['avg_pendencia']),
+                "avg_suspenso_hours": hours(result['avg_suspenso']),
+            }
+            for result in results
+        ],
+        key=lambda r: -r['resolved']
+    )
+
+async def aging_metrics(group_by: str) -> List[dict]:
+    """Open orders per group, bucketed by age since creation"""
+    age_days = {"$divide": [
+        {"$subtract": ["$$NOW", {"$dateFromString": {"dateString": "$created_at"}}]},
+        86400000
+    ]}
+    bucket = {"$switch": {
+        "branches": [{"case": {"$lt": ["$age_days", limit]}, "then": label} for limit, label in AGING_BUCKETS],
+        "default": AGING_OVERFLOW_BUCKET,
+    }}
+    results = await db.service_orders.aggregate([
+        {"$match": {"status": {"$ne": "RESOLVIDO"}}},
+        {"$project": {"key": f"${group_by}", "age_days": age_days}},
+        {"$group": {"_id": {"key": "$key", "bucket": bucket}, "count": {"$sum": 1}}},
+    ]).to_list(None)
+
+    groups = {}
+    for result in results:
+        key = result['_id'].get('key')
+        entry = groups.setdefault(key, {
+            group_by: key,
+            "open": 0,
+            "buckets": {label: 0 for _, label in AGING_BUCKETS + [(None, AGING_OVERFLOW_BUCKET)]},
+        })
+        entry['open'] += result['count']
+        entry['buckets'][result['_id']['bucket']] += result['count']
+    return sorted(groups.values(), key=lambda g: -g['open'])
+
 # ============ OCR FUNCTION ============
 
 async def extract_text_from_image(image_base64: str) -> dict:
@@ -310,6 +2256,686 @@ Return the data in the exact JSON format specified in the system message. Be pre
         logging.error(f"OCR Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
 
+# ============ QUERY HELPERS ============
+
+def build_service_order_filter(
+    status: Optional[str] = None,
+    pat: Optional[str] = None,
+    ticket_number: Optional[str] = None,
+    os_number: Optional[str] = None,
+    equipment_serial: Optional[str] = None,
+    unit: Optional[str] = None,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None
+) -> dict:
+    """Mongo filter for the service order list/export query parameters"""
+    filter_query = {}
+    if status and status.strip():
+        filter_query['status'] = status
+    if pat:
+        filter_query['pat'] = {"$regex": pat, "$options": "i"}
+    if ticket_number:
+        filter_query['ticket_number'] = {"$regex": ticket_number, "$options": "i"}
+    if os_number:
+        filter_query['os_number'] = {"$regex": os_number, "$options": "i"}
+    if equipment_serial:
+        filter_query['equipment_serial'] = {"$regex": equipment_serial, "$options": "i"}
+    if unit:
+        filter_query['unit'] = {"$regex": unit, "$options": "i"}
+    
+    # Date range filter
+    if date_start or date_end:
+        date_filter = {}
+        if date_start:
+            date_filter["$gte"] = date_start
+        if date_end:
+            date_filter["$lte"] = date_end
+        if date_filter:
+            filter_query['opening_date'] = date_filter
+    
+    return filter_query
+
+def service_order_query(
+    status: Optional[str] = None,
+    pat: Optional[str] = None,
+    ticket_number: Optional[str] = None,
+    os_number: Optional[str] = None,
+    equipment_serial: Optional[str] = None,
+    unit: Optional[str] = None,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    include_archived: bool = False,
+    resolved_start: Optional[str] = None,
+    resolved_end: Optional[str] = None
+) -> tuple:
+    """(filter_query, include_archive) shared by the list and the export.
+
+    resolved_start/resolved_end keep every order still in progress but only
+    the RESOLVIDO ones opened within the range.
+    """
+    filter_query = build_service_order_filter(
+        status, pat, ticket_number, os_number, equipment_serial, unit, date_start, date_end
+    )
+    include_archive = should_include_archive(include_archived, date_start, date_end)
+    if resolved_start or resolved_end:
+        resolved_range = build_service_order_filter(date_start=resolved_start, date_end=resolved_end)
+        filter_query["$or"] = [{"status": {"$ne": "RESOLVIDO"}}, {"status": "RESOLVIDO", **resolved_range}]
+        # Archived orders are all RESOLVIDO, so the range decides whether to read the archive
+        include_archive = include_archive or should_include_archive(False, resolved_start, resolved_end)
+    return filter_query, include_archive
+
+# ============ ORDER WRITES ============
+
+def new_order_doc(order_data: ServiceOrderCreate, user_id: str, order_id: Optional[str] = None) -> tuple:
+    """The ServiceOrder for a create and the document to store for it"""
+    order = ServiceOrder(
+        **order_data.model_dump(),
+        created_by=user_id,
+        **({"id": order_id} if order_id else {})
+    )
+    
+    order_doc = order.model_dump()
+    order_doc['created_at'] = order_doc['created_at'].isoformat()
+    order_doc['updated_at'] = order_doc['updated_at'].isoformat()
+    order_doc.update(lookup_keys(order_doc))
+    order_doc.update(initial_status_fields(order_doc))
+    return order, order_doc
+
+def order_update_operators(existing: dict, update_data: dict, now: datetime, user_id: str) -> tuple:
+    """(update, status_changed) applying the provided fields to an existing order"""
+    set_data = {**update_data, 'updated_at': now.isoformat()}
+    if update_data.keys() & LOOKUP_SOURCE_FIELDS:
+        set_data.update(lookup_keys({**existing, **update_data}))
+    
+    new_status = update_data.get('status')
+    if new_status and new_status != (existing.get('status') or "ABERTO"):
+        transition = status_transition_update(existing, new_status, now, user_id)
+        return {**transition, "$set": {**set_data, **transition["$set"]}}, True
+    return {"$set": set_data}, False
+
+# Creates without a client id get one derived from the idempotency key, so a
+# replay racing the original hits the unique id index instead of duplicating
+SYNC_ID_NAMESPACE = uuid.UUID("874a1205-fba6-4fb7-94d2-a74ba43b6933")
+
+def validation_detail(e: ValidationError) -> List[dict]:
+    return [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+
+async def apply_sync_mutations(mutations: List[SyncMutation], user: User) -> List[dict]:
+    """Fold a queue of offline mutations into one write per order and apply
+    them in a single bulk write. Updates are checked against the version the
+    client edited and against concurrent writes (the replace is conditional
+    on updated_at); each mutation gets its own result.
+    """
+    now = datetime.now(timezone.utc)
+    results: List[Optional[dict]] = [None] * len(mutations)
+    store_keys = [f"{user.id}:{mutation.idempotency_key}" for mutation in mutations]
+    stored = await storage.load_idempotency(list(set(store_keys)))
+    
+    update_ids = list({m.order_id for m in mutations if m.op == "update" and m.order_id})
+    current = {o['id']: o for o in await storage.service_orders.find({"id": {"$in": update_ids}})} if update_ids else {}
+    for order_id in set(update_ids) - current.keys():
+        # Editing an archived order brings it back into the working set
+        try:
+            restored = await restore_archived_order(order_id)
+        except DuplicateKeyError:
+            restored = None
+        if restored:
+            current[order_id] = restored
+    
+    # order id -> state before the batch, state after its mutations, mutation indexes
+    pending: Dict[str, dict] = {}
+    seen_keys = set()
+    for index, mutation in enumerate(mutations):
+        key = store_keys[index]
+        if key in stored:
+            results[index] = {**stored[key], "replayed": True}
+            continue
+        if key in seen_keys:
+            results[index] = {"status": "invalid", "detail": "Idempotency key repeated in the batch"}
+            continue
+        seen_keys.add(key)
+        
+        try:
+            if mutation.op == "create":
+                order_id = mutation.order_id or str(uuid.uuid5(SYNC_ID_NAMESPACE, key))
+                if order_id in pending:
+                    results[index] = {"status": "invalid", "detail": "Order created twice in the batch"}
+                    continue
+                _, order_doc = new_order_doc(ServiceOrderCreate(**mutation.data), user.id, order_id)
+                pending[order_id] = {"before": None, "after": order_doc, "items": [index]}
+            elif mutation.op == "update":
+                update_data = {
+                    k: v for k, v in ServiceOrderUpdate(**mutation.data).model_dump().items() if v is not None
+                }
+                try:
+                    base_version = parse_timestamp(mutation.base_version) if mutation.base_version else None
+                except ValueError:
+                    results[index] = {"status": "invalid", "detail": "base_version must be an ISO timestamp"}
+                    continue
+                entry = pending.get(mutation.order_id)
+                if entry is None:
+                    existing = current.get(mutation.order_id)
+                    if existing is None:
+                        results[index] = {"status": "not_found"}
+                        continue
+                    if base_version and base_version != parse_timestamp(existing.get('updated_at')):
+                        results[index] = {
+                            "status": "conflict",
+                            "detail": "Order changed on the server since it was edited",
+                            "order": existing,
+                        }
+                        continue
+                    entry = pending[mutation.order_id] = {
+                        "before": existing, "after": copy.deepcopy(existing), "items": []
+                    }
+                # Later edits in the batch build on the earlier ones
+                update, _ = order_update_operators(entry["after"], update_data, now, user.id)
+                apply_update(entry["after"], update)
+                entry["items"].append(index)
+            else:
+                results[index] = {"status": "invalid", "detail": "op must be create or update"}
+        except ValidationError as e:
+            results[index] = {"status": "invalid", "detail": validation_detail(e)}
+    
+    order_ids = list(pending)
+    operations = []
+    for order_id in order_ids:
+        entry = pending[order_id]
+        if entry["before"] is None:
+            operations.append(("insert", entry["after"]))
+        else:
+            operations.append(("replace", {"id": order_id, "updated_at": entry["before"]['updated_at']}, entry["after"]))
+    errors = await storage.service_orders.bulk_write(operations)
+    
+    # A replace that matched nothing lost a race with another writer
+    replaced_ids = [order_id for order_id in order_ids if pending[order_id]["before"] is not None]
+    written = {}
+    if replaced_ids:
+        written = {o['id']: o for o in await storage.service_orders.find({"id": {"$in": replaced_ids}})}
+    
+    applied = {}
+    for position, order_id in enumerate(order_ids):
+        entry = pending[order_id]
+        error = errors.get(position)
+        outcome = {"status": "applied", "order_id": order_id, "version": entry["after"]['updated_at']}
+        if error is not None:
+            key_pattern = (error.details or {}).get("keyPattern", {})
+            if "id" in key_pattern and entry["before"] is None and len(entry["items"]) == 1:
+                # Same create already applied by a concurrent replay
+                outcome = {"status": "applied", "order_id": order_id, "replayed": True}
+            else:
+                outcome = {"status": "conflict", "detail": duplicate_key_error(error).detail}
+        elif entry["before"] is not None and written.get(order_id, {}).get('updated_at') != entry["after"]['updated_at']:
+            outcome = {
+                "status": "conflict",
+                "detail": "Order changed on the server during sync",
+                "order": written.get(order_id),
+            }
+        elif not outcome.get("replayed"):
+            await update_order_views(entry["before"], entry["after"])
+            audit_log.record("create" if entry["before"] is None else "update", entry["before"], entry["after"], user)
+        
+        for index in entry["items"]:
+            results[index] = outcome
+            if outcome["status"] == "applied":
+                applied[store_keys[index]] = outcome
+    
+    await storage.save_idempotency(applied, SYNC_IDEMPOTENCY_TTL_HOURS * 3600)
+    return [
+        {"idempotency_key": mutation.idempotency_key, **result}
+        for mutation, result in zip(mutations, results)
+    ]
+
+# ============ EXPORT ============
+# Flat rows shared by the CSV, NDJSON and Parquet exports: every ServiceOrder
+# field, one status and one observation column per checklist item, and the
+# other nested fields as JSON text.
+
+# Same checklist as the order form (VERIFICATION_ITEMS in the frontend)
+VERIFICATION_ITEMS = [
+    "IMPRESSÃO/XEROX",
+    "DIGITALIZAÇÃO",
+    "REDE/USB",
+    "ADF / DUPLEX (ADF)",
+    "TIPO CONEXÃO - REDE/WIFI/USB",
+    "PAINEL/APARDOR DE PAPEL",
+    "PELICULA FUSORA/ROLO PRESSOR/ROLO FUSOR",
+    "PICK ROLER BAND 1/2",
+    "BANDEJA 1/2",
+    "ETIQUETAS DE IDENTIFICAÇÃO",
+    "PATRIMONIO",
+    "CABO FORÇA E USB",
+    "CARTUCHO SOBRESSALENTE",
+]
+EXPORT_JSON_FIELDS = {"attachments", "status_history", "status_durations"}
+EXPORT_COLUMN_TYPES = {"equipment_replaced": "bool", "resolution_seconds": "float"}  # others are text
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def verification_columns(item: str) -> tuple:
+    return f"verification.{item}", f"verification.{item}.observation"
+
+def export_columns() -> List[str]:
+    columns = []
+    for field in ServiceOrder.model_fields:
+        if field == "verifications":
+            for item in VERIFICATION_ITEMS:
+                columns.extend(verification_columns(item))
+            columns.append("verifications_other")  # items not on the checklist, as JSON
+        else:
+            columns.append(field)
+    return columns
+
+EXPORT_COLUMNS = export_columns()
+
+def flatten_order(order: dict) -> dict:
+    row = {}
+    for field in ServiceOrder.model_fields:
+        if field == "verifications":
+            continue
+        value = order.get(field)
+        if field in EXPORT_JSON_FIELDS:
+            value = json.dumps(value, ensure_ascii=False, default=str) if value else None
+        row[field] = value
+
+    other = []
+    for verification in order.get('verifications') or []:
+        if verification.get('item') in VERIFICATION_ITEMS:
+            status_column, observation_column = verification_columns(verification['item'])
+            row[status_column] = verification.get('status')
+            row[observation_column] = verification.get('observation')
+        else:
+            other.append(verification)
+    row["verifications_other"] = json.dumps(other, ensure_ascii=False) if other else None
+    return row
+
+async def export_rows(filter_query: dict, include_archive: bool):
+    """Flat rows for the matching orders, read in EXPORT_BATCH_SIZE batches"""
+    async for order in storage.service_orders.iterate(filter_query, sort="created_at", batch_size=EXPORT_BATCH_SIZE):
+        yield flatten_order(order)
+    if include_archive and MONGO_FEATURES:
+        # An order caught mid-archiving can appear twice; loaders should key on id
+        cursor = db.service_orders_archive.find(
+            filter_query, {"_id": 0}, batch_size=EXPORT_BATCH_SIZE
+        ).sort("created_at", 1)
+        async for order in cursor:
+            yield flatten_order(order)
+
+async def stream_csv(rows, columns: List[str]):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # Header goes out before the first query returns
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    count = 0
+    async for row in rows:
+        writer.writerow(["" if row.get(column) is None else row.get(column) for column in columns])
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+async def stream_ndjson(rows, columns: List[str]):
+    lines = []
+    async for row in rows:
+        lines.append(json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False, default=str))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+async def stream_parquet(rows, columns: List[str]):
+    """Parquet written one row group at a time (EXPORT_PARQUET_ROW_GROUP rows)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"bool": pa.bool_(), "float": pa.float64()}
+    converters = {"bool": bool, "float": float}
+    column_types = {column: EXPORT_COLUMN_TYPES.get(column) for column in columns}
+    schema = pa.schema([(column, arrow_types.get(column_types[column], pa.string())) for column in columns])
+
+    buffer = StreamBuffer()
+    writer = pq.ParquetWriter(buffer, schema, compression="snappy")
+    group = {column: [] for column in columns}
+    group_rows = 0
+
+    def convert(column: str, value):
+        if value is None:
+            return None
+        return converters.get(column_types[column], str)(value)
+
+    async def write_group():
+        table = pa.Table.from_pydict(group, schema=schema)
+        # Encoding and compression release the GIL
+        await asyncio.to_thread(writer.write_table, table)
+        for values in group.values():
+            values.clear()
+        return buffer.drain()
+
+    async for row in rows:
+        for column in columns:
+            group[column].append(convert(column, row.get(column)))
+        group_rows += 1
+        if group_rows >= EXPORT_PARQUET_ROW_GROUP:
+            yield await write_group()
+            group_rows = 0
+    if group_rows:
+        yield await write_group()
+    writer.close()
+    yield buffer.drain()
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def xlsx_report(all_orders: List[dict]) -> bytes:
+    """The formatted Excel report (one row per order, in the given order)"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    import io
+    
+    # Create workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Relatório O.S."
+    
+    # Define styles
+    header_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
+    header_font = Font(bold=True, color="000000", size=11)
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    border_style = Border(
+        left=Side(style='thin', color='000000'),
+        right=Side(style='thin', color='000000'),
+        top=Side(style='thin', color='000000'),
+        bottom=Side(style='thin', color='000000')
+    )
+    
+    cell_alignment = Alignment(horizontal="center", vertical="center")
+    
+    # Headers
+    headers = ["N° CHAMADO", "N° OS", "PAT", "CLIENTE", "UNIDADE", "DATA", "SITUAÇÃO"]
+    ws.append(headers)
+    
+    # Style header row
+    for cell in ws[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        cell.border = border_style
+    
+    # Add data
+    for order in all_orders:
+        row = [
+            str(order.get('ticket_number', '')),
+            str(order.get('os_number', '')),
+            str(order.get('pat', '')),
+            str(order.get('client_name', '')),
+            str(order.get('unit', '')),
+            str(order.get('opening_date', '')),
+            str(order.get('status', 'ABERTO'))
+        ]
+        ws.append(row)
+    
+    # Style data rows
+    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=7):
+        for cell in row:
+            cell.border = border_style
+            cell.alignment = cell_alignment
+    
+    # Adjust column widths
+    column_widths = [15, 10, 12, 30, 20, 12, 15]
+    for i, width in enumerate(column_widths, 1):
+        ws.column_dimensions[chr(64 + i)].width = width
+    
+    # Save to BytesIO
+    excel_file = io.BytesIO()
+    wb.save(excel_file)
+    return excel_file.getvalue()
+
+def export_options(export_format: str, columns: Optional[str], compress: bool) -> List[str]:
+    """Validate streamed export options; returns the selected columns"""
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: xlsx, {', '.join(EXPORT_FORMATS)}")
+    selected = [column.strip() for column in columns.split(",") if column.strip()] if columns else EXPORT_COLUMNS
+    unknown = [column for column in selected if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    if export_format == "parquet":
+        if compress:
+            raise HTTPException(status_code=400, detail="Parquet files are already compressed")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server")
+    return selected
+
+def export_body(export_format: str, filter_query: dict, include_archive: bool,
+                columns: Optional[str], compress: bool) -> tuple:
+    """(chunks, filename, media_type) of a streamed export"""
+    selected = export_options(export_format, columns, compress)
+    writers = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
+    body = writers[export_format](export_rows(filter_query, include_archive), selected)
+    filename = f"relatorio_ordens_servico.{export_format}"
+    media_type = EXPORT_FORMATS[export_format]
+    if compress:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return body, filename, media_type
+
+def export_stream_response(export_format: str, filter_query: dict, include_archive: bool,
+                           columns: Optional[str], compress: bool) -> StreamingResponse:
+    body, filename, media_type = export_body(export_format, filter_query, include_archive, columns, compress)
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ============ SCHEDULED REPORTS ============
+# Recurring exports are built ahead of time by a small worker pool, on a cron
+# schedule, and stored under REPORT_DIR/<name>/ tagged with the order data
+# version. A download serves the stored file while the version still matches.
+
+REPORT_PERIODS = {"current_month", "last_month"}
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+def parse_cron(expression: str) -> tuple:
+    """(allowed values per field, either_day) for "m h dom mon dow" (*, a-b, */n,
+    a-b/n and lists). As in cron, when both day fields are restricted (neither
+    starts with *) a day matching either of them is enough."""
+    fields = expression.split()
+    if len(fields) != len(CRON_RANGES):
+        raise ValueError(f"expected 5 fields: {expression!r}")
+    allowed = []
+    for field, (low, high) in zip(fields, CRON_RANGES):
+        values = set()
+        for part in field.split(","):
+            spec, _, step = part.partition("/")
+            if spec == "*":
+                start, end = low, high
+            elif "-" in spec:
+                start, end = (int(value) for value in spec.split("-", 1))
+            else:
+                start = int(spec)
+                end = high if step else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"{part!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step or 1)))
+        allowed.append(values)
+    either_day = not fields[2].startswith("*") and not fields[4].startswith("*")
+    return allowed, either_day
+
+def cron_matches(schedule: tuple, moment: datetime) -> bool:
+    (minutes, hours, days, months, weekdays), either_day = schedule
+    day_matches = moment.day in days
+    weekday_matches = moment.isoweekday() % 7 in weekdays
+    return (
+        moment.minute in minutes and moment.hour in hours and moment.month in months
+        and ((day_matches or weekday_matches) if either_day else (day_matches and weekday_matches))
+    )
+
+def report_dates(report: ScheduledReport, today: date) -> tuple:
+    if report.period == "current_month":
+        start = today.replace(day=1)
+    elif report.period == "last_month":
+        start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    else:
+        return report.date_start, report.date_end
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start.isoformat(), end.isoformat()
+
+def report_query(report: ScheduledReport) -> tuple:
+    """(filter_query, include_archive) for the report as of today"""
+    date_start, date_end = report_dates(report, datetime.now(ZoneInfo(REPORT_TIMEZONE)).date())
+    return service_order_query(
+        report.status, report.pat, report.ticket_number, report.os_number,
+        report.equipment_serial, report.unit, date_start, date_end, report.include_archived
+    )
+
+def report_path(report: ScheduledReport, version: int, filter_query: dict, include_archive: bool) -> Path:
+    # A new period or edited definition gets a new file even at the same data version
+    options = [filter_query, include_archive, report.format, report.columns, report.gzip]
+    digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+    extension = report.format + (".gz" if report.gzip else "")
+    return REPORT_DIR / report.name / f"{version}-{digest}.{extension}"
+
+def latest_report_file(report: ScheduledReport) -> Optional[Path]:
+    directory = REPORT_DIR / report.name
+    if not directory.is_dir():
+        return None
+    # Files being written end in .tmp
+    files = [path for path in directory.iterdir() if path.suffix != ".tmp"]
+    return max(files, key=lambda path: path.stat().st_mtime, default=None)
+
+async def build_report(report: ScheduledReport, filter_query: dict, include_archive: bool, path: Path) -> Path:
+    tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    try:
+        if report.format == "xlsx":
+            # Unlike the interactive export, a report covers every matching order
+            orders = await find_service_orders(filter_query, include_archive, limit=None)
+            orders = [o for o in orders if o.get('status') == 'URGENTE'] + [o for o in orders if o.get('status') != 'URGENTE']
+            await asyncio.to_thread(tmp.write_bytes, await asyncio.to_thread(xlsx_report, orders))
+        else:
+            body, _, _ = export_body(report.format, filter_query, include_archive, report.columns, report.gzip)
+            with open(tmp, "wb") as f:
+                async for chunk in body:
+                    await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    def publish():
+        for stale in path.parent.iterdir():
+            if stale.suffix != ".tmp" and stale != path:
+                stale.unlink(missing_ok=True)
+        tmp.replace(path)
+
+    await asyncio.to_thread(publish)
+    logging.info(f"Report {report.name} built in {time.monotonic() - started:.1f}s")
+    return path
+
+class ReportScheduler:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.reports: Dict[str, tuple] = {}  # name -> (ScheduledReport, parsed schedule)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.queued = set()
+        self.flight = SingleFlight()
+
+    def load(self, path: Path):
+        """Read the report definitions; invalid entries are logged and skipped"""
+        self.reports = {}
+        if not path.exists():
+            return
+        try:
+            entries = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read {path}: {str(e)}")
+            return
+        for entry in entries:
+            try:
+                report = ScheduledReport(**entry)
+                if report.period and report.period not in REPORT_PERIODS:
+                    raise ValueError(f"period must be one of: {', '.join(sorted(REPORT_PERIODS))}")
+                if report.format != "xlsx":
+                    export_options(report.format, report.columns, report.gzip)
+                elif report.columns or report.gzip:
+                    raise ValueError("xlsx reports have fixed columns and are not compressed")
+                self.reports[report.name] = (report, parse_cron(report.schedule))
+            except HTTPException as e:
+                logging.error(f"Skipping report {entry.get('name')}: {e.detail}")
+            except (ValidationError, ValueError, TypeError, AttributeError) as e:
+                logging.error(f"Skipping report {entry!r}: {str(e)}")
+
+    async def artifact(self, report: ScheduledReport) -> Path:
+        """The report file for the current data version, built if it is missing"""
+        version = await order_data_version.get()
+        filter_query, include_archive = report_query(report)
+        path = report_path(report, version, filter_query, include_archive)
+        if path.exists():
+            return path
+        return await self.flight.do(path, lambda: build_report(report, filter_query, include_archive, path))
+
+    def enqueue(self, name: str):
+        if name not in self.queued:
+            self.queued.add(name)
+            self.queue.put_nowait(name)
+
+    async def worker(self):
+        while True:
+            name = await self.queue.get()
+            try:
+                await self.artifact(self.reports[name][0])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Report {name} failed: {str(e)}")
+            finally:
+                self.queued.discard(name)
+
+    async def run(self):
+        workers = [asyncio.create_task(self.worker()) for _ in range(max(1, self.workers))]
+        try:
+            # Nothing on disk yet (first start, new definition): build it now
+            for name, (report, _) in self.reports.items():
+                if await asyncio.to_thread(latest_report_file, report) is None:
+                    self.enqueue(name)
+            while True:
+                # Wake at the start of each minute
+                await asyncio.sleep(60 - time.time() % 60)
+                now = datetime.now(ZoneInfo(REPORT_TIMEZONE))
+                for name, (report, schedule) in self.reports.items():
+                    if not cron_matches(schedule, now):
+                        continue
+                    # Workers share REPORT_DIR; one of them builds each scheduled run
+                    if MONGO_FEATURES and not await acquire_job_lease(f"report:{name}", 50):
+                        continue
+                    self.enqueue(name)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+report_scheduler = ReportScheduler(REPORT_WORKERS)
+
 # ============ ROUTES ============
 
 @api_router.get("/")
@@ -324,7 +2950,7 @@ async def register(user_data: UserCreate, current_user: User = Depends(get_curre
         raise HTTPException(status_code=403, detail="Only administrators can create new users")
     
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await storage.users.find_one({"email": user_data.email})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -339,16 +2965,16 @@ async def register(user_data: UserCreate, current_user: User = Depends(get_curre
     user_doc['password'] = hash_password(user_data.password)
     user_doc['created_at'] = user_doc['created_at'].isoformat()
     
-    await db.users.insert_one(user_doc)
+    await storage.users.insert_one(user_doc)
     
     # Create token
     token = create_access_token(user.id)
     
     return TokenResponse(access_token=token, user=user)
 
-@api_router.post("/auth/login", response_model=TokenResponse)
+@api_router.post("/auth/login", response_model=TokenResponse, dependencies=[Depends(login_admission)])
 async def login(credentials: UserLogin):
-    user_doc = await db.users.find_one({"email": credentials.email})
+    user_doc = await storage.users.find_one({"email": credentials.email})
     
     if not user_doc or not verify_password(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -372,7 +2998,7 @@ async def get_users(current_user: User = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Only administrators can view users")
     
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+    users = await storage.users.find({}, limit=1000, exclude=("password",))
     
     # Convert ISO strings to datetime
     for user in users:
@@ -390,9 +3016,9 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
-    result = await db.users.delete_one({"id": user_id})
+    deleted = await storage.users.delete_one({"id": user_id})
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="User not found")
     
     return {"message": "User deleted successfully"}
@@ -401,21 +3027,40 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
 @api_router.post("/service-orders", response_model=ServiceOrder)
 async def create_service_order(
     order_data: ServiceOrderCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    allow_duplicate: bool = False
 ):
-    order = ServiceOrder(
-        **order_data.model_dump(),
-        created_by=current_user.id
-    )
+    order, order_doc = new_order_doc(order_data, current_user.id)
     
-    order_doc = order.model_dump()
-    order_doc['created_at'] = order_doc['created_at'].isoformat()
-    order_doc['updated_at'] = order_doc['updated_at'].isoformat()
+    if not allow_duplicate:
+        duplicates = await find_open_duplicates(order_doc)
+        if duplicates:
+            raise HTTPException(status_code=409, detail={
+                "message": "Open service orders already exist for this equipment or client",
+                "duplicates": duplicates,
+            })
     
-    await db.service_orders.insert_one(order_doc)
+    # Duplicate ticket/O.S. numbers are rejected by the unique indexes
+    try:
+        await storage.service_orders.insert_one(order_doc)
+    except DuplicateKeyError as e:
+        raise duplicate_key_error(e)
+    await update_order_views(None, order_doc)
+    audit_log.record("create", None, order_doc, current_user)
     
     return order
 
+@api_router.post("/service-orders/sync")
+async def sync_service_orders(
+    batch: SyncRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Apply a technician's offline queue in one round-trip; safe to retry with the same keys"""
+    if len(batch.mutations) > SYNC_MAX_MUTATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {SYNC_MAX_MUTATIONS} mutations per sync")
+    
+    return {"results": await apply_sync_mutations(batch.mutations, current_user)}
+
 @api_router.get("/service-orders", response_model=List[ServiceOrder])
 async def get_service_orders(
     current_user: User = Depends(get_current_user),
@@ -426,101 +3071,155 @@ async def get_service_orders(
     equipment_serial: Optional[str] = None,
     unit: Optional[str] = None,
     date_start: Optional[str] = None,
-    date_end: Optional[str] = None
+    date_end: Optional[str] = None,
+    include_archived: bool = False,
+    resolved_start: Optional[str] = None,
+    resolved_end: Optional[str] = None
 ):
-    # Build filter
-    filter_query = {}
-    if status and status.strip():
-        filter_query['status'] = status
-    if pat:
-        filter_query['pat'] = {"$regex": pat, "$options": "i"}
-    if ticket_number:
-        filter_query['ticket_number'] = {"$regex": ticket_number, "$options": "i"}
-    if os_number:
-        filter_query['os_number'] = {"$regex": os_number, "$options": "i"}
-    if equipment_serial:
-        filter_query['equipment_serial'] = {"$regex": equipment_serial, "$options": "i"}
-    if unit:
-        filter_query['unit'] = {"$regex": unit, "$options": "i"}
-    
-    # Date range filter
-    if date_start or date_end:
-        date_filter = {}
-        if date_start:
-            date_filter["$gte"] = date_start
-        if date_end:
-            date_filter["$lte"] = date_end
-        if date_filter:
-            filter_query['opening_date'] = date_filter
-    
-    # Get orders sorted by creation date (oldest first)
-    orders = await db.service_orders.find(filter_query, {"_id": 0}).sort("created_at", 1).to_list(1000)
-    
-    # Convert ISO strings to datetime
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order.get('updated_at'), str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
+    """List orders; resolved_start/resolved_end keep every order still in progress
+    but only the RESOLVIDO ones opened within the range (the dashboard's view)"""
+    filter_query, include_archive = service_order_query(
+        status, pat, ticket_number, os_number, equipment_serial, unit, date_start, date_end,
+        include_archived, resolved_start, resolved_end
+    )
     
-    # Separate URGENTE orders and put them first
-    urgent_orders = [o for o in orders if o.get('status') == 'URGENTE']
-    normal_orders = [o for o in orders if o.get('status') != 'URGENTE']
+    async def load():
+        # Get orders sorted by creation date (oldest first)
+        orders = await find_service_orders(filter_query, include_archive)
+        
+        # Convert ISO strings to datetime
+        for order in orders:
+            if isinstance(order.get('created_at'), str):
+                order['created_at'] = datetime.fromisoformat(order['created_at'])
+            if isinstance(order.get('updated_at'), str):
+                order['updated_at'] = datetime.fromisoformat(order['updated_at'])
+        
+        # Separate URGENTE orders and put them first
+        urgent_orders = [o for o in orders if o.get('status') == 'URGENTE']
+        normal_orders = [o for o in orders if o.get('status') != 'URGENTE']
+        
+        return urgent_orders + normal_orders
     
-    return urgent_orders + normal_orders
+    # Dispatchers opening the dashboard at once share one query
+    cache_key = ("list", json.dumps(filter_query, sort_keys=True), include_archive)
+    return await query_cache.get(cache_key, load)
 
 @api_router.get("/service-orders/stats")
 async def get_service_orders_stats(current_user: User = Depends(get_current_user)):
     """Get statistics by status"""
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$status",
-                "count": {"$sum": 1}
-            }
+    async def load():
+        counts = await storage.service_orders.count_by("status")
+        
+        stats = {
+            "URGENTE": 0,
+            "ABERTO": 0,
+            "EM ROTA": 0,
+            "LIBERADO": 0,
+            "PENDENCIA": 0,
+            "SUSPENSO": 0,
+            "DEFINIR": 0,
+            "RESOLVIDO": 0
         }
-    ]
+        
+        for status, count in counts.items():
+            stats[status or "ABERTO"] = count
+        
+        # Everything in the archive is RESOLVIDO; its size comes from collection metadata
+        if MONGO_FEATURES:
+            stats["RESOLVIDO"] += await db.service_orders_archive.estimated_document_count()
+        
+        stats["total"] = sum(stats.values())
+        
+        return stats
     
-    results = await db.service_orders.aggregate(pipeline).to_list(None)
-    
-    stats = {
-        "URGENTE": 0,
-        "ABERTO": 0,
-        "EM ROTA": 0,
-        "LIBERADO": 0,
-        "PENDENCIA": 0,
-        "SUSPENSO": 0,
-        "DEFINIR": 0,
-        "RESOLVIDO": 0
-    }
+    return await query_cache.get(("stats",), load)
+
+@api_router.get("/service-orders/sla", dependencies=[Depends(mongo_required)])
+async def get_service_orders_sla(
+    current_user: User = Depends(get_current_user),
+    group_by: str = "unit",
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    include_archived: bool = False
+):
+    """Resolution time percentiles (orders resolved in the period) and aging of open orders.
+    For orders resolved before status changes were tracked, resolved_at is their
+    last update (see ensure_resolution_fields)."""
+    if group_by not in SLA_GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(sorted(SLA_GROUP_FIELDS))}")
     
-    for result in results:
-        status = result.get("_id") or "ABERTO"
-        stats[status] = result.get("count", 0)
+    today = datetime.now(timezone.utc).date()
+    date_start = date_start or (today - timedelta(days=SLA_DEFAULT_DAYS)).isoformat()
+    date_end = date_end or today.isoformat()
+    try:
+        end_exclusive = (datetime.fromisoformat(date_end).date() + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_end must be YYYY-MM-DD")
+    
+    # resolved_at is an ISO timestamp, so string bounds select whole days
+    match = {"resolved_at": {"$gte": date_start, "$lt": end_exclusive}}
+    include_archive = should_include_archive(include_archived, date_start, date_end)
     
-    stats["total"] = sum(stats.values())
+    resolution, aging = await asyncio.gather(
+        resolution_metrics(group_by, match, include_archive),
+        aging_metrics(group_by)
+    )
     
-    return stats
+    return {
+        "group_by": group_by,
+        "date_start": date_start,
+        "date_end": date_end,
+        "resolution": resolution,
+        "aging": aging
+    }
 
 @api_router.get("/service-orders/export")
 async def export_service_orders(
     current_user: User = Depends(get_current_user),
-    ids: Optional[str] = None
+    admission: AdmissionSlot = Depends(export_admission),
+    ids: Optional[str] = None,
+    include_archived: bool = False,
+    status: Optional[str] = None,
+    pat: Optional[str] = None,
+    ticket_number: Optional[str] = None,
+    os_number: Optional[str] = None,
+    equipment_serial: Optional[str] = None,
+    unit: Optional[str] = None,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    resolved_start: Optional[str] = None,
+    resolved_end: Optional[str] = None,
+    format: str = "xlsx",
+    columns: Optional[str] = None,
+    gzip: bool = False
 ):
-    """Export filtered service orders to formatted Excel"""
-    from fastapi.responses import StreamingResponse
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    import io
+    """Export filtered service orders to formatted Excel, or with format=csv|ndjson|parquet
+    stream every field (columns= selects a subset, gzip=true compresses CSV/NDJSON).
+    Takes the same filters as the list, so an export matches the view it came from.
+    """
+    filter_query, include_archive = service_order_query(
+        status, pat, ticket_number, os_number, equipment_serial, unit, date_start, date_end,
+        include_archived, resolved_start, resolved_end
+    )
+    id_list = ids.split(",") if ids else None
+    if id_list:
+        filter_query['id'] = {"$in": id_list}
+        # Selected orders may have been archived since the list was loaded
+        include_archive = True
+    
+    if format != "xlsx":
+        return hold_until_sent(export_stream_response(format, filter_query, include_archive, columns, gzip), admission)
     
     # Get orders based on IDs or all
-    if ids:
-        # Split IDs and get specific orders
-        id_list = ids.split(",")
-        orders = await db.service_orders.find(
-            {"id": {"$in": id_list}}, 
-            {"_id": 0}
-        ).to_list(1000)
+    if id_list:
+        orders = await storage.service_orders.find(filter_query, limit=1000)
+        
+        missing = set(id_list) - {o['id'] for o in orders}
+        if missing and MONGO_FEATURES:
+            orders += await db.service_orders_archive.find(
+                {**filter_query, "id": {"$in": list(missing)}},
+                {"_id": 0}
+            ).to_list(1000)
         
         # Sort to maintain urgente first, then by creation
         urgent_orders = [o for o in orders if o.get('status') == 'URGENTE']
@@ -533,86 +3232,151 @@ async def export_service_orders(
         all_orders = urgent_orders + normal_orders
     else:
         # Get all orders sorted
-        orders = await db.service_orders.find({}, {"_id": 0}).sort("created_at", 1).to_list(1000)
+        orders = await find_service_orders(filter_query, include_archive)
         
         # Separate urgent orders
         urgent_orders = [o for o in orders if o.get('status') == 'URGENTE']
         normal_orders = [o for o in orders if o.get('status') != 'URGENTE']
         all_orders = urgent_orders + normal_orders
     
-    # Create workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relatório O.S."
-    
-    # Define styles
-    header_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
-    header_font = Font(bold=True, color="000000", size=11)
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    border_style = Border(
-        left=Side(style='thin', color='000000'),
-        right=Side(style='thin', color='000000'),
-        top=Side(style='thin', color='000000'),
-        bottom=Side(style='thin', color='000000')
+    return StreamingResponse(
+        iter([await asyncio.to_thread(xlsx_report, all_orders)]),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": "attachment; filename=relatorio_ordens_servico.xlsx"
+        }
     )
+
+@api_router.get("/reports")
+async def list_reports(current_user: User = Depends(get_current_user)):
+    """Configured reports and when their stored file was last built"""
+    reports = []
+    for report, _ in report_scheduler.reports.values():
+        latest = await asyncio.to_thread(latest_report_file, report)
+        reports.append({
+            "name": report.name,
+            "schedule": report.schedule,
+            "format": report.format,
+            "period": report.period,
+            "built_at": datetime.fromtimestamp(latest.stat().st_mtime, timezone.utc).isoformat() if latest else None,
+        })
+    return reports
+
+@api_router.get("/reports/{name}/download")
+async def download_report(name: str, current_user: User = Depends(get_current_user)):
+    """The stored report, rebuilt first only if orders changed since it was built"""
+    if name not in report_scheduler.reports:
+        raise HTTPException(status_code=404, detail="Report not found")
+    report = report_scheduler.reports[name][0]
+    path = await report_scheduler.artifact(report)
     
-    cell_alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Headers
-    headers = ["N° CHAMADO", "N° OS", "PAT", "CLIENTE", "UNIDADE", "DATA", "SITUAÇÃO"]
-    ws.append(headers)
-    
-    # Style header row
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = border_style
+    extension = report.format + (".gz" if report.gzip else "")
+    media_type = "application/gzip" if report.gzip else EXPORT_FORMATS.get(report.format, XLSX_MEDIA_TYPE)
+    return FileResponse(path, media_type=media_type, filename=f"{report.name}.{extension}")
+
+@api_router.post("/service-orders/pdf/batch")
+async def batch_service_orders_pdf(
+    batch: PDFBatchRequest,
+    current_user: User = Depends(get_current_user),
+    admission: AdmissionSlot = Depends(pdf_admission)
+):
+    """Render many service orders and stream them back as a ZIP of PDFs"""
+    if not batch.ids:
+        raise HTTPException(status_code=400, detail="No service orders selected")
+    if len(batch.ids) > PDF_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PDF_BATCH_MAX} orders per batch")
     
-    # Add data
-    for order in all_orders:
-        row = [
-            str(order.get('ticket_number', '')),
-            str(order.get('os_number', '')),
-            str(order.get('pat', '')),
-            str(order.get('client_name', '')),
-            str(order.get('unit', '')),
-            str(order.get('opening_date', '')),
-            str(order.get('status', 'ABERTO'))
-        ]
-        ws.append(row)
+    async def orders():
+        found = set()
+        async for order in storage.service_orders.iterate(
+            {"id": {"$in": batch.ids}}, sort="created_at", exclude=("attachments",)
+        ):
+            found.add(order['id'])
+            yield order
+        missing = [order_id for order_id in batch.ids if order_id not in found]
+        if missing and MONGO_FEATURES:
+            cursor = db.service_orders_archive.find(
+                {"id": {"$in": missing}}, {"_id": 0, "attachments": 0}
+            ).sort("created_at", 1)
+            async for order in cursor:
+                yield order
     
-    # Style data rows
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=7):
-        for cell in row:
-            cell.border = border_style
-            cell.alignment = cell_alignment
+    # Rendering happens while the ZIP streams, so the slot is held until then
+    return hold_until_sent(StreamingResponse(
+        stream_orders_pdf_zip(orders()),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=ordens_servico.zip"
+        }
+    ), admission)
+
+@api_router.get("/service-orders/{order_id}/pdf", dependencies=[Depends(pdf_admission)])
+async def get_service_order_pdf(
+    order_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    order = await find_service_order(order_id, exclude=("attachments",))
     
-    # Adjust column widths
-    column_widths = [15, 10, 12, 30, 20, 12, 15]
-    for i, width in enumerate(column_widths, 1):
-        ws.column_dimensions[chr(64 + i)].width = width
+    if not order:
+        raise HTTPException(status_code=404, detail="Service order not found")
     
-    # Save to BytesIO
-    excel_file = io.BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
+    pdf = await get_order_pdf(order)
     
-    return StreamingResponse(
-        iter([excel_file.getvalue()]),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
         headers={
-            "Content-Disposition": "attachment; filename=relatorio_ordens_servico.xlsx"
+            "Content-Disposition": f"inline; filename={order_pdf_filename(order)}"
         }
     )
 
+@api_router.get("/service-orders/lookup/ticket/{ticket_number}", response_model=ServiceOrder)
+async def lookup_service_order_by_ticket(
+    ticket_number: str,
+    current_user: User = Depends(get_current_user)
+):
+    order = await find_order_by_key("ticket_key", ticket_number)
+    
+    if not order:
+        raise HTTPException(status_code=404, detail="Service order not found")
+    
+    return ServiceOrder(**order)
+
+@api_router.get("/service-orders/lookup/os/{os_number}", response_model=ServiceOrder)
+async def lookup_service_order_by_os(
+    os_number: str,
+    current_user: User = Depends(get_current_user)
+):
+    order = await find_order_by_key("os_key", os_number)
+    
+    if not order:
+        raise HTTPException(status_code=404, detail="Service order not found")
+    
+    return ServiceOrder(**order)
+
+@api_router.get("/service-orders/lookup/pat/{pat}", response_model=List[ServiceOrder])
+async def lookup_service_orders_by_pat(
+    pat: str,
+    current_user: User = Depends(get_current_user)
+):
+    """All orders for a PAT (not unique: the same asset is serviced repeatedly)"""
+    key = normalize_key(pat)
+    if not key:
+        return []
+    
+    orders = await storage.service_orders.find({"pat_key": key}, sort="created_at", limit=1000)
+    if MONGO_FEATURES:
+        orders += await db.service_orders_archive.find({"pat_key": key}, {"_id": 0}).sort("created_at", 1).to_list(1000)
+    orders.sort(key=lambda o: str(o.get('created_at', '')))
+    
+    return orders
+
 @api_router.get("/service-orders/{order_id}", response_model=ServiceOrder)
 async def get_service_order(
     order_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    order = await db.service_orders.find_one({"id": order_id}, {"_id": 0})
+    order = await find_service_order(order_id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Service order not found")
@@ -631,22 +3395,44 @@ async def update_service_order(
     order_data: ServiceOrderUpdate,
     current_user: User = Depends(get_current_user)
 ):
-    existing_order = await db.service_orders.find_one({"id": order_id})
+    existing_order = await storage.service_orders.find_one({"id": order_id})
     
+    # Editing an archived order brings it back into the working set
+    if not existing_order:
+        try:
+            existing_order = await restore_archived_order(order_id)
+        except DuplicateKeyError as e:
+            raise duplicate_key_error(e)
     if not existing_order:
         raise HTTPException(status_code=404, detail="Service order not found")
     
     # Update only provided fields
     update_data = {k: v for k, v in order_data.model_dump().items() if v is not None}
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    await db.service_orders.update_one(
-        {"id": order_id},
-        {"$set": update_data}
-    )
+    for attempt in range(3):
+        now = datetime.now(timezone.utc)
+        update, status_changed = order_update_operators(existing_order, update_data, now, current_user.id)
+        order_filter = {"id": order_id}
+        if status_changed:
+            # Only apply the transition if nobody changed the status meanwhile
+            order_filter["status"] = existing_order.get('status')
+        
+        try:
+            matched = await storage.service_orders.update_one(order_filter, update)
+        except DuplicateKeyError as e:
+            raise duplicate_key_error(e)
+        if matched:
+            break
+        existing_order = await storage.service_orders.find_one({"id": order_id})
+        if not existing_order:
+            raise HTTPException(status_code=404, detail="Service order not found")
+    else:
+        raise HTTPException(status_code=409, detail="Service order is being modified, try again")
     
     # Get updated order
-    updated_order = await db.service_orders.find_one({"id": order_id}, {"_id": 0})
+    updated_order = await storage.service_orders.find_one({"id": order_id})
+    await update_order_views(existing_order, updated_order)
+    audit_log.record("update", existing_order, updated_order, current_user)
     
     # Convert ISO strings to datetime
     if isinstance(updated_order.get('created_at'), str):
@@ -661,15 +3447,327 @@ async def delete_service_order(
     order_id: str,
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.service_orders.delete_one({"id": order_id})
+    order = await storage.service_orders.find_one_and_delete({"id": order_id})
+    if not order and MONGO_FEATURES:
+        order = await db.service_orders_archive.find_one_and_delete({"id": order_id}, {"_id": 0})
     
-    if result.deleted_count == 0:
+    if not order:
         raise HTTPException(status_code=404, detail="Service order not found")
     
+    await update_order_views(order, None)
+    audit_log.record("delete", order, None, current_user)
+    
+    for attachment in order.get('attachments', []):
+        for file_id in [attachment['file_id'], *attachment.get('variants', {}).values()]:
+            await attachment_storage.delete(file_id)
+    
     return {"message": "Service order deleted successfully"}
 
+@api_router.get("/service-orders/{order_id}/history", dependencies=[Depends(mongo_required)])
+async def get_service_order_history(
+    order_id: str,
+    page: int = 1,
+    page_size: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """Change history of an order, newest first"""
+    page = max(1, page)
+    page_size = min(max(1, page_size), 200)
+    
+    # Make this worker's own recent changes visible
+    await audit_log.flush()
+    
+    total = await db.audit_log.count_documents({"order_id": order_id})
+    items = await db.audit_log.find(
+        {"order_id": order_id}, {"_id": 0}
+    ).sort("timestamp", -1).skip((page - 1) * page_size).limit(page_size).to_list(page_size)
+    
+    return {"items": items, "page": page, "page_size": page_size, "total": total}
+
+# Attachment routes
+@api_router.post("/service-orders/{order_id}/attachments", response_model=Attachment, dependencies=[Depends(mongo_required)])
+async def upload_attachment(
+    order_id: str,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    if not await db.service_orders.find_one({"id": order_id}, {"_id": 1}):
+        # Attaching to an archived order brings it back into the working set
+        try:
+            restored = await restore_archived_order(order_id)
+        except DuplicateKeyError as e:
+            raise duplicate_key_error(e)
+        if not restored:
+            raise HTTPException(status_code=404, detail="Service order not found")
+    
+    content_type = file.content_type or "application/octet-stream"
+    if not (content_type.startswith("image/") or content_type == "application/pdf"):
+        raise HTTPException(status_code=400, detail="Only images and PDF files can be attached")
+    
+    async def chunks():
+        received = 0
+        while chunk := await file.read(ATTACHMENT_CHUNK_BYTES):
+            received += len(chunk)
+            if received > ATTACHMENT_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Attachment too large")
+            yield chunk
+    
+    file_id, size = await attachment_storage.save(file.filename or "attachment", content_type, chunks())
+    attachment = Attachment(
+        filename=file.filename or "attachment",
+        content_type=content_type,
+        size=size,
+        file_id=file_id,
+        uploaded_by=current_user.id
+    )
+    attachment_doc = attachment.model_dump()
+    attachment_doc['uploaded_at'] = attachment_doc['uploaded_at'].isoformat()
+    
+    # updated_at is the version sync and archiving check before replacing or
+    # moving an order, so attachment writes bump it like any other edit
+    result = await db.service_orders.update_one(
+        {"id": order_id},
+        {"$push": {"attachments": attachment_doc}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.matched_count == 0:
+        await attachment_storage.delete(file_id)
+        raise HTTPException(status_code=404, detail="Service order not found")
+    await order_data_version.bump()
+    
+    if content_type.startswith("image/"):
+        background_tasks.add_task(generate_attachment_variants, order_id, attachment)
+    
+    return attachment
+
+@api_router.get("/service-orders/{order_id}/attachments/{attachment_id}", dependencies=[Depends(mongo_required)])
+async def download_attachment(
+    order_id: str,
+    attachment_id: str,
+    request: Request,
+    variant: str = "original",
+    current_user: User = Depends(get_current_user)
+):
+    """Stream an attachment (variant=thumb|web|original), honouring Range requests"""
+    for collection in (db.service_orders, db.service_orders_archive):
+        order = await collection.find_one(
+            {"id": order_id, "attachments.id": attachment_id},
+            {"_id": 0, "attachments": {"$elemMatch": {"id": attachment_id}}}
+        )
+        if order:
+            break
+    if not order or not order.get('attachments'):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    
+    attachment = order['attachments'][0]
+    file_id = attachment['file_id']
+    media_type = attachment['content_type']
+    # Variants are rendered in the background; serve the original until they exist
+    if variant != "original" and variant in attachment.get('variants', {}):
+        file_id = attachment['variants'][variant]
+        media_type = "image/jpeg"
+    
+    size = await attachment_storage.size(file_id)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f"inline; filename*=UTF-8''{quote(attachment['filename'])}"
+    }
+    
+    range_header = request.headers.get("range")
+    if range_header:
+        start, length = parse_range(range_header, size)
+        headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            attachment_storage.read(file_id, start, length),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+    
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(attachment_storage.read(file_id), media_type=media_type, headers=headers)
+
+@api_router.delete("/service-orders/{order_id}/attachments/{attachment_id}", dependencies=[Depends(mongo_required)])
+async def delete_attachment(
+    order_id: str,
+    attachment_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    # Archived orders keep their attachments; removing one leaves the order archived
+    for collection in (db.service_orders, db.service_orders_archive):
+        order = await collection.find_one_and_update(
+            {"id": order_id, "attachments.id": attachment_id},
+            {"$pull": {"attachments": {"id": attachment_id}}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0, "attachments": {"$elemMatch": {"id": attachment_id}}}
+        )
+        if order:
+            break
+    if not order:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    await order_data_version.bump()
+    
+    attachment = order['attachments'][0]
+    for file_id in [attachment['file_id'], *attachment.get('variants', {}).values()]:
+        await attachment_storage.delete(file_id)
+    
+    return {"message": "Attachment deleted successfully"}
+
+# Equipment routes
+@api_router.get("/equipment/{serial}/history", dependencies=[Depends(mongo_required)])
+async def get_equipment_history(
+    serial: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Timeline of every order for a machine (equipment or board serial)"""
+    key = normalize_key(serial)
+    summary = await db.equipment_history.find_one({"_id": key}) if key else None
+    orders = summary['orders'] if summary else []
+    
+    # Page counter progression between visits
+    previous_count = None
+    for entry in orders:
+        digits = "".join(ch for ch in str(entry.get('total_page_count') or "") if ch.isdigit())
+        count = int(digits) if digits else None
+        entry['page_count'] = count
+        entry['pages_since_previous'] = (
+            count - previous_count if count is not None and previous_count is not None else None
+        )
+        if count is not None:
+            previous_count = count
+    
+    return {
+        "serial": summary['serial'] if summary else serial,
+        "order_count": len(orders),
+        "open_orders": sum(1 for o in orders if o.get('status') != 'RESOLVIDO'),
+        "first_seen": orders[0]['created_at'] if orders else None,
+        "last_seen": orders[-1]['created_at'] if orders else None,
+        "equipment_replaced": any(o.get('equipment_replaced') for o in orders),
+        "orders": orders
+    }
+
+# Technician queue routes
+@api_router.get("/tech-queues", dependencies=[Depends(mongo_required)])
+async def get_tech_queues(current_user: User = Depends(get_current_user)):
+    """Active orders of every technician, by status"""
+    queues = await db.tech_queues.find({}).to_list(1000)
+    result = [tech_queue_response(queue) for queue in queues]
+    result = [queue for queue in result if queue['total'] > 0]
+    result.sort(key=lambda q: (q['tech'] is None, (q['tech'] or "").lower()))
+    return result
+
+@api_router.get("/tech-queues/{tech}", dependencies=[Depends(mongo_required)])
+async def get_tech_queue(
+    tech: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Active orders of one technician, by status"""
+    queue = await db.tech_queues.find_one({"_id": normalize_key(tech) or ""})
+    if not queue:
+        return {"tech": tech, "total": 0, "counts": {}, "orders": {}}
+    return tech_queue_response(queue)
+
+# Analytics routes
+@api_router.get("/analytics/verifications", dependencies=[Depends(mongo_required)])
+async def get_verification_analytics(
+    current_user: User = Depends(get_current_user),
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    item: Optional[str] = None,
+    month_start: Optional[str] = None,
+    month_end: Optional[str] = None,
+    bucket: str = "month",
+    by_model: bool = True
+):
+    """RUIM rate per checklist item, by equipment brand/model and period (YYYY-MM bounds)"""
+    if bucket not in ("month", "quarter", "year", "all"):
+        raise HTTPException(status_code=400, detail="bucket must be month, quarter, year or all")
+    
+    query = {}
+    if brand:
+        query['brand'] = rollup_label(brand)
+    if model:
+        query['model'] = rollup_label(model)
+    if item:
+        query['item'] = item.strip()
+    if month_start or month_end:
+        query['month'] = {}
+        if month_start:
+            query['month']["$gte"] = month_start
+        if month_end:
+            query['month']["$lte"] = month_end
+    
+    rows = {}
+    async for rollup in db.verification_rollups.find(query, {"_id": 0}):
+        key = (
+            rollup.get('brand') if by_model else None,
+            rollup.get('model') if by_model else None,
+            rollup_period(rollup['month'], bucket),
+            rollup['item'],
+        )
+        row = rows.setdefault(key, {
+            "brand": key[0], "model": key[1], "period": key[2], "item": key[3],
+            **{counter: 0 for counter in VERIFICATION_STATUS_FIELDS.values()},
+        })
+        for counter in VERIFICATION_STATUS_FIELDS.values():
+            row[counter] += rollup.get(counter, 0)
+    
+    result = []
+    for row in rows.values():
+        rated = row['boa'] + row['ruim']
+        if rated + row['na'] == 0:
+            continue
+        # N/A answers don't count towards the failure rate
+        row['ruim_rate'] = round(row['ruim'] / rated, 4) if rated else None
+        result.append(row)
+    result.sort(key=lambda r: (r['period'], -(r['ruim_rate'] or 0), -r['ruim']))
+    
+    return result
+
+# Autocomplete route
+@api_router.get("/suggest")
+async def suggest(
+    field: str,
+    prefix: str = "",
+    limit: int = 10,
+    current_user: User = Depends(get_current_user)
+):
+    """Most used existing values of a field starting with prefix (served from memory)"""
+    if field not in SUGGEST_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(SUGGEST_FIELDS)}")
+    
+    return {
+        "field": field,
+        "suggestions": suggest_index.suggest(field, prefix, min(max(1, limit), 50))
+    }
+
+# Health routes
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: DB round-trip latency and connection pool usage"""
+    pool = None
+    if MONGO_FEATURES:
+        pool = {
+            "in_use": pool_stats.in_use,
+            "available": max(0, pool_stats.open - pool_stats.in_use),
+            "open": pool_stats.open,
+            "max_size": MONGO_MAX_POOL_SIZE,
+            "wait_queue_timeouts": pool_stats.wait_timeouts,
+        }
+    started = time.perf_counter()
+    try:
+        await storage.ping()
+    except (PyMongoError, sqlite3.Error) as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "storage": STORAGE_BACKEND, "error": str(e), "pool": pool}
+        )
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    return {"status": "ready", "storage": STORAGE_BACKEND, "db_latency_ms": latency_ms, "pool": pool}
+
 # OCR route
-@api_router.post("/ocr", response_model=OCRResponse)
+@api_router.post("/ocr", response_model=OCRResponse, dependencies=[Depends(ocr_admission)])
 async def process_ocr(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user)
@@ -683,6 +3781,7 @@ async def process_ocr(
         
         # Verify it's a valid image
         try:
+            from PIL import Image
             img = Image.open(BytesIO(contents))
             img.verify()
         except Exception:
@@ -718,6 +3817,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+@app.exception_handler(ConnectionFailure)
+async def db_unavailable_handler(request: Request, exc: ConnectionFailure):
+    # Pool exhausted or server unreachable: fail fast instead of queueing forever
+    logger.warning(f"Database unavailable: {str(exc)}")
+    if isinstance(exc, ServerSelectionTimeoutError):
+        detail = "Database unavailable"
+    else:
+        detail = "Database busy, try again"
+    return JSONResponse(
+        status_code=503,
+        content={"detail": detail},
+        headers={"Retry-After": "1"}
+    )
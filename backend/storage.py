@@ -0,0 +1,666 @@
+"""
+Storage backends for users and service orders
+
+STORAGE_BACKEND=mongo (default) keeps them in MongoDB through Motor.
+STORAGE_BACKEND=sqlite keeps them in one embedded SQLite file, for
+single-box installs and for running without any external service.
+
+Both expose the same small repository interface, queried with the
+Mongo-style filters the routes already build (equality, $regex, $gte/$lte,
+$in, $ne...) and updated with $set/$unset/$inc/$push.
+"""
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from pymongo import InsertOne, ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+class Repository(ABC):
+    """One collection of JSON-like documents (the Mongo _id is never returned)"""
+
+    @abstractmethod
+    async def find_one(self, filter_query: dict, exclude: tuple = ()) -> Optional[dict]:
+        """First match, without the `exclude` fields"""
+
+    @abstractmethod
+    async def find(self, filter_query: dict, sort: Optional[str] = None, limit: int = 0,
+                   exclude: tuple = ()) -> List[dict]:
+        """Matching documents, ascending by `sort` ("-field" for descending)"""
+
+    @abstractmethod
+    def iterate(self, filter_query: dict, sort: Optional[str] = None, batch_size: int = 1000,
+                exclude: tuple = ()) -> AsyncIterator[dict]:
+        """Stream matching documents, holding one batch in memory"""
+
+    @abstractmethod
+    async def find_ids(self, filter_query: dict, limit: int = 0) -> List[str]:
+        """Ids of matching documents; answered from an index when one covers the filter"""
+
+    @abstractmethod
+    async def count_by(self, field: str, filter_query: Optional[dict] = None) -> Dict[Optional[str], int]:
+        """Number of matching documents per value of `field`"""
+
+    @abstractmethod
+    async def insert_one(self, doc: dict):
+        """Raises DuplicateKeyError on a unique index violation"""
+
+    @abstractmethod
+    async def update_one(self, filter_query: dict, update: dict) -> bool:
+        """Apply update operators to the first match; False if nothing matched"""
+
+    @abstractmethod
+    async def find_one_and_delete(self, filter_query: dict) -> Optional[dict]:
+        """Delete the first match and return it"""
+
+    @abstractmethod
+    async def delete_one(self, filter_query: dict) -> bool:
+        """Delete the first match; False if nothing matched"""
+
+    @abstractmethod
+    async def bulk_write(self, operations: List[tuple]) -> Dict[int, DuplicateKeyError]:
+        """Apply ("insert", doc) and ("replace", filter, doc) operations in one
+        unordered batch. Returns the duplicate key errors by operation index;
+        a replace whose filter matched nothing is silently skipped.
+        """
+
+class Storage(ABC):
+    users: Repository
+    service_orders: Repository
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def ping(self):
+        """Raise if the backend is unreachable"""
+
+    @abstractmethod
+    async def data_version(self, name: str) -> int:
+        """Current write counter for a named data set"""
+
+    @abstractmethod
+    async def bump_data_version(self, name: str) -> int:
+        """Increment the counter and return the new value"""
+
+    @abstractmethod
+    async def load_idempotency(self, keys: List[str]) -> Dict[str, dict]:
+        """Stored results for the keys that have not expired"""
+
+    @abstractmethod
+    async def save_idempotency(self, results: Dict[str, dict], ttl_seconds: float):
+        """Remember results by key for ttl_seconds"""
+
+def projection(exclude: tuple) -> dict:
+    return {"_id": 0, **{field: 0 for field in exclude}}
+
+def sort_spec(sort: Optional[str]):
+    if not sort:
+        return None
+    return [(sort[1:], -1)] if sort.startswith("-") else [(sort, 1)]
+
+# ============ MONGODB ============
+
+class MongoRepository(Repository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, filter_query: dict, exclude: tuple = ()) -> Optional[dict]:
+        return await self.collection.find_one(filter_query, projection(exclude))
+
+    async def find(self, filter_query: dict, sort: Optional[str] = None, limit: int = 0,
+                   exclude: tuple = ()) -> List[dict]:
+        cursor = self.collection.find(filter_query, projection(exclude))
+        if sort:
+            cursor = cursor.sort(sort_spec(sort))
+        return await cursor.to_list(limit or None)
+
+    async def iterate(self, filter_query: dict, sort: Optional[str] = None, batch_size: int = 1000,
+                      exclude: tuple = ()):
+        cursor = self.collection.find(filter_query, projection(exclude), batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort_spec(sort))
+        async for doc in cursor:
+            yield doc
+
+    async def find_ids(self, filter_query: dict, limit: int = 0) -> List[str]:
+        cursor = self.collection.find(filter_query, {"_id": 0, "id": 1})
+        return [doc["id"] for doc in await cursor.to_list(limit or None)]
+
+    async def count_by(self, field: str, filter_query: Optional[dict] = None) -> Dict[Optional[str], int]:
+        pipeline = [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+        if filter_query:
+            pipeline.insert(0, {"$match": filter_query})
+        results = await self.collection.aggregate(pipeline).to_list(None)
+        return {result["_id"]: result["count"] for result in results}
+
+    async def insert_one(self, doc: dict):
+        await self.collection.insert_one(doc)
+
+    async def update_one(self, filter_query: dict, update: dict) -> bool:
+        result = await self.collection.update_one(filter_query, update)
+        return result.matched_count > 0
+
+    async def find_one_and_delete(self, filter_query: dict) -> Optional[dict]:
+        return await self.collection.find_one_and_delete(filter_query, {"_id": 0})
+
+    async def delete_one(self, filter_query: dict) -> bool:
+        result = await self.collection.delete_one(filter_query)
+        return result.deleted_count > 0
+
+    async def bulk_write(self, operations: List[tuple]) -> Dict[int, DuplicateKeyError]:
+        if not operations:
+            return {}
+        requests = [
+            InsertOne(dict(op[1])) if op[0] == "insert" else ReplaceOne(op[1], op[2])
+            for op in operations
+        ]
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            errors = {}
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != 11000:
+                    raise
+                errors[error["index"]] = DuplicateKeyError(error.get("errmsg", ""), 11000, error)
+            return errors
+        return {}
+
+class MongoStorage(Storage):
+    def __init__(self, db):
+        self.db = db
+        self.users = MongoRepository(db.users)
+        self.service_orders = MongoRepository(db.service_orders)
+
+    async def ping(self):
+        await self.db.command("ping")
+
+    async def data_version(self, name: str) -> int:
+        doc = await self.db.data_versions.find_one({"_id": name})
+        return doc["version"] if doc else 0
+
+    async def bump_data_version(self, name: str) -> int:
+        doc = await self.db.data_versions.find_one_and_update(
+            {"_id": name}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+    async def load_idempotency(self, keys: List[str]) -> Dict[str, dict]:
+        # The TTL monitor only runs every minute, so expiry is checked here too
+        cursor = self.db.sync_idempotency.find(
+            {"_id": {"$in": keys}, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        return {doc["_id"]: doc["result"] async for doc in cursor}
+
+    async def save_idempotency(self, results: Dict[str, dict], ttl_seconds: float):
+        if not results:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        await self.db.sync_idempotency.bulk_write([
+            ReplaceOne({"_id": key}, {"result": result, "expires_at": expires_at}, upsert=True)
+            for key, result in results.items()
+        ], ordered=False)
+
+# ============ SQLITE ============
+# Each collection is a table holding the document as JSON. Fields the routes
+# filter or sort on are generated columns with their own indexes; the rest is
+# reached with json_extract(). Every statement runs on one dedicated thread
+# that owns the connection, so the event loop never blocks on disk.
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+@lru_cache(maxsize=256)
+def compile_regex(pattern: str):
+    return re.compile(pattern)
+
+def sqlite_regexp(pattern: str, value) -> bool:
+    return value is not None and compile_regex(pattern).search(str(value)) is not None
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def duplicate_key(e: sqlite3.IntegrityError, table: str) -> DuplicateKeyError:
+    """Report a UNIQUE violation the way pymongo does, so callers handle both backends alike"""
+    # Message looks like "UNIQUE constraint failed: service_orders.ticket_key"
+    fields = [column.split(".")[-1] for column in str(e).split(":", 1)[-1].split(",")]
+    key_pattern = {field.strip(): 1 for field in fields}
+    index = "_".join(f"{field}_1" for field in key_pattern)
+    return DuplicateKeyError(f"E11000 duplicate key error collection: {table} index: {index}", 11000,
+                             {"keyPattern": key_pattern})
+
+def set_path(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+def get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+def apply_update(doc: dict, update: dict):
+    for op, fields in update.items():
+        for path, value in fields.items():
+            if "$" in path:
+                raise ValueError(f"Positional update {path} is not supported by the SQLite backend")
+            if op == "$set":
+                set_path(doc, path, value)
+            elif op == "$unset":
+                *parents, last = path.split(".")
+                parent = get_path(doc, ".".join(parents)) if parents else doc
+                if isinstance(parent, dict):
+                    parent.pop(last, None)
+            elif op == "$inc":
+                set_path(doc, path, (get_path(doc, path) or 0) + value)
+            elif op == "$push":
+                current = get_path(doc, path)
+                set_path(doc, path, (current or []) + [value])
+            else:
+                raise ValueError(f"Update operator {op} is not supported by the SQLite backend")
+
+class SQLiteRepository(Repository):
+    def __init__(self, storage: "SQLiteStorage", table: str, columns: List[str],
+                 json_columns: List[str] = (), indexes: List[tuple] = (), unique: List[str] = ()):
+        """columns: top-level fields exposed as indexed generated columns.
+        json_columns: fields stored in their own JSON column instead of the document.
+        indexes: extra composite indexes, as tuples of column names.
+        unique: columns with a unique index (NULLs allowed, like a Mongo partial index).
+        """
+        self.storage = storage
+        self.table = table
+        self.columns = list(columns)
+        self.json_columns = list(json_columns)
+        self.indexes = list(indexes)
+        self.unique = list(unique)
+
+    def create(self, conn: sqlite3.Connection):
+        """Create the table and indexes, adding generated columns missing from an older file"""
+        generated = {
+            column: f"{column} GENERATED ALWAYS AS (json_extract(doc, '$.{column}')) VIRTUAL"
+            for column in self.columns if column != "id"
+        }
+        stored_json = "".join(f", {column} TEXT NOT NULL DEFAULT '[]'" for column in self.json_columns)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            f"(id TEXT PRIMARY KEY, doc TEXT NOT NULL{stored_json}{''.join(', ' + g for g in generated.values())})"
+        )
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({self.table})")}
+        for column, definition in generated.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {definition}")
+
+        statements = []
+        # A composite index already serves lookups on its leading column
+        leading = {columns[0] for columns in self.indexes}
+        for column in self.columns:
+            if column == "id":
+                continue
+            if column in self.unique:
+                statements.append(f"CREATE UNIQUE INDEX IF NOT EXISTS {self.table}_{column} ON {self.table}({column})")
+            elif column in leading:
+                conn.execute(f"DROP INDEX IF EXISTS {self.table}_{column}")
+            else:
+                statements.append(f"CREATE INDEX IF NOT EXISTS {self.table}_{column} ON {self.table}({column})")
+        for columns in self.indexes:
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_{'_'.join(columns)} ON {self.table}({', '.join(columns)})"
+            )
+        for statement in statements:
+            conn.execute(statement)
+
+    # ---- documents <-> rows ----
+
+    def to_row(self, doc: dict) -> tuple:
+        body = {k: v for k, v in doc.items() if k not in self.json_columns and k != "_id"}
+        extra = [json.dumps(doc.get(column) or [], default=json_default) for column in self.json_columns]
+        return (doc["id"], json.dumps(body, default=json_default), *extra)
+
+    def from_row(self, row: tuple, exclude: tuple = ()) -> dict:
+        doc = json.loads(row[0])
+        for column, value in zip(self.json_columns, row[1:]):
+            doc[column] = json.loads(value)
+        for field in exclude:
+            doc.pop(field, None)
+        return doc
+
+    def select(self) -> str:
+        return ", ".join(["doc", *self.json_columns])
+
+    # ---- filters ----
+
+    def field_sql(self, field: str) -> str:
+        if not FIELD_NAME.match(field):
+            raise ValueError(f"Invalid field name {field!r}")
+        if field == "id" or field in self.columns:
+            return field
+        if field in self.json_columns:
+            raise ValueError(f"Cannot filter on JSON column {field}")
+        return f"json_extract(doc, '$.{field}')"
+
+    def where(self, filter_query: Optional[dict]) -> tuple:
+        clauses, params = [], []
+        for field, condition in (filter_query or {}).items():
+            if field in ("$and", "$or"):
+                parts = [self.where(sub) for sub in condition]
+                joiner = " AND " if field == "$and" else " OR "
+                clauses.append("(" + joiner.join(f"({sql})" for sql, _ in parts) + ")")
+                for _, sub_params in parts:
+                    params.extend(sub_params)
+                continue
+
+            column = self.field_sql(field)
+            if not (isinstance(condition, dict) and any(key.startswith("$") for key in condition)):
+                if condition is None:
+                    clauses.append(f"{column} IS NULL")
+                else:
+                    clauses.append(f"{column} = ?")
+                    params.append(condition)
+                continue
+
+            options = condition.get("$options", "")
+            for op, value in condition.items():
+                if op == "$options":
+                    continue
+                if op == "$regex":
+                    clauses.append(f"{column} REGEXP ?")
+                    params.append(("(?i)" if "i" in options else "") + value)
+                elif op in COMPARISONS:
+                    clauses.append(f"{column} {COMPARISONS[op]} ?")
+                    params.append(value)
+                elif op in ("$in", "$nin"):
+                    values = [v for v in value if v is not None]
+                    placeholders = ", ".join("?" for _ in values) or "NULL"
+                    if op == "$in":
+                        sql = f"{column} IN ({placeholders})"
+                        if None in value:
+                            sql = f"({sql} OR {column} IS NULL)"
+                    else:
+                        sql = f"({column} IS NULL OR {column} NOT IN ({placeholders}))"
+                        if None in value:
+                            sql = f"({column} IS NOT NULL AND {column} NOT IN ({placeholders}))"
+                    clauses.append(sql)
+                    params.extend(values)
+                elif op == "$ne":
+                    if value is None:
+                        clauses.append(f"{column} IS NOT NULL")
+                    else:
+                        clauses.append(f"({column} IS NULL OR {column} != ?)")
+                        params.append(value)
+                elif op == "$exists":
+                    # json_type() tells a missing field from an explicit null
+                    clauses.append(f"json_type(doc, '$.{field}') IS {'NOT ' if value else ''}NULL")
+                else:
+                    raise ValueError(f"Filter operator {op} is not supported by the SQLite backend")
+        return (" AND ".join(clauses) or "1"), params
+
+    def order_by(self, sort: Optional[str]) -> str:
+        if not sort:
+            return ""
+        descending = sort.startswith("-")
+        return f" ORDER BY {self.field_sql(sort.lstrip('-'))}{' DESC' if descending else ''}"
+
+    # ---- operations ----
+
+    async def find_one(self, filter_query: dict, exclude: tuple = ()) -> Optional[dict]:
+        where, params = self.where(filter_query)
+        row = await self.storage.run(
+            lambda conn: conn.execute(f"SELECT {self.select()} FROM {self.table} WHERE {where} LIMIT 1", params).fetchone()
+        )
+        return self.from_row(row, exclude) if row else None
+
+    async def find(self, filter_query: dict, sort: Optional[str] = None, limit: int = 0,
+                   exclude: tuple = ()) -> List[dict]:
+        where, params = self.where(filter_query)
+        sql = f"SELECT {self.select()} FROM {self.table} WHERE {where}{self.order_by(sort)}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = await self.storage.run(lambda conn: conn.execute(sql, params).fetchall())
+        return [self.from_row(row, exclude) for row in rows]
+
+    async def iterate(self, filter_query: dict, sort: Optional[str] = None, batch_size: int = 1000,
+                      exclude: tuple = ()):
+        where, params = self.where(filter_query)
+        # Keyset pagination on (sort value, id): no cursor stays open between batches
+        sort_field = sort.lstrip("-") if sort else "id"
+        descending = bool(sort) and sort.startswith("-")
+        sort_column = f"ifnull({self.field_sql(sort_field)}, '')"
+        direction, after = ("DESC", "<") if descending else ("ASC", ">")
+        last = None
+        while True:
+            sql = f"SELECT {self.select()}, {sort_column}, id FROM {self.table} WHERE {where}"
+            page_params = list(params)
+            if last is not None:
+                sql += f" AND ({sort_column}, id) {after} (?, ?)"
+                page_params.extend(last)
+            sql += f" ORDER BY {sort_column} {direction}, id {direction} LIMIT {int(batch_size)}"
+            rows = await self.storage.run(lambda conn: conn.execute(sql, page_params).fetchall())
+            for row in rows:
+                yield self.from_row(row, exclude)
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1][-2], rows[-1][-1])
+
+    async def find_ids(self, filter_query: dict, limit: int = 0) -> List[str]:
+        where, params = self.where(filter_query)
+        sql = f"SELECT id FROM {self.table} WHERE {where}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = await self.storage.run(lambda conn: conn.execute(sql, params).fetchall())
+        return [row[0] for row in rows]
+
+    async def count_by(self, field: str, filter_query: Optional[dict] = None) -> Dict[Optional[str], int]:
+        column = self.field_sql(field)
+        where, params = self.where(filter_query)
+        rows = await self.storage.run(
+            lambda conn: conn.execute(
+                f"SELECT {column}, COUNT(*) FROM {self.table} WHERE {where} GROUP BY {column}", params
+            ).fetchall()
+        )
+        return dict(rows)
+
+    async def insert_one(self, doc: dict):
+        placeholders = ", ".join("?" for _ in range(2 + len(self.json_columns)))
+        sql = f"INSERT INTO {self.table} (id, doc{''.join(', ' + c for c in self.json_columns)}) VALUES ({placeholders})"
+        row = self.to_row(doc)
+
+        def insert(conn):
+            try:
+                conn.execute(sql, row)
+            except sqlite3.IntegrityError as e:
+                raise duplicate_key(e, self.table)
+
+        await self.storage.run(insert)
+
+    async def update_one(self, filter_query: dict, update: dict) -> bool:
+        where, params = self.where(filter_query)
+        assignments = ", ".join(["doc = ?", *(f"{column} = ?" for column in self.json_columns)])
+
+        def read_modify_write(conn):
+            # IMMEDIATE takes the write lock up front, so the read can't go stale
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"SELECT id, {self.select()} FROM {self.table} WHERE {where} LIMIT 1", params
+                ).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return False
+                doc = self.from_row(row[1:])
+                apply_update(doc, update)
+                _, *values = self.to_row(doc)
+                conn.execute(f"UPDATE {self.table} SET {assignments} WHERE id = ?", (*values, row[0]))
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK")
+                raise duplicate_key(e, self.table)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return await self.storage.run(read_modify_write)
+
+    async def find_one_and_delete(self, filter_query: dict) -> Optional[dict]:
+        where, params = self.where(filter_query)
+        # fetchall() steps the statement to completion, which commits it
+        rows = await self.storage.run(
+            lambda conn: conn.execute(
+                f"DELETE FROM {self.table} WHERE id = (SELECT id FROM {self.table} WHERE {where} LIMIT 1) "
+                f"RETURNING {self.select()}", params
+            ).fetchall()
+        )
+        return self.from_row(rows[0]) if rows else None
+
+    async def delete_one(self, filter_query: dict) -> bool:
+        return await self.find_one_and_delete(filter_query) is not None
+
+    async def bulk_write(self, operations: List[tuple]) -> Dict[int, DuplicateKeyError]:
+        columns = ["id", "doc", *self.json_columns]
+        insert_sql = f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        assignments = ", ".join(f"{column} = ?" for column in columns[1:])
+
+        def write(conn):
+            errors = {}
+            # One transaction, so the batch costs a single fsync
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for index, op in enumerate(operations):
+                    try:
+                        if op[0] == "insert":
+                            conn.execute(insert_sql, self.to_row(op[1]))
+                        else:
+                            where, params = self.where(op[1])
+                            _, *values = self.to_row(op[2])
+                            conn.execute(
+                                f"UPDATE {self.table} SET {assignments} "
+                                f"WHERE id = (SELECT id FROM {self.table} WHERE {where} LIMIT 1)",
+                                (*values, *params)
+                            )
+                    except sqlite3.IntegrityError as e:
+                        errors[index] = duplicate_key(e, self.table)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return errors
+
+        return await self.storage.run(write)
+
+class SQLiteStorage(Storage):
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.conn: Optional[sqlite3.Connection] = None
+        self.users = SQLiteRepository(self, "users", columns=["email"])
+        self.service_orders = SQLiteRepository(
+            self, "service_orders",
+            columns=[
+                "status", "created_at", "updated_at", "opening_date", "resolved_at",
+                "ticket_number", "os_number", "pat", "equipment_serial", "unit",
+                "ticket_key", "os_key", "pat_key", "serial_key", "client_unit_key",
+            ],
+            json_columns=["verifications"],
+            indexes=[
+                ("status", "created_at"), ("status", "updated_at"),
+                # Covering indexes for the duplicate check on create
+                ("serial_key", "status", "id"), ("pat_key", "status", "id"),
+                ("ticket_key", "status", "id"), ("client_unit_key", "status", "id"),
+            ],
+            unique=["ticket_key", "os_key"],
+        )
+
+    async def run(self, fn):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, self.conn)
+
+    async def open(self):
+        def connect(_):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit; multi-statement writes open their own transaction
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.create_function("REGEXP", 2, sqlite_regexp, deterministic=True)
+            for repository in (self.users, self.service_orders):
+                repository.create(conn)
+            conn.execute("CREATE TABLE IF NOT EXISTS data_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_idempotency "
+                "(key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sync_idempotency_expires_at ON sync_idempotency(expires_at)")
+            self.conn = conn
+
+        await self.run(connect)
+
+    async def close(self):
+        if self.conn is not None:
+            await self.run(lambda conn: conn.close())
+            self.conn = None
+        self.executor.shutdown(wait=False)
+
+    async def ping(self):
+        await self.run(lambda conn: conn.execute("SELECT 1").fetchone())
+
+    async def data_version(self, name: str) -> int:
+        row = await self.run(
+            lambda conn: conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+        )
+        return row[0] if row else 0
+
+    async def bump_data_version(self, name: str) -> int:
+        rows = await self.run(
+            lambda conn: conn.execute(
+                "INSERT INTO data_versions (name, version) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1 RETURNING version", (name,)
+            ).fetchall()
+        )
+        return rows[0][0]
+
+    async def load_idempotency(self, keys: List[str]) -> Dict[str, dict]:
+        placeholders = ", ".join("?" for _ in keys) or "NULL"
+        rows = await self.run(
+            lambda conn: conn.execute(
+                f"SELECT key, result FROM sync_idempotency WHERE key IN ({placeholders}) AND expires_at > ?",
+                (*keys, time.time())
+            ).fetchall()
+        )
+        return {key: json.loads(result) for key, result in rows}
+
+    async def save_idempotency(self, results: Dict[str, dict], ttl_seconds: float):
+        now = time.time()
+        rows = [(key, json.dumps(result, default=json_default), now + ttl_seconds) for key, result in results.items()]
+
+        def save(conn):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired keys are purged on write (SQLite has no TTL index)
+                conn.execute("DELETE FROM sync_idempotency WHERE expires_at <= ?", (now,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sync_idempotency (key, result, expires_at) VALUES (?, ?, ?)", rows
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self.run(save)
@@ -0,0 +1,160 @@
+import { useState, useEffect } from "react";
+import axios from "axios";
+import { toast } from "sonner";
+import { errorMessage } from "@/lib/utils";
+import { Button } from "@/components/ui/button";
+import { FileText, Paperclip, Trash2 } from "lucide-react";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const authHeaders = () => ({ Authorization: `Bearer ${localStorage.getItem("token")}` });
+
+// Downloads need the token, so files are fetched as blobs instead of linked directly
+const fetchBlobUrl = async (orderId, attachmentId, variant) => {
+  const response = await axios.get(`${API}/service-orders/${orderId}/attachments/${attachmentId}`, {
+    headers: authHeaders(),
+    params: { variant },
+    responseType: "blob",
+  });
+  return URL.createObjectURL(response.data);
+};
+
+const Thumbnail = ({ orderId, attachment }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let url = null;
+    let cancelled = false;
+    // The server sends the original until the thumbnail has been rendered
+    fetchBlobUrl(orderId, attachment.id, "thumb")
+      .then((blobUrl) => {
+        url = blobUrl;
+        if (!cancelled) setSrc(blobUrl);
+      })
+      .catch(() => setSrc(null));
+    return () => {
+      cancelled = true;
+      if (url) URL.revokeObjectURL(url);
+    };
+  }, [orderId, attachment.id]);
+
+  if (!src) {
+    return <div className="w-full h-24 bg-slate-100 rounded animate-pulse" />;
+  }
+  return <img src={src} alt={attachment.filename} className="w-full h-24 object-cover rounded" />;
+};
+
+// Photos and PDFs attached to an order
+const Attachments = ({ orderId, initial }) => {
+  const [attachments, setAttachments] = useState(initial || []);
+  const [uploading, setUploading] = useState(false);
+
+  useEffect(() => {
+    setAttachments(initial || []);
+  }, [initial]);
+
+  const open = async (attachment) => {
+    try {
+      const variant = attachment.content_type.startsWith("image/") ? "web" : "original";
+      const url = await fetchBlobUrl(orderId, attachment.id, variant);
+      window.open(url, "_blank", "noopener");
+    } catch (error) {
+      toast.error("Erro ao abrir anexo");
+    }
+  };
+
+  const upload = async (e) => {
+    const files = Array.from(e.target.files || []);
+    e.target.value = "";
+    if (files.length === 0) return;
+
+    setUploading(true);
+    try {
+      for (const file of files) {
+        const data = new FormData();
+        data.append("file", file);
+        const response = await axios.post(`${API}/service-orders/${orderId}/attachments`, data, {
+          headers: authHeaders(),
+        });
+        setAttachments((current) => [...current, response.data]);
+      }
+      toast.success("Anexo enviado");
+    } catch (error) {
+      toast.error(errorMessage(error, "Erro ao enviar anexo"));
+    } finally {
+      setUploading(false);
+    }
+  };
+
+  const remove = async (attachment) => {
+    if (!window.confirm(`Excluir o anexo ${attachment.filename}?`)) return;
+    try {
+      await axios.delete(`${API}/service-orders/${orderId}/attachments/${attachment.id}`, {
+        headers: authHeaders(),
+      });
+      setAttachments((current) => current.filter((a) => a.id !== attachment.id));
+    } catch (error) {
+      toast.error("Erro ao excluir anexo");
+    }
+  };
+
+  return (
+    <div className="bg-white rounded-xl shadow-sm p-6" data-testid="attachments">
+      <div className="flex items-center justify-between mb-4">
+        <h2 className="text-lg font-semibold text-slate-800">Anexos ({attachments.length})</h2>
+        <label>
+          <input
+            type="file"
+            accept="image/*,application/pdf"
+            multiple
+            className="hidden"
+            onChange={upload}
+            disabled={uploading}
+            data-testid="attachment-input"
+          />
+          <Button type="button" variant="outline" disabled={uploading} asChild>
+            <span className="cursor-pointer">
+              <Paperclip className="w-4 h-4 mr-2" />
+              {uploading ? "Enviando..." : "Adicionar fotos ou PDF"}
+            </span>
+          </Button>
+        </label>
+      </div>
+      {attachments.length === 0 ? (
+        <p className="text-sm text-slate-500">Nenhum anexo.</p>
+      ) : (
+        <div className="grid grid-cols-2 md:grid-cols-4 gap-4">
+          {attachments.map((attachment) => (
+            <div key={attachment.id} className="border border-slate-200 rounded-lg p-2">
+              <button type="button" className="w-full" onClick={() => open(attachment)}>
+                {attachment.content_type.startsWith("image/") ? (
+                  <Thumbnail orderId={orderId} attachment={attachment} />
+                ) : (
+                  <div className="w-full h-24 flex items-center justify-center bg-slate-50 rounded">
+                    <FileText className="w-8 h-8 text-slate-400" />
+                  </div>
+                )}
+              </button>
+              <div className="flex items-center justify-between mt-2 gap-1">
+                <span className="text-xs text-slate-600 truncate" title={attachment.filename}>
+                  {attachment.filename}
+                </span>
+                <button
+                  type="button"
+                  onClick={() => remove(attachment)}
+                  className="text-slate-400 hover:text-red-600"
+                  data-testid="attachment-delete"
+                >
+                  <Trash2 className="w-4 h-4" />
+                </button>
+              </div>
+            </div>
+          ))}
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default Attachments;
@@ -0,0 +1,90 @@
+import { useState, useEffect } from "react";
+import axios from "axios";
+import { History } from "lucide-react";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const STATUS_COLORS = {
+  "URGENTE": "bg-orange-100 text-orange-900 border-orange-500",
+  "ABERTO": "bg-yellow-100 text-yellow-800 border-yellow-300",
+  "EM ROTA": "bg-gray-100 text-gray-800 border-gray-300",
+  "LIBERADO": "bg-blue-100 text-blue-800 border-blue-300",
+  "PENDENCIA": "bg-red-100 text-red-800 border-red-300",
+  "SUSPENSO": "bg-pink-100 text-pink-800 border-pink-300",
+  "DEFINIR": "bg-purple-100 text-purple-800 border-purple-300",
+  "RESOLVIDO": "bg-green-100 text-green-800 border-green-300"
+};
+
+// Previous orders for the machine being typed into the form
+const EquipmentHistory = ({ serial, currentOrderId }) => {
+  const [history, setHistory] = useState(null);
+
+  useEffect(() => {
+    const value = (serial || "").trim();
+    if (value.length < 3) {
+      setHistory(null);
+      return;
+    }
+
+    // Wait for the user to stop typing before asking the server
+    const timer = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem("token");
+        const response = await axios.get(`${API}/equipment/${encodeURIComponent(value)}/history`, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        setHistory(response.data);
+      } catch (error) {
+        setHistory(null);
+      }
+    }, 400);
+
+    return () => clearTimeout(timer);
+  }, [serial]);
+
+  const orders = (history?.orders || []).filter((order) => order.id !== currentOrderId);
+  if (orders.length === 0) {
+    return null;
+  }
+
+  return (
+    <div className="mt-4 border border-slate-200 rounded-lg p-4 bg-slate-50" data-testid="equipment-history">
+      <div className="flex items-center gap-2 mb-3">
+        <History className="w-4 h-4 text-slate-600" />
+        <h3 className="text-sm font-semibold text-slate-700">
+          Histórico do equipamento ({orders.length} O.S. anteriores)
+        </h3>
+        {history.equipment_replaced && (
+          <span className="text-xs px-2 py-0.5 rounded border bg-red-100 text-red-800 border-red-300">
+            Equipamento já trocado
+          </span>
+        )}
+      </div>
+      <div className="space-y-2 max-h-60 overflow-y-auto">
+        {[...orders].reverse().map((order) => (
+          <div key={order.id} className="text-xs bg-white border border-slate-200 rounded p-2">
+            <div className="flex flex-wrap items-center gap-2">
+              <span className={`px-2 py-0.5 rounded border ${STATUS_COLORS[order.status] || STATUS_COLORS["ABERTO"]}`}>
+                {order.status || "ABERTO"}
+              </span>
+              <span className="font-medium text-slate-700">O.S. {order.os_number || "-"}</span>
+              <span className="text-slate-500">{order.opening_date || (order.created_at || "").slice(0, 10)}</span>
+              {order.responsible_tech && <span className="text-slate-500">Técnico: {order.responsible_tech}</span>}
+              {order.page_count !== null && order.page_count !== undefined && (
+                <span className="text-slate-500">
+                  Contador: {order.page_count}
+                  {order.pages_since_previous !== null && order.pages_since_previous !== undefined &&
+                    ` (+${order.pages_since_previous})`}
+                </span>
+              )}
+            </div>
+            {order.materials && <p className="mt-1 text-slate-600">Materiais: {order.materials}</p>}
+          </div>
+        ))}
+      </div>
+    </div>
+  );
+};
+
+export default EquipmentHistory;
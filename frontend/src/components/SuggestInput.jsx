@@ -0,0 +1,43 @@
+import { useState, useEffect } from "react";
+import axios from "axios";
+import { Input } from "@/components/ui/input";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Text input offering the values already used for this field, most used first
+const SuggestInput = ({ field, id, value, ...props }) => {
+  const [suggestions, setSuggestions] = useState([]);
+
+  useEffect(() => {
+    const timer = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem("token");
+        const response = await axios.get(`${API}/suggest`, {
+          params: { field, prefix: value || "", limit: 8 },
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        setSuggestions(response.data.suggestions.map((s) => s.value));
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 150);
+
+    return () => clearTimeout(timer);
+  }, [field, value]);
+
+  const listId = `${id}-suggestions`;
+
+  return (
+    <>
+      <Input id={id} value={value} list={listId} autoComplete="off" {...props} />
+      <datalist id={listId}>
+        {suggestions.map((suggestion) => (
+          <option key={suggestion} value={suggestion} />
+        ))}
+      </datalist>
+    </>
+  );
+};
+
+export default SuggestInput;
@@ -4,3 +4,15 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// FastAPI's detail is a string, an object with a message (e.g. the duplicate
+// warning) or a list of validation errors; toasts need a string
+export function errorMessage(error, fallback) {
+  const detail = error?.response?.data?.detail;
+  if (typeof detail === "string") return detail;
+  if (typeof detail?.message === "string") return detail.message;
+  if (Array.isArray(detail) && detail.length > 0) {
+    return detail.map((item) => `${(item.loc || []).slice(1).join(".")}: ${item.msg}`).join("\n");
+  }
+  return fallback;
+}
@@ -7,6 +7,9 @@ import { Label } from "@/components/ui/label";
 import { Textarea } from "@/components/ui/textarea";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { toast } from "sonner";
+import { errorMessage } from "@/lib/utils";
+import EquipmentHistory from "@/components/EquipmentHistory";
+import SuggestInput from "@/components/SuggestInput";
 import { ArrowLeft, Upload, Loader2, Image as ImageIcon } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -136,16 +139,30 @@ const CreateServiceOrder = () => {
     e.preventDefault();
     setLoading(true);
 
-    try {
-      const token = localStorage.getItem("token");
-      await axios.post(`${API}/service-orders`, formData, {
+    const token = localStorage.getItem("token");
+    const create = (allowDuplicate) =>
+      axios.post(`${API}/service-orders`, formData, {
         headers: { Authorization: `Bearer ${token}` },
+        params: allowDuplicate ? { allow_duplicate: true } : {},
       });
 
+    try {
+      try {
+        await create(false);
+      } catch (error) {
+        const duplicates = error.response?.data?.detail?.duplicates;
+        if (!duplicates) throw error;
+        const list = duplicates
+          .map((d) => `• ${d.ticket_number || d.os_number || d.id} (${d.status}) — ${d.client_name || ""} ${d.unit || ""} [${d.matched_on.join(", ")}]`)
+          .join("\n");
+        if (!window.confirm(`Já existem O.S. abertas parecidas:\n\n${list}\n\nCriar mesmo assim?`)) return;
+        await create(true);
+      }
+
       toast.success("O.S. criada com sucesso!");
       navigate("/dashboard");
     } catch (error) {
-      toast.error("Erro ao criar O.S.");
+      toast.error(errorMessage(error, "Erro ao criar O.S."));
     } finally {
       setLoading(false);
     }
@@ -321,7 +338,8 @@ const CreateServiceOrder = () => {
             <div className="grid md:grid-cols-2 gap-4">
               <div>
                 <Label htmlFor="client_name">Cliente</Label>
-                <Input
+                <SuggestInput
+                  field="client_name"
                   id="client_name"
                   value={formData.client_name}
                   onChange={(e) => updateField("client_name", e.target.value)}
@@ -339,7 +357,8 @@ const CreateServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="unit">Unidade</Label>
-                <Input
+                <SuggestInput
+                  field="unit"
                   id="unit"
                   value={formData.unit}
                   onChange={(e) => updateField("unit", e.target.value)}
@@ -348,7 +367,8 @@ const CreateServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="service_address">Endereço de Atendimento</Label>
-                <Input
+                <SuggestInput
+                  field="service_address"
                   id="service_address"
                   value={formData.service_address}
                   onChange={(e) => updateField("service_address", e.target.value)}
@@ -374,7 +394,8 @@ const CreateServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="equipment_brand">Marca</Label>
-                <Input
+                <SuggestInput
+                  field="equipment_brand"
                   id="equipment_brand"
                   placeholder="Ex: SAMSUNG"
                   value={formData.equipment_brand}
@@ -384,7 +405,8 @@ const CreateServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="equipment_model">Modelo</Label>
-                <Input
+                <SuggestInput
+                  field="equipment_model"
                   id="equipment_model"
                   placeholder="Ex: M4070FR"
                   value={formData.equipment_model}
@@ -413,6 +435,7 @@ const CreateServiceOrder = () => {
                 />
               </div>
             </div>
+            <EquipmentHistory serial={formData.equipment_serial || formData.equipment_board_serial} />
           </div>
 
           {/* Chamado */}
@@ -61,9 +61,14 @@ const Dashboard = () => {
     if (userData) {
       setUser(JSON.parse(userData));
     }
-    loadOrders();
   }, []);
 
+  // RESOLVIDO orders are fetched for the selected range only, which also
+  // reaches into the archive when the range is old enough
+  useEffect(() => {
+    loadOrders();
+  }, [dateStart, dateEnd]);
+
   useEffect(() => {
     applyFilters();
   }, [searchTerm, statusFilter, patFilter, serialFilter, unitFilter, dateStart, dateEnd, orders]);
@@ -79,6 +84,10 @@ const Dashboard = () => {
       const token = localStorage.getItem("token");
       const response = await axios.get(`${API}/service-orders`, {
         headers: { Authorization: `Bearer ${token}` },
+        params: {
+          resolved_start: dateStart || undefined,
+          resolved_end: dateEnd || undefined,
+        },
       });
       setOrders(response.data);
       setFilteredOrders(response.data);
@@ -7,6 +7,10 @@ import { Label } from "@/components/ui/label";
 import { Textarea } from "@/components/ui/textarea";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { toast } from "sonner";
+import { errorMessage } from "@/lib/utils";
+import EquipmentHistory from "@/components/EquipmentHistory";
+import Attachments from "@/components/Attachments";
+import SuggestInput from "@/components/SuggestInput";
 import { ArrowLeft } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -77,7 +81,7 @@ const EditServiceOrder = () => {
       toast.success("O.S. atualizada com sucesso!");
       navigate("/dashboard");
     } catch (error) {
-      toast.error("Erro ao atualizar O.S.");
+      toast.error(errorMessage(error, "Erro ao atualizar O.S."));
     } finally {
       setLoading(false);
     }
@@ -216,7 +220,8 @@ const EditServiceOrder = () => {
             <div className="grid md:grid-cols-2 gap-4">
               <div>
                 <Label htmlFor="client_name">Cliente</Label>
-                <Input
+                <SuggestInput
+                  field="client_name"
                   id="client_name"
                   value={formData.client_name || ""}
                   onChange={(e) => updateField("client_name", e.target.value)}
@@ -234,7 +239,8 @@ const EditServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="unit">Unidade</Label>
-                <Input
+                <SuggestInput
+                  field="unit"
                   id="unit"
                   value={formData.unit || ""}
                   onChange={(e) => updateField("unit", e.target.value)}
@@ -243,7 +249,8 @@ const EditServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="service_address">Endereço de Atendimento</Label>
-                <Input
+                <SuggestInput
+                  field="service_address"
                   id="service_address"
                   value={formData.service_address || ""}
                   onChange={(e) => updateField("service_address", e.target.value)}
@@ -269,7 +276,8 @@ const EditServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="equipment_brand">Marca</Label>
-                <Input
+                <SuggestInput
+                  field="equipment_brand"
                   id="equipment_brand"
                   placeholder="Ex: SAMSUNG"
                   value={formData.equipment_brand || ""}
@@ -279,7 +287,8 @@ const EditServiceOrder = () => {
               </div>
               <div>
                 <Label htmlFor="equipment_model">Modelo</Label>
-                <Input
+                <SuggestInput
+                  field="equipment_model"
                   id="equipment_model"
                   placeholder="Ex: M4070FR"
                   value={formData.equipment_model || ""}
@@ -308,6 +317,7 @@ const EditServiceOrder = () => {
                 />
               </div>
             </div>
+            <EquipmentHistory serial={formData.equipment_serial || formData.equipment_board_serial} currentOrderId={id} />
           </div>
 
           {/* Chamado */}
@@ -452,6 +462,9 @@ const EditServiceOrder = () => {
             </div>
           </div>
 
+          {/* Anexos */}
+          <Attachments orderId={id} initial={formData.attachments} />
+
           {/* Submit */}
           <div className="flex justify-end gap-4">
             <Button
@@ -5,6 +5,7 @@ import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { toast } from "sonner";
+import { errorMessage } from "@/lib/utils";
 import { Wrench } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -33,7 +34,7 @@ const Login = ({ setIsAuthenticated }) => {
       navigate("/dashboard");
     } catch (error) {
       toast.error(
-        error.response?.data?.detail || "Usuário ou senha inválidos"
+        errorMessage(error, "Usuário ou senha inválidos")
       );
     } finally {
       setLoading(false);
@@ -6,6 +6,7 @@ import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { toast } from "sonner";
+import { errorMessage } from "@/lib/utils";
 import { ArrowLeft, Plus, Trash2, Shield, User as UserIcon } from "lucide-react";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -66,7 +67,7 @@ const UserManagement = () => {
       setFormData({ email: "", password: "", name: "", role: "USER" });
       loadUsers();
     } catch (error) {
-      toast.error(error.response?.data?.detail || "Erro ao criar usuário");
+      toast.error(errorMessage(error, "Erro ao criar usuário"));
     } finally {
       setLoading(false);
     }
@@ -83,7 +84,7 @@ const UserManagement = () => {
       toast.success("Usuário excluído com sucesso");
       loadUsers();
     } catch (error) {
-      toast.error(error.response?.data?.detail || "Erro ao excluir usuário");
+      toast.error(errorMessage(error, "Erro ao excluir usuário"));
     }
   };
 
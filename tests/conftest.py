@@ -0,0 +1,80 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Importing server must not need a database; routes are exercised on SQLite
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("ARCHIVE_INTERVAL_MINUTES", "0")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """TestClient on a fresh SQLite file"""
+    import server
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(server, "SQLITE_PATH", tmp_path / "service_orders.db")
+    monkeypatch.setattr(server, "REPORTS_FILE", tmp_path / "reports.json")
+    # Versions and cached results belong to the previous test's database
+    monkeypatch.setattr(server.order_data_version, "value", 0)
+    server.query_cache.entries.clear()
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    import server
+
+    user = server.User(email="tecnico", name="Técnico", role="ADMIN")
+    user_doc = {**user.model_dump(), "password": server.hash_password("secret")}
+    user_doc["created_at"] = user_doc["created_at"].isoformat()
+    client.portal.call(server.storage.users.insert_one, user_doc)
+    return {"Authorization": f"Bearer {server.create_access_token(user.id)}"}
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """In-memory MongoDB (mongomock) behind the Mongo-only code paths"""
+    import server
+    from mongomock_motor import AsyncMongoMockClient
+    from storage import MongoStorage
+
+    db = AsyncMongoMockClient()[server.DB_NAME]
+    monkeypatch.setattr(server, "MONGO_FEATURES", True)
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "storage", MongoStorage(db))
+    monkeypatch.setattr(server.order_data_version, "value", 0)
+    return db
+
+
+@pytest.fixture
+def mongo_client(mongo_db, tmp_path, monkeypatch):
+    """TestClient on mongomock, for the Mongo-only routes"""
+    import server
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(server, "create_mongo_client", lambda: mongo_db.client)
+    monkeypatch.setattr(server, "client", None)
+    monkeypatch.setattr(server, "REPORTS_FILE", tmp_path / "reports.json")
+    monkeypatch.setattr(server, "ATTACHMENT_DIR", tmp_path / "attachments")
+    monkeypatch.setattr(server, "attachment_storage", server.DiskAttachmentStorage())
+    server.query_cache.entries.clear()
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def mongo_auth_headers(mongo_client):
+    import server
+
+    user = server.User(email="tecnico", name="Técnico", role="ADMIN")
+    user_doc = {**user.model_dump(), "password": server.hash_password("secret")}
+    user_doc["created_at"] = user_doc["created_at"].isoformat()
+    mongo_client.portal.call(server.storage.users.insert_one, user_doc)
+    return {"Authorization": f"Bearer {server.create_access_token(user.id)}"}
@@ -0,0 +1,90 @@
+import asyncio
+
+import server
+
+
+def resolved_order(order_id, updated_at="2020-01-10T00:00:00+00:00", **fields):
+    return {
+        "id": order_id,
+        "status": "RESOLVIDO",
+        "created_at": "2020-01-01T00:00:00+00:00",
+        "updated_at": updated_at,
+        "created_by": "u1",
+        **fields,
+    }
+
+
+def ids(collection):
+    async def load():
+        return {doc["id"] for doc in await collection.find({}, {"_id": 0, "id": 1}).to_list(None)}
+
+    return asyncio.run(load())
+
+
+def test_archive_moves_old_resolved_orders(mongo_db):
+    async def seed():
+        await mongo_db.service_orders.insert_many([
+            resolved_order("old-1"),
+            resolved_order("old-2"),
+            resolved_order("recent", updated_at="2099-01-01T00:00:00+00:00"),
+            {**resolved_order("open"), "status": "ABERTO"},
+        ])
+
+    asyncio.run(seed())
+
+    assert asyncio.run(server.archive_resolved_orders(batch_size=1)) == 2
+    assert ids(mongo_db.service_orders) == {"recent", "open"}
+    assert ids(mongo_db.service_orders_archive) == {"old-1", "old-2"}
+
+
+def test_archive_skips_rejected_orders_and_keeps_going(mongo_db):
+    async def seed():
+        # Stands in for any per-document write error on the archive
+        await mongo_db.service_orders_archive.create_index("os_number", unique=True, sparse=True)
+        await mongo_db.service_orders_archive.insert_one(resolved_order("already-archived", os_number="OS-1"))
+        await mongo_db.service_orders.insert_many([
+            resolved_order("clash", updated_at="2020-01-01T00:00:00+00:00", os_number="OS-1"),
+            resolved_order("next-1", updated_at="2020-01-02T00:00:00+00:00"),
+            resolved_order("next-2", updated_at="2020-01-03T00:00:00+00:00"),
+        ])
+
+    asyncio.run(seed())
+
+    # The rejected order is the oldest and fills a whole batch on its own
+    assert asyncio.run(server.archive_resolved_orders(batch_size=1)) == 2
+    assert ids(mongo_db.service_orders) == {"clash"}
+    assert ids(mongo_db.service_orders_archive) == {"already-archived", "next-1", "next-2"}
+    # Later runs are not stuck on it either
+    asyncio.run(mongo_db.service_orders.insert_one(resolved_order("next-3")))
+    assert asyncio.run(server.archive_resolved_orders(batch_size=1)) == 1
+    assert ids(mongo_db.service_orders) == {"clash"}
+
+
+def test_reused_number_is_archived_twice(mongo_db):
+    async def reuse():
+        await server.ensure_lookup_keys()
+        first = resolved_order("first", updated_at="2020-01-01T00:00:00+00:00", ticket_number="T-1")
+        await mongo_db.service_orders.insert_one({**first, **server.lookup_keys(first)})
+        assert await server.archive_resolved_orders() == 1
+        # The number is free again once the old order is archived
+        second = resolved_order("second", updated_at="2020-02-01T00:00:00+00:00", ticket_number="t-1")
+        await mongo_db.service_orders.insert_one({**second, **server.lookup_keys(second)})
+        return await server.archive_resolved_orders()
+
+    assert asyncio.run(reuse()) == 1
+    assert ids(mongo_db.service_orders) == set()
+    assert ids(mongo_db.service_orders_archive) == {"first", "second"}
+
+
+def test_unique_archive_index_from_older_versions_is_replaced(mongo_db):
+    async def indexes():
+        await mongo_db.service_orders_archive.create_index(
+            "ticket_key", unique=True, partialFilterExpression={"ticket_key": {"$type": "string"}}
+        )
+        await server.ensure_lookup_keys()
+        return await mongo_db.service_orders_archive.index_information()
+
+    info = asyncio.run(indexes())
+    assert not info["ticket_key_1"].get("unique")
+    assert not info["os_key_1"].get("unique")
+    assert asyncio.run(mongo_db.service_orders.index_information())["ticket_key_1"]["unique"]
@@ -0,0 +1,67 @@
+import pytest
+
+SYNC_URL = "/api/service-orders/sync"
+
+
+@pytest.fixture
+def order(mongo_client, mongo_auth_headers):
+    response = mongo_client.post("/api/service-orders", json={"ticket_number": "T-1"}, headers=mongo_auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def upload(client, headers, order_id, content=b"%PDF-1.4 test", content_type="application/pdf"):
+    return client.post(
+        f"/api/service-orders/{order_id}/attachments",
+        files={"file": ("laudo.pdf", content, content_type)},
+        headers=headers,
+    )
+
+
+def get_order(client, headers, order_id):
+    return client.get(f"/api/service-orders/{order_id}", headers=headers).json()
+
+
+def test_upload_download_and_range(mongo_client, mongo_auth_headers, order):
+    response = upload(mongo_client, mongo_auth_headers, order["id"], content=b"0123456789")
+    assert response.status_code == 200, response.text
+    attachment = response.json()
+    url = f"/api/service-orders/{order['id']}/attachments/{attachment['id']}"
+
+    full = mongo_client.get(url, headers=mongo_auth_headers)
+    assert full.content == b"0123456789"
+    partial = mongo_client.get(url, headers={**mongo_auth_headers, "Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.content == b"2345"
+    assert partial.headers["Content-Range"] == "bytes 2-5/10"
+
+
+def test_only_images_and_pdfs(mongo_client, mongo_auth_headers, order):
+    response = upload(mongo_client, mongo_auth_headers, order["id"], content=b"x", content_type="text/plain")
+    assert response.status_code == 400
+
+
+def test_attachment_writes_bump_the_order_version(mongo_client, mongo_auth_headers, order):
+    uploaded = upload(mongo_client, mongo_auth_headers, order["id"]).json()
+    after_upload = get_order(mongo_client, mongo_auth_headers, order["id"])
+    assert after_upload["updated_at"] != order["updated_at"]
+
+    deleted = mongo_client.delete(
+        f"/api/service-orders/{order['id']}/attachments/{uploaded['id']}", headers=mongo_auth_headers
+    )
+    assert deleted.status_code == 200
+    assert get_order(mongo_client, mongo_auth_headers, order["id"])["updated_at"] != after_upload["updated_at"]
+
+
+def test_sync_edit_made_before_an_upload_does_not_drop_it(mongo_client, mongo_auth_headers, order):
+    # The technician edited offline from the version before the upload
+    uploaded = upload(mongo_client, mongo_auth_headers, order["id"]).json()
+
+    response = mongo_client.post(SYNC_URL, json={"mutations": [{
+        "idempotency_key": "k1", "op": "update", "order_id": order["id"],
+        "base_version": order["updated_at"], "data": {"status": "RESOLVIDO"},
+    }]}, headers=mongo_auth_headers)
+
+    assert response.json()["results"][0]["status"] == "conflict"
+    current = get_order(mongo_client, mongo_auth_headers, order["id"])
+    assert [a["id"] for a in current["attachments"]] == [uploaded["id"]]
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import backup
+
+ORDERS = [{"id": f"order-{n:03}", "ticket_number": f"T-{n}", "status": "ABERTO"} for n in range(100)]
+
+
+@pytest.fixture
+def databases(monkeypatch):
+    """Source and target databases; connect() hands out the current one"""
+    client = AsyncMongoMockClient()
+    current = {"db": client["source"]}
+    monkeypatch.setattr(backup, "connect", lambda: (client, current["db"]))
+    monkeypatch.setattr(client, "close", lambda: None, raising=False)
+    monkeypatch.setattr(backup, "BATCH_SIZE", 10)
+    return client, current
+
+
+@pytest.fixture
+def dump(databases, tmp_path):
+    client, current = databases
+
+    async def seed():
+        await current["db"].service_orders.insert_many([dict(order) for order in ORDERS])
+        await current["db"].service_orders.create_index("id", unique=True)
+        await current["db"].service_orders.create_index("ticket_number")
+        await backup.backup(tmp_path, [])
+
+    asyncio.run(seed())
+    current["db"] = client["target"]
+    return tmp_path
+
+
+def restore(source, upsert=False):
+    asyncio.run(backup.restore(source, [], parallel=4, upsert=upsert, drop=False, verify=True))
+
+
+def restored_ids(databases):
+    _, current = databases
+
+    async def load():
+        return sorted(doc["id"] for doc in await current["db"].service_orders.find({}).to_list(None))
+
+    return asyncio.run(load())
+
+
+def test_round_trip(dump, databases):
+    manifest = json.loads((dump / backup.MANIFEST).read_text())
+    assert manifest["collections"]["service_orders"]["documents"] == 100
+
+    restore(dump)
+
+    assert restored_ids(databases) == [order["id"] for order in ORDERS]
+    indexes = asyncio.run(databases[1]["db"].service_orders.index_information())
+    assert indexes["id_1"]["unique"]
+    assert "ticket_number_1" in indexes
+    assert not (dump / backup.PROGRESS).exists()
+
+
+def test_failed_batch_fails_the_restore_and_keeps_progress(dump, databases, monkeypatch):
+    write_batch = backup.write_batch
+
+    async def flaky(collection, batch, upsert):
+        if any(doc["id"] == "order-055" for doc in batch):
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(0.001)
+        await write_batch(collection, batch, upsert)
+
+    monkeypatch.setattr(backup, "write_batch", flaky)
+    with pytest.raises(RuntimeError):
+        restore(dump)
+
+    # Progress stops before the failed batch and is kept for the rerun
+    saved = json.loads((dump / backup.PROGRESS).read_text())
+    assert saved["service_orders"] <= 50
+
+    monkeypatch.setattr(backup, "write_batch", write_batch)
+    restore(dump)
+    assert restored_ids(databases) == [order["id"] for order in ORDERS]
+    assert not (dump / backup.PROGRESS).exists()
+
+
+def test_upsert_replaces_existing_documents(dump, databases):
+    _, current = databases
+    asyncio.run(current["db"].service_orders.insert_one({"id": "order-007", "status": "RESOLVIDO"}))
+
+    restore(dump, upsert=True)
+
+    assert restored_ids(databases) == [order["id"] for order in ORDERS]
+    doc = asyncio.run(current["db"].service_orders.find_one({"id": "order-007"}))
+    assert doc["status"] == "ABERTO"
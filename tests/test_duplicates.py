@@ -0,0 +1,50 @@
+ORDERS_URL = "/api/service-orders"
+
+
+def create(client, headers, params=None, **order):
+    return client.post(ORDERS_URL, json={"status": "ABERTO", **order}, headers=headers, params=params)
+
+
+def test_open_order_for_the_same_equipment_is_offered(client, auth_headers):
+    first = create(client, auth_headers, ticket_number="T-1", equipment_serial="SN 123").json()
+
+    response = create(client, auth_headers, ticket_number="T-2", equipment_serial="sn123")
+
+    assert response.status_code == 409
+    detail = response.json()["detail"]
+    assert isinstance(detail["message"], str)
+    assert [d["id"] for d in detail["duplicates"]] == [first["id"]]
+    assert detail["duplicates"][0]["matched_on"] == ["equipment_serial"]
+
+
+def test_same_client_and_unit_is_offered(client, auth_headers):
+    create(client, auth_headers, ticket_number="T-1", client_name="Maria", unit="UBS Sé")
+
+    response = create(client, auth_headers, ticket_number="T-2", client_name="MARIA", unit="ubs sé")
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["duplicates"][0]["matched_on"] == ["client_name + unit"]
+
+
+def test_resolved_orders_are_not_duplicates(client, auth_headers):
+    create(client, auth_headers, ticket_number="T-1", pat="P-9", status="RESOLVIDO")
+
+    assert create(client, auth_headers, ticket_number="T-2", pat="P-9").status_code == 200
+
+
+def test_allow_duplicate_creates_anyway(client, auth_headers):
+    create(client, auth_headers, ticket_number="T-1", pat="P-9")
+
+    response = create(client, auth_headers, {"allow_duplicate": "true"}, ticket_number="T-2", pat="P-9")
+
+    assert response.status_code == 200
+    assert len(client.get(ORDERS_URL, headers=auth_headers).json()) == 2
+
+
+def test_reused_ticket_number_is_still_rejected(client, auth_headers):
+    create(client, auth_headers, ticket_number="T-1")
+
+    response = create(client, auth_headers, {"allow_duplicate": "true"}, ticket_number="t-1")
+
+    assert response.status_code == 409
+    assert isinstance(response.json()["detail"], str)
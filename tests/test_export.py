@@ -0,0 +1,92 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+EXPORT_URL = "/api/service-orders/export"
+
+ORDERS = [
+    {"ticket_number": "T-1", "status": "ABERTO", "opening_date": "2025-11-20", "unit": "UBS Sé"},
+    {"ticket_number": "T-2", "status": "RESOLVIDO", "opening_date": "2025-11-25", "unit": "Centro"},
+    {"ticket_number": "T-3", "status": "RESOLVIDO", "opening_date": "2026-01-05", "unit": "Centro",
+     "verifications": [{"item": "DIGITALIZAÇÃO", "status": "NOK", "observation": "scanner travado"}]},
+]
+
+
+@pytest.fixture
+def orders(client, auth_headers):
+    created = []
+    for order in ORDERS:
+        response = client.post("/api/service-orders", json=order, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        created.append(response.json())
+    return created
+
+
+def export(client, headers, **params):
+    response = client.get(EXPORT_URL, params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def csv_rows(content: bytes):
+    return list(csv.DictReader(io.StringIO(content.decode("utf-8-sig"))))
+
+
+def test_csv_has_every_field_and_checklist_columns(client, auth_headers, orders):
+    rows = csv_rows(export(client, auth_headers, format="csv").content)
+
+    assert [row["ticket_number"] for row in rows] == ["T-1", "T-2", "T-3"]
+    assert rows[2]["verification.DIGITALIZAÇÃO"] == "NOK"
+    assert rows[2]["verification.DIGITALIZAÇÃO.observation"] == "scanner travado"
+    assert json.loads(rows[0]["status_history"])[0]["status"] == "ABERTO"
+
+
+def test_columns_and_gzip(client, auth_headers, orders):
+    response = export(client, auth_headers, format="csv", columns="ticket_number,unit", gzip="true")
+
+    rows = csv_rows(gzip.decompress(response.content))
+    assert rows[0] == {"ticket_number": "T-1", "unit": "UBS Sé"}
+
+
+def test_ndjson_uses_the_same_rows(client, auth_headers, orders):
+    lines = export(client, auth_headers, format="ndjson", status="RESOLVIDO").text.splitlines()
+
+    docs = [json.loads(line) for line in lines]
+    assert [doc["ticket_number"] for doc in docs] == ["T-2", "T-3"]
+    assert docs[1]["verification.DIGITALIZAÇÃO.observation"] == "scanner travado"
+
+
+def test_parquet(client, auth_headers, orders):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    table = pq.read_table(io.BytesIO(export(client, auth_headers, format="parquet").content))
+
+    assert table.num_rows == 3
+    assert table.column("ticket_number").to_pylist() == ["T-1", "T-2", "T-3"]
+
+
+def test_xlsx(client, auth_headers, orders):
+    openpyxl = pytest.importorskip("openpyxl")
+
+    workbook = openpyxl.load_workbook(io.BytesIO(export(client, auth_headers, unit="Centro").content))
+
+    values = [cell for row in workbook.active.iter_rows(values_only=True) for cell in row]
+    assert "T-2" in values and "T-3" in values and "T-1" not in values
+
+
+def test_export_matches_the_dashboard_filter(client, auth_headers, orders):
+    params = {"resolved_start": "2026-01-01", "resolved_end": "2026-01-31"}
+    listed = client.get("/api/service-orders", params=params, headers=auth_headers).json()
+
+    exported = csv_rows(export(client, auth_headers, format="csv", **params).content)
+
+    # Open orders stay; resolved ones only within the range
+    assert [row["ticket_number"] for row in exported] == ["T-1", "T-3"]
+    assert {row["id"] for row in exported} == {order["id"] for order in listed}
+
+
+def test_unknown_format(client, auth_headers, orders):
+    assert client.get(EXPORT_URL, params={"format": "xml"}, headers=auth_headers).status_code == 400
@@ -0,0 +1,169 @@
+import asyncio
+import calendar
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+# ---- parse_range (attachment downloads) ----
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 900)),
+    ("bytes=-100", (900, 100)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes=990-5000", (990, 10)),
+    ("bytes = 0-0", (0, 1)),
+])
+def test_parse_range(header, expected):
+    assert server.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=50-10",
+    "bytes=0-1,5-9",
+    "items=0-9",
+    "bytes=a-b",
+    "bytes",
+])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        server.parse_range(header, 1000)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers == {"Content-Range": "bytes */1000"}
+
+
+# ---- cron schedules and report periods ----
+
+def fire_days(expression, year, month):
+    schedule = server.parse_cron(expression)
+    _, last_day = calendar.monthrange(year, month)
+    return [day for day in range(1, last_day + 1) if server.cron_matches(schedule, datetime(year, month, day, 2, 0))]
+
+
+def test_parse_cron_fields():
+    (minutes, hours, days, months, weekdays), either_day = server.parse_cron("*/15 8-18/5 1,15 * 1-5")
+    assert minutes == {0, 15, 30, 45}
+    assert hours == {8, 13, 18}
+    assert days == {1, 15}
+    assert months == set(range(1, 13))
+    assert weekdays == {1, 2, 3, 4, 5}
+    assert either_day
+
+
+@pytest.mark.parametrize("expression", ["0 2 1 *", "60 * * * *", "0 2 0 * *", "0 2 * 13 *", "0 2 5-1 * *", "x * * * *"])
+def test_parse_cron_rejects(expression):
+    with pytest.raises(ValueError):
+        server.parse_cron(expression)
+
+
+def test_cron_day_fields_match_either_when_both_restricted():
+    # June 2026: the 1st is a Monday
+    assert fire_days("0 2 1 * 1", 2026, 6) == [1, 8, 15, 22, 29]
+    assert fire_days("0 2 13 * 5", 2026, 6) == [5, 12, 13, 19, 26]
+
+
+def test_cron_day_fields_with_wildcard():
+    assert fire_days("0 2 1 * *", 2026, 6) == [1]
+    assert fire_days("0 2 * * 1", 2026, 6) == [1, 8, 15, 22, 29]
+    # A stepped wildcard counts as unrestricted, as in cron, so both must match
+    assert fire_days("0 2 */10 * 1", 2026, 6) == [1]
+
+
+def test_cron_matches_minute_and_hour():
+    schedule = server.parse_cron("30 6 * * *")
+    assert server.cron_matches(schedule, datetime(2026, 3, 4, 6, 30))
+    assert not server.cron_matches(schedule, datetime(2026, 3, 4, 6, 31))
+    assert not server.cron_matches(schedule, datetime(2026, 3, 4, 7, 30))
+
+
+@pytest.mark.parametrize("period, today, expected", [
+    ("current_month", date(2026, 6, 17), ("2026-06-01", "2026-06-30")),
+    ("current_month", date(2026, 12, 31), ("2026-12-01", "2026-12-31")),
+    ("last_month", date(2026, 1, 5), ("2025-12-01", "2025-12-31")),
+    ("last_month", date(2024, 3, 1), ("2024-02-01", "2024-02-29")),
+    ("last_month", date(2026, 3, 31), ("2026-02-01", "2026-02-28")),
+])
+def test_report_dates(period, today, expected):
+    report = server.ScheduledReport(name="monthly", period=period)
+    assert server.report_dates(report, today) == expected
+
+
+def test_report_dates_without_period_uses_fixed_dates():
+    report = server.ScheduledReport(name="fixed", date_start="2026-01-01", date_end=None)
+    assert server.report_dates(report, date(2026, 6, 17)) == ("2026-01-01", None)
+
+
+# ---- rate limiting ----
+
+def test_parse_rate():
+    assert server.parse_rate("10/60") == (10, 10 / 60)
+    assert server.parse_rate("5/1") == (5, 5.0)
+
+
+def test_token_bucket(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    store = server.MemoryRateLimitStore()
+
+    def take(key="ip"):
+        return asyncio.run(store.take(key, capacity=3, refill_per_second=0.5))
+
+    # A full bucket allows a burst of `capacity` requests
+    assert [take() for _ in range(3)] == [0, 0, 0]
+    assert take() == pytest.approx(2.0)
+    # Other keys have their own bucket
+    assert take("other") == 0
+
+    clock[0] += 1
+    assert take() == pytest.approx(1.0)
+    clock[0] += 1
+    assert take() == 0
+    # Refill never exceeds the capacity
+    clock[0] += 3600
+    assert [take() for _ in range(4)][-1] == pytest.approx(2.0)
+
+
+def test_token_bucket_evicts_full_buckets(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    store = server.MemoryRateLimitStore(max_keys=2)
+
+    asyncio.run(store.take("a", 2, 1.0))
+    clock[0] += 5
+    asyncio.run(store.take("b", 2, 1.0))
+    asyncio.run(store.take("c", 2, 1.0))
+
+    assert set(store.buckets) == {"b", "c"}
+
+
+def test_login_is_rate_limited_per_client(client, monkeypatch):
+    monkeypatch.setattr(server, "rate_limit_store", server.MemoryRateLimitStore())
+    capacity, _ = server.parse_rate(server.RATE_LIMIT_LOGIN)
+    credentials = {"email": "nobody", "password": "wrong"}
+
+    for _ in range(capacity):
+        assert client.post("/api/auth/login", json=credentials).status_code == 401
+    # A forged X-Forwarded-For does not buy a fresh bucket
+    response = client.post("/api/auth/login", json=credentials, headers={"X-Forwarded-For": "203.0.113.9"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_token_bucket_eviction_uses_each_key_window(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    store = server.MemoryRateLimitStore(max_keys=1)
+
+    # An hourly quota, exhausted
+    assert asyncio.run(store.take("export:u1", 1, 1 / 3600)) == 0
+    clock[0] += 60
+    # A per-second route triggers the eviction a minute later
+    asyncio.run(store.take("login:1.2.3.4", 5, 5.0))
+
+    assert "export:u1" in store.buckets
+    assert asyncio.run(store.take("export:u1", 1, 1 / 3600)) > 0
@@ -0,0 +1,66 @@
+import asyncio
+
+import server
+
+ORDERS_URL = "/api/service-orders"
+LOOKUP_URL = f"{ORDERS_URL}/lookup"
+
+
+def create(client, headers, **order):
+    response = client.post(ORDERS_URL, json=order, headers=headers, params={"allow_duplicate": "true"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_normalize_key():
+    assert server.normalize_key("  Chamado 12A ") == "CHAMADO12A"
+    assert server.normalize_key("ÁRVORE") == server.normalize_key("arvore")
+    assert server.normalize_key("   ") is None
+
+
+def test_lookups_ignore_case_spacing_and_accents(client, auth_headers):
+    order = create(client, auth_headers, ticket_number="INC 0042", os_number="OS-Ç1", pat="PAT 7")
+
+    assert client.get(f"{LOOKUP_URL}/ticket/inc0042", headers=auth_headers).json()["id"] == order["id"]
+    assert client.get(f"{LOOKUP_URL}/os/os-c1", headers=auth_headers).json()["id"] == order["id"]
+    assert client.get(f"{LOOKUP_URL}/ticket/INC-0042", headers=auth_headers).status_code == 404
+
+
+def test_pat_lookup_returns_every_order_oldest_first(client, auth_headers):
+    first = create(client, auth_headers, ticket_number="T-1", pat="P 9", status="RESOLVIDO")
+    second = create(client, auth_headers, ticket_number="T-2", pat="p9")
+    create(client, auth_headers, ticket_number="T-3", pat="P 10")
+
+    found = client.get(f"{LOOKUP_URL}/pat/P9", headers=auth_headers).json()
+
+    assert [order["id"] for order in found] == [first["id"], second["id"]]
+
+
+def test_renumbering_moves_the_key(client, auth_headers):
+    order = create(client, auth_headers, ticket_number="T-1")
+
+    client.put(f"{ORDERS_URL}/{order['id']}", json={"ticket_number": "T-2"}, headers=auth_headers)
+
+    assert client.get(f"{LOOKUP_URL}/ticket/T-1", headers=auth_headers).status_code == 404
+    assert client.get(f"{LOOKUP_URL}/ticket/t-2", headers=auth_headers).json()["id"] == order["id"]
+
+
+def test_numbers_in_use_are_rejected_on_update(client, auth_headers):
+    create(client, auth_headers, ticket_number="T-1", os_number="OS-1")
+    other = create(client, auth_headers, ticket_number="T-2")
+
+    response = client.put(f"{ORDERS_URL}/{other['id']}", json={"os_number": " os-1"}, headers=auth_headers)
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "O.S. number already exists"
+
+
+def test_lookup_falls_back_to_the_archive(mongo_client, mongo_auth_headers, mongo_db):
+    archived = {"id": "old", "ticket_number": "T-1", "status": "RESOLVIDO", "created_by": "u1",
+                "created_at": "2020-01-01T00:00:00+00:00", "updated_at": "2020-01-01T00:00:00+00:00"}
+    asyncio.run(mongo_db.service_orders_archive.insert_one({**archived, **server.lookup_keys(archived)}))
+
+    response = mongo_client.get(f"{LOOKUP_URL}/ticket/t-1", headers=mongo_auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()["id"] == "old"
@@ -0,0 +1,66 @@
+import pytest
+
+import server
+
+
+def evaluate(expression, doc, variables=None):
+    """Evaluate the aggregation operators used by the key expressions"""
+    variables = variables or {}
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            return variables[expression[2:]]
+        if expression.startswith("$"):
+            return doc.get(expression[1:])
+        return expression
+    if isinstance(expression, list):
+        return [evaluate(item, doc, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+
+    (op, args), = expression.items()
+    if op == "$literal":
+        return args
+    if op == "$ifNull":
+        value = evaluate(args[0], doc, variables)
+        return evaluate(args[1], doc, variables) if value is None else value
+    if op == "$trim":
+        return evaluate(args["input"], doc, variables).strip()
+    if op == "$toUpper":
+        # MongoDB only upper-cases ASCII letters
+        value = evaluate(args, doc, variables)
+        return "".join(ch.upper() if "a" <= ch <= "z" else ch for ch in value)
+    if op == "$arrayElemAt":
+        return evaluate(args[0], doc, variables)[args[1]]
+    if op == "$replaceAll":
+        value = evaluate(args["input"], doc, variables)
+        return value.replace(evaluate(args["find"], doc, variables), evaluate(args["replacement"], doc, variables))
+    if op == "$reduce":
+        value = evaluate(args["initialValue"], doc, variables)
+        for item in evaluate(args["input"], doc, variables):
+            value = evaluate(args["in"], doc, {**variables, "value": value, "this": item})
+        return value
+    raise NotImplementedError(op)
+
+
+NAMES = ["João", "JOÃO", "joão", " José  Antônio ", "Conceição", "Müller", "Kyocera", "ø-1"]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_pipeline_key_matches_python_key(name):
+    doc = {"responsible_tech": name}
+    assert evaluate(server.mongo_normalize_key("responsible_tech"), doc) == server.normalize_key(name)
+
+
+def test_accented_tech_names_share_one_queue():
+    positions = {
+        server.tech_queue_position({"responsible_tech": name, "status": "ABERTO"})
+        for name in ["João", "JOÃO", "joao", " João "]
+    }
+    assert positions == {("JOAO", "ABERTO")}
+
+
+@pytest.mark.parametrize("brand", ["Olivetti", "Ração Copiadoras", " sêmen "])
+def test_rollup_label_matches_rebuild(brand):
+    # rebuild_verification_rollups() labels with mongo_key_text on the trimmed field
+    rebuild_label = server.mongo_key_text({"$trim": {"input": {"$ifNull": ["$equipment_brand", ""]}}})
+    assert evaluate(rebuild_label, {"equipment_brand": brand}) == server.rollup_label(brand)
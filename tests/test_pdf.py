@@ -0,0 +1,71 @@
+import io
+import zipfile
+
+import pytest
+
+import server
+
+ORDERS_URL = "/api/service-orders"
+
+
+@pytest.fixture
+def pdf_cache(tmp_path, monkeypatch):
+    cache = tmp_path / "pdf_cache"
+    monkeypatch.setattr(server, "PDF_CACHE_DIR", cache)
+    return cache
+
+
+@pytest.fixture
+def orders(client, auth_headers):
+    created = []
+    for n in range(3):
+        order = {"ticket_number": f"T-{n}", "os_number": f"OS/{n}", "status": "ABERTO", "client_name": "Maria"}
+        response = client.post(ORDERS_URL, json=order, headers=auth_headers, params={"allow_duplicate": "true"})
+        assert response.status_code == 200, response.text
+        created.append(response.json())
+    return created
+
+
+def test_pdf_is_rendered_once_per_version(client, auth_headers, orders, pdf_cache):
+    order = orders[0]
+    url = f"{ORDERS_URL}/{order['id']}/pdf"
+
+    response = client.get(url, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+    assert f"OS_OS_0_{order['id'][:8]}.pdf" in response.headers["content-disposition"]
+    cached = list(pdf_cache.iterdir())
+    assert len(cached) == 1
+    assert client.get(url, headers=auth_headers).content == cached[0].read_bytes()
+
+    # An edit is a new version: the old file is replaced, not served
+    client.put(f"{ORDERS_URL}/{order['id']}", json={"status": "RESOLVIDO"}, headers=auth_headers)
+    client.get(url, headers=auth_headers)
+    assert [p.name for p in pdf_cache.iterdir()] != [cached[0].name]
+    assert len(list(pdf_cache.iterdir())) == 1
+
+
+def test_pdf_of_missing_order(client, auth_headers, pdf_cache):
+    assert client.get(f"{ORDERS_URL}/nope/pdf", headers=auth_headers).status_code == 404
+
+
+def test_batch_zip_has_one_pdf_per_order(client, auth_headers, orders, pdf_cache):
+    ids = [orders[2]["id"], orders[0]["id"], "missing"]
+
+    response = client.post(f"{ORDERS_URL}/pdf/batch", json={"ids": ids}, headers=auth_headers)
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.namelist() == [
+        server.order_pdf_filename(orders[0]), server.order_pdf_filename(orders[2]),
+    ]
+    assert all(archive.read(name).startswith(b"%PDF") for name in archive.namelist())
+
+
+def test_batch_limits(client, auth_headers, pdf_cache, monkeypatch):
+    monkeypatch.setattr(server, "PDF_BATCH_MAX", 2)
+    batch_url = f"{ORDERS_URL}/pdf/batch"
+
+    assert client.post(batch_url, json={"ids": []}, headers=auth_headers).status_code == 400
+    assert client.post(batch_url, json={"ids": ["a", "b", "c"]}, headers=auth_headers).status_code == 400
@@ -0,0 +1,95 @@
+import asyncio
+
+import server
+
+
+class FixedVersion:
+    def __init__(self):
+        self.value = 0
+
+    async def get(self):
+        return self.value
+
+
+def make_cache(max_entries=10):
+    return server.QueryCache(FixedVersion(), max_entries, ttl_seconds=60)
+
+
+def counting(result="value"):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return result
+
+    return compute, calls
+
+
+def test_concurrent_callers_share_one_query():
+    cache = make_cache()
+    compute, calls = counting()
+
+    async def run():
+        return await asyncio.gather(*(cache.get("k", compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_new_version_invalidates():
+    cache = make_cache()
+    compute, calls = counting()
+
+    async def run():
+        await cache.get("k", compute)
+        await cache.get("k", compute)
+        cache.version.value += 1
+        await cache.get("k", compute)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_result_of_a_query_raced_by_a_write_is_not_kept():
+    cache = make_cache()
+
+    async def compute():
+        cache.version.value += 1
+        return "stale"
+
+    asyncio.run(cache.get("k", compute))
+    assert "k" not in cache.entries
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    compute, _ = counting()
+
+    async def run():
+        await cache.get("a", compute)
+        await cache.get("b", compute)
+        await cache.get("a", compute)
+        await cache.get("c", compute)
+
+    asyncio.run(run())
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_writes_through_the_api_invalidate_stats_and_lists(client, auth_headers):
+    def stats():
+        return client.get("/api/service-orders/stats", headers=auth_headers).json()
+
+    assert stats()["ABERTO"] == 0
+    # Bypasses the version bump, so the cached result is still served
+    client.portal.call(server.storage.service_orders.insert_one, {
+        "id": "raw", "status": "ABERTO", "created_at": "2026-01-01T00:00:00+00:00",
+        "updated_at": "2026-01-01T00:00:00+00:00", "created_by": "u1",
+    })
+    assert stats()["ABERTO"] == 0
+
+    created = client.post("/api/service-orders", json={"status": "URGENTE"}, headers=auth_headers).json()
+
+    assert stats()["ABERTO"] == 1 and stats()["URGENTE"] == 1
+    listed = client.get("/api/service-orders", headers=auth_headers).json()
+    assert [order["id"] for order in listed] == [created["id"], "raw"]
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+import server
+
+
+def seed_orders(client, count):
+    operations = [
+        ("insert", {
+            "id": f"order-{n:05}",
+            "ticket_number": f"T-{n}",
+            "status": "URGENTE" if n == count - 1 else "ABERTO",
+            "created_at": f"2026-01-01T00:00:00.{n:06}+00:00",
+            "updated_at": "2026-01-01T00:00:00+00:00",
+            "created_by": "u1",
+        })
+        for n in range(count)
+    ]
+    assert client.portal.call(server.storage.service_orders.bulk_write, operations) == {}
+
+
+def test_xlsx_report_is_not_truncated(client, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    seed_orders(client, 1005)
+    report = server.ScheduledReport(name="all-open", status="ABERTO", format="xlsx")
+    filter_query, include_archive = server.report_query(report)
+
+    path = client.portal.call(server.build_report, report, filter_query, include_archive, tmp_path / "all.xlsx")
+
+    sheet = openpyxl.load_workbook(io.BytesIO(path.read_bytes())).active
+    tickets = [cell for row in sheet.iter_rows(values_only=True) for cell in row if str(cell).startswith("T-")]
+    assert len(tickets) == 1004
+
+
+def test_csv_report_replaces_the_previous_file(client, tmp_path):
+    seed_orders(client, 3)
+    report = server.ScheduledReport(name="all", format="csv", columns="ticket_number,status")
+    filter_query, include_archive = server.report_query(report)
+    (tmp_path / "old.csv").write_text("stale")
+
+    path = client.portal.call(server.build_report, report, filter_query, include_archive, tmp_path / "new.csv")
+
+    assert [p.name for p in tmp_path.iterdir()] == ["new.csv"]
+    assert path.read_text().splitlines() == [
+        "ticket_number,status", "T-0,ABERTO", "T-1,ABERTO", "T-2,URGENTE",
+    ]
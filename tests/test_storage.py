@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from storage import SQLiteStorage, apply_update
+
+ORDERS = [
+    {"id": "a", "status": "ABERTO", "pat": "PAT-100", "unit": "Centro", "ticket_key": "T1", "note": None},
+    {"id": "b", "status": "RESOLVIDO", "pat": "pat-200", "unit": "Norte", "ticket_key": "T2"},
+    {"id": "c", "status": "EM ANDAMENTO", "pat": "X-300", "unit": None, "priority": 3},
+    {"id": "d", "pat": "PAT-400", "unit": "Centro", "priority": 7},
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    store = SQLiteStorage(tmp_path / "test.db")
+    asyncio.run(store.open())
+    yield store
+    asyncio.run(store.close())
+
+
+@pytest.fixture
+def orders(storage):
+    async def seed():
+        for doc in ORDERS:
+            await storage.service_orders.insert_one(doc)
+
+    asyncio.run(seed())
+    return storage.service_orders
+
+
+def matching(repository, filter_query):
+    return set(asyncio.run(repository.find_ids(filter_query)))
+
+
+@pytest.mark.parametrize("filter_query, expected", [
+    ({}, {"a", "b", "c", "d"}),
+    ({"status": "ABERTO"}, {"a"}),
+    ({"unit": "Centro", "pat": "PAT-400"}, {"d"}),
+    ({"unit": None}, {"c"}),
+    ({"pat": {"$regex": "^pat-", "$options": "i"}}, {"a", "b", "d"}),
+    ({"pat": {"$regex": "^pat-"}}, {"b"}),
+    ({"priority": {"$gte": 3, "$lt": 7}}, {"c"}),
+    ({"status": {"$in": ["ABERTO", "RESOLVIDO"]}}, {"a", "b"}),
+    ({"status": {"$in": ["ABERTO", None]}}, {"a", "d"}),
+    ({"status": {"$nin": ["ABERTO", "RESOLVIDO"]}}, {"c", "d"}),
+    ({"status": {"$nin": ["ABERTO", None]}}, {"b", "c"}),
+    ({"status": {"$ne": "RESOLVIDO"}}, {"a", "c", "d"}),
+    ({"status": {"$ne": None}}, {"a", "b", "c"}),
+    ({"id": {"$in": []}}, set()),
+    ({"$or": [{"status": "ABERTO"}, {"priority": {"$gt": 5}}]}, {"a", "d"}),
+    ({"$and": [{"unit": "Centro"}, {"$or": [{"status": "ABERTO"}, {"status": "RESOLVIDO"}]}]}, {"a"}),
+])
+def test_where_matches_mongo_semantics(orders, filter_query, expected):
+    assert matching(orders, filter_query) == expected
+
+
+def test_exists_tells_missing_from_null(orders):
+    # "a" stores note: null, the others have no note at all
+    assert matching(orders, {"note": {"$exists": True}}) == {"a"}
+    assert matching(orders, {"note": {"$exists": False}}) == {"b", "c", "d"}
+    # Equality with None matches both, as in MongoDB
+    assert matching(orders, {"note": None}) == {"a", "b", "c", "d"}
+
+
+def test_where_rejects_unknown_operator_and_field_names(orders):
+    with pytest.raises(ValueError):
+        orders.where({"status": {"$elemMatch": {}}})
+    with pytest.raises(ValueError):
+        orders.where({"status') OR 1=1 --": "x"})
+
+
+def test_apply_update_operators():
+    doc = {"id": "a", "count": 1, "tags": ["x"], "nested": {"keep": 1, "drop": 2}, "gone": True}
+    apply_update(doc, {
+        "$set": {"status": "RESOLVIDO", "nested.added": 3},
+        "$unset": {"gone": "", "nested.drop": "", "missing.path": ""},
+        "$inc": {"count": 2, "fresh": 1},
+        "$push": {"tags": "y", "history": {"at": "now"}},
+    })
+    assert doc == {
+        "id": "a",
+        "status": "RESOLVIDO",
+        "count": 3,
+        "fresh": 1,
+        "tags": ["x", "y"],
+        "history": [{"at": "now"}],
+        "nested": {"keep": 1, "added": 3},
+    }
+
+
+@pytest.mark.parametrize("update", [
+    {"$pull": {"tags": "x"}},
+    {"$set": {"verifications.$.done": True}},
+])
+def test_apply_update_rejects_unsupported(update):
+    with pytest.raises(ValueError):
+        apply_update({"tags": ["x"], "verifications": []}, update)
+
+
+def test_update_one_applies_and_persists(orders):
+    assert asyncio.run(orders.update_one({"id": "c"}, {"$set": {"status": "RESOLVIDO"}, "$inc": {"priority": 1}}))
+    assert not asyncio.run(orders.update_one({"id": "zzz"}, {"$set": {"status": "RESOLVIDO"}}))
+    doc = asyncio.run(orders.find_one({"id": "c"}))
+    assert doc["status"] == "RESOLVIDO" and doc["priority"] == 4
+    # The generated status column follows the document
+    assert matching(orders, {"status": "RESOLVIDO"}) == {"b", "c"}
+
+
+def test_insert_duplicate_reports_key_pattern(orders):
+    with pytest.raises(DuplicateKeyError) as excinfo:
+        asyncio.run(orders.insert_one({"id": "e", "ticket_key": "T1"}))
+    assert excinfo.value.details["keyPattern"] == {"ticket_key": 1}
+
+
+def test_bulk_write_maps_duplicates_per_operation(orders):
+    errors = asyncio.run(orders.bulk_write([
+        ("insert", {"id": "e", "status": "ABERTO"}),
+        ("insert", {"id": "a", "status": "ABERTO"}),  # id taken
+        ("replace", {"id": "b"}, {"id": "b", "status": "RESOLVIDO", "ticket_key": "T1"}),  # ticket taken
+        ("replace", {"id": "c", "status": "EM ANDAMENTO"}, {"id": "c", "status": "RESOLVIDO"}),
+        ("replace", {"id": "d", "status": "ABERTO"}, {"id": "d", "status": "RESOLVIDO"}),  # no match
+    ]))
+
+    assert set(errors) == {1, 2}
+    assert errors[1].details["keyPattern"] == {"id": 1}
+    assert errors[2].details["keyPattern"] == {"ticket_key": 1}
+    # The other operations were still written
+    assert matching(orders, {"id": "e"}) == {"e"}
+    assert asyncio.run(orders.find_one({"id": "c"}))["status"] == "RESOLVIDO"
+    assert "status" not in asyncio.run(orders.find_one({"id": "d"}))
+    assert asyncio.run(orders.find_one({"id": "b"}))["ticket_key"] == "T2"
+
+
+def test_iterate_pages_in_sort_order(orders):
+    async def collect(sort):
+        return [doc["id"] async for doc in orders.iterate({}, sort=sort, batch_size=1)]
+
+    # Binary collation, like MongoDB's default
+    assert asyncio.run(collect("-pat")) == ["b", "c", "d", "a"]
+    assert asyncio.run(collect("id")) == ["a", "b", "c", "d"]
+
+
+def test_count_by(orders):
+    assert asyncio.run(orders.count_by("unit")) == {"Centro": 2, "Norte": 1, None: 1}
+    assert asyncio.run(orders.count_by("unit", {"status": {"$ne": None}})) == {"Centro": 1, "Norte": 1, None: 1}
+
+
+def test_idempotency_results_expire(storage):
+    asyncio.run(storage.save_idempotency({"u:1": {"status": "applied"}}, ttl_seconds=60))
+    asyncio.run(storage.save_idempotency({"u:2": {"status": "applied"}}, ttl_seconds=-1))
+    assert asyncio.run(storage.load_idempotency(["u:1", "u:2", "u:3"])) == {"u:1": {"status": "applied"}}
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+SYNC_URL = "/api/service-orders/sync"
+
+
+def sync(client, headers, *mutations):
+    response = client.post(SYNC_URL, json={"mutations": list(mutations)}, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    # Results come back in mutation order, each tagged with its key
+    assert [r.pop("idempotency_key") for r in results] == [m["idempotency_key"] for m in mutations]
+    return results
+
+
+def create(key, order_id=None, **data):
+    return {"idempotency_key": key, "op": "create", "order_id": order_id, "data": data}
+
+
+def update(key, order_id, base_version=None, **data):
+    return {"idempotency_key": key, "op": "update", "order_id": order_id, "base_version": base_version, "data": data}
+
+
+def test_mutations_on_one_order_fold_into_one_write(client, auth_headers):
+    results = sync(
+        client, auth_headers,
+        create("k1", "order-1", ticket_number="T-1", responsible_tech="Ana"),
+        update("k2", "order-1", status="EM ANDAMENTO"),
+        update("k3", "order-1", observations="peça trocada"),
+    )
+
+    assert [r["status"] for r in results] == ["applied"] * 3
+    # Every mutation reports the single write that carried it
+    assert results[0] == results[1] == results[2]
+    order = client.get("/api/service-orders/order-1", headers=auth_headers).json()
+    assert order["ticket_number"] == "T-1"
+    assert order["status"] == "EM ANDAMENTO"
+    assert order["observations"] == "peça trocada"
+    assert datetime.fromisoformat(order["updated_at"]) == datetime.fromisoformat(results[0]["version"])
+
+
+def test_replayed_keys_return_the_stored_result(client, auth_headers):
+    first = sync(client, auth_headers, create("k1", ticket_number="T-1"))
+    again = sync(client, auth_headers, create("k1", ticket_number="T-1"))
+
+    assert first[0]["status"] == "applied"
+    assert again == [{**first[0], "replayed": True}]
+    orders = client.get("/api/service-orders", headers=auth_headers).json()
+    assert [o["id"] for o in orders] == [first[0]["order_id"]]
+
+
+def test_key_repeated_in_one_batch_is_rejected(client, auth_headers):
+    results = sync(client, auth_headers, create("k1", ticket_number="T-1"), create("k1", ticket_number="T-1"))
+
+    assert results[0]["status"] == "applied"
+    assert results[1] == {"status": "invalid", "detail": "Idempotency key repeated in the batch"}
+
+
+def test_stale_base_version_is_a_conflict(client, auth_headers):
+    created = sync(client, auth_headers, create("k1", "order-1", ticket_number="T-1"))[0]
+    # Someone else edits the order after the technician went offline
+    sync(client, auth_headers, update("k2", "order-1", created["version"], status="EM ANDAMENTO"))
+
+    result = sync(client, auth_headers, update("k3", "order-1", created["version"], status="RESOLVIDO"))[0]
+
+    assert result["status"] == "conflict"
+    assert result["order"]["status"] == "EM ANDAMENTO"
+    order = client.get("/api/service-orders/order-1", headers=auth_headers).json()
+    assert order["status"] == "EM ANDAMENTO"
+
+
+def test_current_base_version_applies(client, auth_headers):
+    created = sync(client, auth_headers, create("k1", "order-1", ticket_number="T-1"))[0]
+
+    result = sync(client, auth_headers, update("k2", "order-1", created["version"], status="RESOLVIDO"))[0]
+
+    assert result["status"] == "applied"
+    assert result["version"] != created["version"]
+
+
+def test_malformed_base_version_is_invalid_not_an_error(client, auth_headers):
+    sync(client, auth_headers, create("k1", "order-1", ticket_number="T-1"))
+
+    results = sync(
+        client, auth_headers,
+        update("k2", "order-1", "yesterday", status="RESOLVIDO"),
+        update("k3", "order-1", observations="ok"),
+    )
+
+    assert results[0] == {"status": "invalid", "detail": "base_version must be an ISO timestamp"}
+    # The rest of the batch still goes through
+    assert results[1]["status"] == "applied"
+
+
+def test_unknown_order_and_op(client, auth_headers):
+    results = sync(
+        client, auth_headers,
+        update("k1", "missing", status="RESOLVIDO"),
+        {"idempotency_key": "k2", "op": "delete", "order_id": "missing"},
+    )
+
+    assert results == [
+        {"status": "not_found"},
+        {"status": "invalid", "detail": "op must be create or update"},
+    ]
+
+
+def test_duplicate_ticket_is_a_conflict(client, auth_headers):
+    sync(client, auth_headers, create("k1", ticket_number="T-1"))
+
+    result = sync(client, auth_headers, create("k2", ticket_number="t-1"))[0]
+
+    assert result["status"] == "conflict"
+    # A failed mutation is not remembered, so a retry is evaluated again
+    assert sync(client, auth_headers, create("k2", ticket_number="T-2"))[0]["status"] == "applied"
+
+
+def test_sync_requires_authentication(client):
+    assert client.post(SYNC_URL, json={"mutations": []}).status_code in (401, 403)